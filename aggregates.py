@@ -0,0 +1,107 @@
+"""
+账本汇总（增量维护）
+
+累计投入、剩余现金以及每个月的 流入/流出/净流/条数，随每条记录的增删 O(1) 更新，
+摘要标签和月份分组标题直接读取，不再每次重新求和。与账本一起保存。
+金额都是 int 分，增删任意多次也不会累积误差。
+"""
+import numpy as np
+
+from columns import to_datetime64
+
+
+def _month_sums(days, amounts):
+    """日序号/金额数组 -> [((年, 月), 流入, 流出, 条数)]"""
+    if not len(days): return []
+    month = to_datetime64(days).astype("datetime64[M]")
+    month = month.astype(np.int64)
+    order = np.argsort(month, kind="stable")
+    month, amount = month[order], amounts[order]
+    starts = np.flatnonzero(np.concatenate(([True], month[1:] != month[:-1])))
+    inflow = np.add.reduceat(np.where(amount > 0, amount, 0), starts)
+    outflow = np.add.reduceat(np.where(amount > 0, 0, amount), starts)
+    count = np.diff(np.append(starts, len(month)))
+    return [((1970 + k // 12, k % 12 + 1), i, o, c)
+            for k, i, o, c in zip(month[starts].tolist(), inflow.tolist(), outflow.tolist(), count.tolist())]
+
+
+class Aggregates:
+    def __init__(self):
+        self.invested = 0  # 累计投入（正数）
+        self.cash = 0  # 剩余现金
+        self.rows = 0  # 计入的记录条数（含初始本金），加载时用来校验
+        self.months = {}  # (年, 月) -> [流入, 流出, 净流, 条数]，金额方向与记录一致
+
+    def _month(self, d, amount, n):
+        bucket = self.months.get((d.year, d.month))
+        if bucket is None:
+            bucket = self.months[(d.year, d.month)] = [0, 0, 0, 0]
+        bucket[0 if amount > 0 else 1] += amount * n
+        bucket[2] += amount * n
+        bucket[3] += n
+        if bucket[3] <= 0:
+            del self.months[(d.year, d.month)]
+        self.rows += n
+
+    def set_initial(self, d, capital, n=1):
+        """初始本金：在开始月份记为流出，同时计入投入与现金；n=-1 表示撤销"""
+        self._month(d, -capital, n)
+        self.invested += capital * n
+        self.cash += capital * n
+
+    def add(self, d, amount, n=1):
+        """新增一条记录；n=-1 表示删除"""
+        self._month(d, amount, n)
+        if amount < 0: self.invested -= amount * n
+        self.cash += amount * n
+
+    def remove(self, d, amount):
+        self.add(d, amount, -1)
+
+    def month_net(self, year, month):
+        bucket = self.months.get((year, month))
+        return bucket[2] if bucket else 0
+
+    def add_many(self, days, amounts):
+        """批量新增（批量导入时使用），days 为日序号数组；按月分段求和后再合并，整数运算"""
+        for key, i, o, c in _month_sums(np.asarray(days), np.asarray(amounts, dtype=np.int64)):
+            bucket = self.months.get(key)
+            if bucket is None:
+                bucket = self.months[key] = [0, 0, 0, 0]
+            bucket[0] += i
+            bucket[1] += o
+            bucket[2] += i + o
+            bucket[3] += c
+            self.invested -= o
+            self.cash += i + o
+            self.rows += c
+
+    @classmethod
+    def build(cls, ledger):
+        """从账本的列数据整体统计（按月排序后分段求和，整数运算）"""
+        agg = cls()
+        v = ledger.cols.view()
+        agg.add_many(v.day, v.amount)
+        if ledger.is_initialized:
+            agg.set_initial(ledger.start_date_obj, ledger.initial_capital)
+        return agg
+
+    def to_json(self):
+        return {
+            "unit": "cents",
+            "invested": self.invested,
+            "cash": self.cash,
+            "rows": self.rows,
+            "months": {f"{y:04d}-{m:02d}": b for (y, m), b in sorted(self.months.items())}
+        }
+
+    @classmethod
+    def from_json(cls, data):
+        if data["unit"] != "cents":
+            raise ValueError("unit")
+        agg = cls()
+        agg.invested = data["invested"]
+        agg.cash = data["cash"]
+        agg.rows = data["rows"]
+        agg.months = {(int(k[:4]), int(k[5:7])): list(b) for k, b in data["months"].items()}
+        return agg
@@ -0,0 +1,114 @@
+"""
+收益指标（一次算出多种）
+
+在整理好的现金流（flow_cache.Flows：按日期排序、同一天合并）上，对截至结束日期的部分
+（ledger.flows_until，与 Ledger.xirr / 命令行 xirr 的口径相同）用一组向量运算同时得到：
+- XIRR（年化，ledger.solve_flows）与盈亏；
+- Modified Dietz 区间收益：盈亏 / Σ(投入 × 在区间内停留的比例)，不需要迭代求解；
+- 时间加权收益（TWR）：给了中间市值点时，按市值点切成子区间，各段用 Modified Dietz 后连乘
+  （链式 Dietz；每个现金流日都有市值时就是精确的 TWR）；没有市值点、或市值与现金流对不上
+  （某段亏损超过 100%）时为 None；
+- 累计投入曲线、净现金曲线（按记录方向累加：投入为负、取出为正）及其最大回撤，
+  即现金曲线从高点到低点的最大降幅——一段时间里净追加投入的最大金额。
+金额都是 int 分；现金流同一天合并后计算，同一天的买入与卖出会先相互抵消。
+"""
+from collections import namedtuple
+from datetime import date
+
+import numpy as np
+
+from ledger import flows_until, solve_flows
+from money import fmt
+
+# xirr: 年化（不收敛时为 None）；profit: 盈亏(分)；dietz / twr: 区间收益（无法计算时为 None）；
+# invested: 累计投入(分)；net_invested: 净投入(分，投入减取出)；
+# max_drawdown: 净现金曲线最大回撤(分)，drawdown_start / drawdown_end 为对应的高点、低点日期（没有回撤时为 None）；
+# curve: 各现金流日的曲线（Curve）
+Metrics = namedtuple("Metrics", "xirr profit dietz twr invested net_invested max_drawdown drawdown_start "
+                                "drawdown_end curve")
+
+# days: 日序号；invested: 累计投入(分)；cash: 净现金(分)；drawdown: 距此前高点的回撤(分)
+Curve = namedtuple("Curve", "days invested cash drawdown")
+
+
+def _twr(days, contrib, end, end_value, valuations):
+    """链式 Modified Dietz；valuations 为 (日期列表, 市值(分)列表)，市值是当天现金流之后的"""
+    v_dates, v_values = valuations
+    v_days = np.array([d.toordinal() for d in v_dates], dtype=np.int64)
+    v_values = np.asarray(v_values, dtype=np.float64)
+    keep = (v_days > days[0]) & (v_days < end)
+    order = np.argsort(v_days[keep], kind="stable")
+    bounds = np.concatenate(([days[0]], v_days[keep][order], [end]))
+    values = np.concatenate(([0.0], v_values[keep][order], [float(end_value)]))
+    last = np.append(bounds[1:] != bounds[:-1], True)  # 同一天多个市值取最后一个
+    bounds, values = bounds[last], values[last]
+
+    # 现金流属于它所在的子区间 (b[k-1], b[k]]，第一天的并入第一段；权重为剩余时间占比
+    k = np.maximum(np.searchsorted(bounds, days, side="left"), 1)
+    weight = (bounds[k] - days) / (bounds[k] - bounds[k - 1])
+    n = len(bounds) - 1
+    flow = np.bincount(k - 1, weights=contrib, minlength=n)
+    weighted = np.bincount(k - 1, weights=weight * contrib, minlength=n)
+    gain = values[1:] - values[:-1] - flow
+    base = values[:-1] + weighted
+    idle = (base == 0) & (gain == 0)  # 没有资金的空档期
+    if (~idle & (base <= 0)).any(): return None
+    with np.errstate(divide="ignore", invalid="ignore"):
+        r = np.where(idle, 0.0, gain / base)
+    if (r < -1.0).any(): return None
+    return float(np.prod(1.0 + r) - 1.0)
+
+
+def analyze(flows, end_date, end_value, valuations=None, guess=0.1):
+    """
+    flows 为 flow_cache.Flows（Ledger.prepared_flows() 或 flow_cache.make_flows），end_value 为期末市值（分），
+    valuations 为可选的中间市值点 (日期列表, 市值(分)列表)，用于时间加权收益 -> Metrics。
+    结束日期之后的现金流不计入；结束日期不晚于第一笔现金流时抛出 ValueError。
+    不修改 flows，可以在后台线程/进程调用。
+    """
+    import xirr
+
+    end = end_date.toordinal()
+    flows = flows_until(flows, end_date)
+    days, cents = flows.days, flows.cents
+    if not days.size or end <= days[0]:
+        raise ValueError("结束日期必须晚于开始日期")
+
+    try:
+        rate, profit = solve_flows(flows, end_date, end_value, guess)
+    except xirr.XirrConvergenceError:
+        rate, profit = None, flows.total + end_value
+
+    contrib = -cents  # 投入为正
+    cash = np.cumsum(cents)
+    invested = np.cumsum(np.maximum(contrib, 0))
+    drawdown = np.maximum.accumulate(cash) - cash
+
+    weight = (end - days) / (end - days[0])
+    base = float(weight @ contrib)
+    dietz = profit / base if base > 0 else None
+
+    low = int(drawdown.argmax())
+    if drawdown[low] > 0:
+        high = int(cash[:low + 1].argmax())
+        dd_start, dd_end = date.fromordinal(int(days[high])), date.fromordinal(int(days[low]))
+    else:
+        dd_start = dd_end = None
+
+    twr = _twr(days, contrib.astype(np.float64), end, end_value, valuations) if valuations else None
+    return Metrics(rate, profit, dietz, twr, int(invested[-1]), int(-cash[-1]), int(drawdown[low]),
+                   dd_start, dd_end, Curve(days, invested, cash, drawdown))
+
+
+def describe(m):
+    """界面与命令行显示用的两行文字"""
+    rate = "不收敛" if m.xirr is None else f"{m.xirr * 100:.2f}%"
+    first = f"年化: {rate} | 盈亏: {fmt(m.profit, grouping=True)}"
+    parts = [f"区间收益(Dietz): {'—' if m.dietz is None else f'{m.dietz * 100:.2f}%'}"]
+    if m.twr is not None:
+        parts.append(f"时间加权: {m.twr * 100:.2f}%")
+    parts.append(f"净投入: {fmt(m.net_invested, grouping=True)}")
+    if m.max_drawdown:
+        parts.append(f"最大资金回撤: {fmt(m.max_drawdown, grouping=True)} "
+                     f"({m.drawdown_start:%Y-%m-%d} → {m.drawdown_end:%Y-%m-%d})")
+    return first, " | ".join(parts)
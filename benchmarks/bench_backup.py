@@ -0,0 +1,99 @@
+"""
+备份导入/导出基准：旧版（json.load 整个文件 + 逐行 strptime，indent=4 写出）vs 流式读写（json_stream）
+
+比较耗时与峰值内存（tracemalloc，含 numpy 数组），以及文件大小（含 gzip）。
+
+用法: python benchmarks/bench_backup.py [--sizes 100000 1000000]
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ledger import Ledger  # noqa: E402
+from money import to_cents  # noqa: E402
+
+
+def make_ledger(n, seed=0):
+    rng = random.Random(seed)
+    ledger = Ledger()
+    start = date(2010, 1, 4)
+    ledger.lock_initial(start, 10_000_000)
+    ledger.add_plan("P", "CN", "daily", 100.0, start)
+    plan_id = ledger.drip_plans[0]["id"]
+    days = [start + timedelta(days=rng.randrange(365 * 14)) for _ in range(n)]
+    ledger.load_rows([(d, -rng.randrange(1, 10 ** 7), "手动", None, None) for d in days[:n // 10]],
+                     [(d, -10000, "计划:P", None, plan_id) for d in days[n // 10:]])
+    ledger.restore_aggregates()
+    return ledger
+
+
+def legacy_load(path):
+    """旧版 load_data_from_file：整个文件读成字典，再逐行 strptime"""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    records = [(datetime.strptime(r["date"], "%Y-%m-%d").date(), to_cents(r["amount"]), r.get("remark", ""),
+                r.get("id"), None) for r in data["records"]]
+    drips = [(datetime.strptime(d["date"], "%Y-%m-%d").date(), to_cents(d["amount"]), d.get("remark", ""),
+              d.get("id"), d.get("plan_id")) for d in data["drip_records"]]
+    ledger = Ledger()
+    ledger.load_rows(records, drips, data.get("next_id", 1))
+    return ledger
+
+
+def legacy_save(ledger, path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(ledger.to_dict(), f, indent=4, ensure_ascii=False)
+
+
+def measure(fn):
+    """(耗时, 峰值内存 MB)；tracemalloc 会拖慢 Python 代码，计时与测内存分两次跑"""
+    gc.collect()
+    t0 = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - t0
+    gc.collect()
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak / 2 ** 20
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000])
+    args = parser.parse_args()
+
+    print(f"{'rows':>8} {'step':>7} {'legacy(s)':>10} {'stream(s)':>10} {'legacy MB':>10} {'stream MB':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        old, new, gz = (os.path.join(tmp, name) for name in ("old.json", "new.json", "new.json.gz"))
+        for n in args.sizes:
+            ledger = make_ledger(n)
+            t_old, m_old = measure(lambda: legacy_save(ledger, old))
+            t_new, m_new = measure(lambda: ledger.save(new))
+            print(f"{n:>8} {'export':>7} {t_old:>10.2f} {t_new:>10.2f} {m_old:>10.1f} {m_new:>10.1f}")
+
+            t_old, m_old = measure(lambda: legacy_load(old))
+            t_new, m_new = measure(lambda: Ledger.load(new))
+            print(f"{n:>8} {'import':>7} {t_old:>10.2f} {t_new:>10.2f} {m_old:>10.1f} {m_new:>10.1f}")
+
+            t0 = time.perf_counter()
+            ledger.save(gz)
+            t_gz = time.perf_counter() - t0
+            assert Ledger.load(gz).to_dict() == Ledger.load(new).to_dict()
+            print(f"{'':>8} 文件: indent=4 {os.path.getsize(old) / 2 ** 20:.1f} MB, "
+                  f"紧凑 {os.path.getsize(new) / 2 ** 20:.1f} MB, gzip {os.path.getsize(gz) / 2 ** 20:.1f} MB "
+                  f"(写 {t_gz:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+CSV 批量导入基准：逐行解析 + add_record（相当于一条条手工录入）vs csv_import 向量化管线
+
+生成券商对账单格式的 CSV（YYYYMMDD 日期、带千分位的金额），分别计时 解析+去重+应用 与保存，
+再把同一个文件导入一次，确认全部识别为重复。
+
+用法: python benchmarks/bench_csv_import.py [--sizes 100000 1000000] [--legacy-max 200000]
+"""
+import argparse
+import csv
+import os
+import sys
+import tempfile
+import time
+from datetime import date, datetime
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import csv_import  # noqa: E402
+from storage import open_store  # noqa: E402
+
+NAMES = ("招商银行", "贵州茅台", "沪深300ETF", "中证500ETF", "分红")
+
+
+def write_statement(path, n, seed=0):
+    """按日期排好序的对账单（真实对账单都是按时间顺序）"""
+    rng = np.random.default_rng(seed)
+    days = np.sort(date(2010, 1, 4).toordinal() + rng.integers(0, 365 * 14, n))
+    cents = rng.integers(-500_000, 300_000, n)
+    cents[cents == 0] = 1
+    names = rng.integers(0, len(NAMES), n)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        f.write("成交日期,证券名称,发生金额\n")
+        for d, c, r in zip(days.tolist(), cents.tolist(), names.tolist()):
+            f.write(f'{date.fromordinal(d):%Y%m%d},{NAMES[r]},"{c / 100:,.2f}"\n')
+
+
+def fresh_store(path):
+    for suffix in ("", ".journal", "-wal", "-shm"):
+        if os.path.exists(path + suffix): os.remove(path + suffix)
+    store = open_store(path)
+    ledger = store.load()
+    ledger.lock_initial(date(2009, 1, 1), 100_000_000)
+    store.commit(ledger)
+    return store, ledger
+
+
+def legacy_import(ledger, path):
+    """逐行 strptime + add_record，用 (日期, 金额, 备注) 集合去重"""
+    seen = {(d, round(a, 2), r) for d, a, r, _ in ledger.records}
+    added = 0
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        next(reader)
+        for day, remark, amount in reader:
+            d = datetime.strptime(day, "%Y%m%d").date()
+            a = float(amount.replace(",", ""))
+            if (d, a, remark) in seen: continue
+            ledger.add_record(d, a, remark)
+            added += 1
+    return added
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--legacy-max", type=int, default=200_000, help="超过这个行数不跑逐行版本")
+    args = parser.parse_args()
+
+    print(f"{'rows':>8} {'store':>6} {'legacy(s)':>10} {'import(s)':>10} {'save(s)':>8} {'reimport(s)':>12}")
+    with tempfile.TemporaryDirectory() as tmp:
+        src = os.path.join(tmp, "statement.csv")
+        for n in args.sizes:
+            write_statement(src, n)
+            for name in ("ledger.json", "ledger.db"):
+                path = os.path.join(tmp, name)
+                t_old = float("nan")
+                if n <= args.legacy_max:
+                    _, ledger = fresh_store(path)
+                    t0 = time.perf_counter()
+                    legacy_import(ledger, src)
+                    t_old = time.perf_counter() - t0
+
+                store, ledger = fresh_store(path)
+                t0 = time.perf_counter()
+                added, dupes, invalid = csv_import.import_csv(ledger, src)
+                t_new = time.perf_counter() - t0
+                t0 = time.perf_counter()
+                store.commit(ledger)
+                t_save = time.perf_counter() - t0
+                assert added == n and dupes == invalid == 0, (added, dupes, invalid)
+
+                t0 = time.perf_counter()
+                again = csv_import.import_csv(ledger, src)
+                t_again = time.perf_counter() - t0
+                assert again == (0, n, 0), again
+                print(f"{n:>8} {name.split('.')[1]:>6} {t_old:>10.2f} {t_new:>10.2f} {t_save:>8.2f} {t_again:>12.2f}")
+                store.close()
+
+
+if __name__ == "__main__":
+    main()
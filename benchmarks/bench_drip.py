@@ -0,0 +1,146 @@
+"""
+定投补录基准
+
+1. 顺延查找：旧版逐个线性扫描交易日列表 vs 一次 np.searchsorted，
+   覆盖 CN/US 两个市场的多年 日/周/月 计划
+2. 每次启动从头重算 vs 按水位线增量续算：模拟连续 N 天每天打开一次软件，
+   期间穿插删除（忽略/不忽略）、暂停/恢复计划、修改计划金额等操作，
+   每一步都校验增量结果与从头重算完全一致。
+
+用法: python benchmarks/bench_drip.py [--plans 6] [--years 5] [--days 30]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import calendars  # noqa: E402
+from ledger import Ledger, next_nominal_date  # noqa: E402
+
+FREQS = ("daily", "weekly", "monthly")
+
+
+def make_ledger(plans, years, today, seed=0):
+    rng = random.Random(seed)
+    ledger = Ledger()
+    start = today - timedelta(days=365 * years)
+    ledger.lock_initial(start, 10_000_000)
+    for i in range(plans):
+        ledger.add_plan(f"P{i}", ("CN", "US")[i % 2], FREQS[i % 3], float(rng.choice([50, 100, 200, 500])),
+                        start + timedelta(days=rng.randint(0, 60)))
+    return ledger
+
+
+def snapshot(ledger):
+    return sorted((d[0], round(d[1], 2), d[2]) for d in ledger.drip_records)
+
+
+def mutate(step, ledgers, rng):
+    """对两个账本做同样的修改"""
+    kind = step % 4
+    if kind == 0 and ledgers[0].drip_records:
+        i = rng.randrange(len(ledgers[0].drip_records))
+        target = ledgers[0].drip_records[i][:3]  # 两个账本补录批次不同，记录 id 不一定相同
+        ignore = rng.random() < 0.5
+        for lg in ledgers:
+            rid = next(d[3] for d in lg.drip_records if d[:3] == target)
+            lg.delete_records([rid], ignore_date=ignore)
+    elif kind == 1:
+        j = rng.randrange(len(ledgers[0].drip_plans))
+        for lg in ledgers:
+            plan = lg.drip_plans[j]
+            lg.set_plan_active(plan, not plan.get('active', True))
+    elif kind == 2:
+        j = rng.randrange(len(ledgers[0].drip_plans))
+        for lg in ledgers:
+            lg.update_plan(lg.drip_plans[j], amount=lg.drip_plans[j]['amount'] + 10)
+
+
+def linear_lookup(days_list, nominal_dates):
+    """旧版 find_execution_date：每个名义日期从头扫描交易日列表"""
+    out = []
+    for target in nominal_dates:
+        for d in days_list:
+            if d >= target:
+                out.append(d)
+                break
+        else:
+            out.append(target)
+    return out
+
+
+def bench_lookup(years, today):
+    start = today - timedelta(days=365 * years)
+    print(f"{'market':>6} {'freq':>8} {'dates':>6} {'linear(ms)':>11} {'searchsorted(ms)':>17} {'speedup':>8}")
+    for market in ("CN", "US"):
+        ordinals = calendars.trading_day_ordinals(market, start, today + timedelta(days=15))
+        days_list = [date.fromordinal(int(d)) for d in ordinals]
+        for freq in FREQS:
+            nominal = []
+            d = start
+            while d <= today:
+                nominal.append(d)
+                d = next_nominal_date(d, freq)
+            t0 = time.perf_counter()
+            expected = linear_lookup(days_list, nominal)
+            t_linear = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            rolled = calendars.roll_forward(ordinals, [x.toordinal() for x in nominal])
+            t_fast = time.perf_counter() - t0
+            assert [x.toordinal() for x in expected] == rolled.tolist()
+            print(f"{market:>6} {freq:>8} {len(nominal):>6} {t_linear * 1000:>11.2f} {t_fast * 1000:>17.3f} "
+                  f"{t_linear / t_fast:>7.0f}x")
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--plans", type=int, default=6)
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--days", type=int, default=30, help="模拟连续启动的天数")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    today = date(2024, 6, 28)
+    first_day = today - timedelta(days=args.days)
+    # 预热交易日缓存，避免第一次取日历的耗时算进任何一方
+    calendars.preload(("CN", "US"), first_day - timedelta(days=365 * args.years + 60), today + timedelta(days=15))
+    bench_lookup(args.years, today)
+
+    incremental = make_ledger(args.plans, args.years, today, args.seed)
+    replay = make_ledger(args.plans, args.years, today, args.seed)
+    for a, b in zip(incremental.drip_plans, replay.drip_plans):
+        b['id'] = a['id']
+
+    t0 = time.perf_counter()
+    incremental.generate_drip_records(first_day)
+    t_cold = time.perf_counter() - t0
+    replay.generate_drip_records(first_day, full=True)
+    assert snapshot(incremental) == snapshot(replay)
+
+    rng = random.Random(args.seed)
+    t_inc = t_full = 0.0
+    for step in range(1, args.days + 1):
+        day = first_day + timedelta(days=step)
+        mutate(step, (incremental, replay), rng)
+        t0 = time.perf_counter()
+        incremental.generate_drip_records(day)
+        t_inc += time.perf_counter() - t0
+        t0 = time.perf_counter()
+        replay.generate_drip_records(day, full=True)
+        t_full += time.perf_counter() - t0
+        assert snapshot(incremental) == snapshot(replay), f"第 {step} 天结果不一致"
+
+    print(f"plans={args.plans} years={args.years} records={len(incremental.drip_records)}")
+    print(f"首次补录: {t_cold * 1000:.1f} ms")
+    print(f"每次启动: 从头重算 {t_full / args.days * 1000:.2f} ms, 增量 {t_inc / args.days * 1000:.2f} ms "
+          f"({t_full / max(t_inc, 1e-9):.0f}x)")
+    print(f"{args.days} 天增量结果与从头重算一致")
+
+
+if __name__ == "__main__":
+    main()
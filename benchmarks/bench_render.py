@@ -0,0 +1,121 @@
+"""
+明细树渲染基准
+
+旧版 render_tree_view（全部删除后按月展开插入所有行）vs 懒加载 LedgerTree，
+在 1k / 10k / 100k 条记录下比较：
+1. 整体渲染耗时
+2. 新增一条记录后的刷新耗时（旧版整体重建 vs 只插入一行）
+需要图形界面；没有显示器（如 CI、SSH）时跳过。
+
+用法: python benchmarks/bench_render.py [--sizes 1000 10000 100000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ledger import Ledger  # noqa: E402
+from tree_view import INIT_ID, TYPE_INIT, LedgerTree, display_row  # noqa: E402
+
+
+def make_ledger(n, seed=0):
+    rng = random.Random(seed)
+    ledger = Ledger()
+    start = date(2010, 1, 4)
+    ledger.lock_initial(start, 10_000_000)
+    days = sorted(start + timedelta(days=rng.randrange(365 * 14)) for _ in range(n))
+    ledger.load_rows([], [(d, -rng.choice([5000, 10000, 20000]), f"计划:P{i % 5}", None, None)
+                          for i, d in enumerate(days)])
+    ledger.restore_aggregates()
+    return ledger
+
+
+def ledger_rows(ledger):
+    """账本 -> 旧版的显示行列表，未排序"""
+    rows = []
+    if ledger.is_initialized:
+        rows.append((ledger.start_date_obj, TYPE_INIT, -ledger.initial_capital, "---", INIT_ID))
+    rows += [display_row(r, False) for r in ledger.records]
+    rows += [display_row(d, True) for d in ledger.drip_records]
+    return rows
+
+
+def legacy_render(tree, ledger):
+    """旧版 render_tree_view 的插入逻辑"""
+    for item in tree.get_children():
+        tree.delete(item)
+    all_items = sorted(ledger_rows(ledger), key=lambda x: x[0])
+    current_month_key = None
+    month_items = []
+
+    def insert_month_group(month_key, items):
+        if not month_key: return
+        month_sum = sum(item[2] for item in items)
+        p_id = tree.insert("", "end", text=f"📅 {month_key} (月度净流: {month_sum:+.2f})", open=True, tags=('group',))
+        for item in items:
+            tree.insert(p_id, "end", text=item[0].strftime("%Y-%m-%d"), values=(item[1], f"{item[2]}", item[3]))
+
+    for item in all_items:
+        month_key = item[0].strftime("%Y年%m月")
+        if month_key != current_month_key:
+            insert_month_group(current_month_key, month_items)
+            current_month_key = month_key
+            month_items = []
+        month_items.append(item)
+    insert_month_group(current_month_key, month_items)
+
+
+def timed(fn, root):
+    t0 = time.perf_counter()
+    fn()
+    root.update_idletasks()  # 把布局/重绘也算进去
+    return time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    args = parser.parse_args()
+
+    import tkinter
+    from tkinter import ttk
+    try:
+        root = tkinter.Tk()
+    except tkinter.TclError as e:
+        print(f"跳过: 没有可用的显示器 ({e})")
+        return
+    root.geometry("800x600")
+    columns = ("type", "amount", "remark")
+
+    print(f"{'rows':>7} {'legacy(ms)':>11} {'lazy(ms)':>9} {'add legacy(ms)':>15} {'add lazy(ms)':>13}")
+    for n in args.sizes:
+        ledger = make_ledger(n)
+
+        tree = ttk.Treeview(root, columns=columns)
+        tree.pack(fill="both", expand=True)
+        t_legacy = timed(lambda: legacy_render(tree, ledger), root)
+        rec = ledger.add_record(date(2015, 6, 15), -10000, "bench")
+        t_add_legacy = timed(lambda: legacy_render(tree, ledger), root)
+        ledger.delete_records([rec[3]])
+        tree.destroy()
+
+        tree = ttk.Treeview(root, columns=columns)
+        tree.pack(fill="both", expand=True)
+        view = LedgerTree(tree)
+        t_lazy = timed(lambda: view.render(ledger), root)
+        view.expand((2015, 6))
+        rec = ledger.add_record(date(2015, 6, 15), -10000, "bench")
+        t_add_lazy = timed(lambda: view.add_record(rec), root)
+        tree.destroy()
+
+        print(f"{n:>7} {t_legacy * 1000:>11.1f} {t_lazy * 1000:>9.1f} {t_add_legacy * 1000:>15.1f} "
+              f"{t_add_lazy * 1000:>13.2f}")
+    root.destroy()
+
+
+if __name__ == "__main__":
+    main()
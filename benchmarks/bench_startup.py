@@ -0,0 +1,118 @@
+"""
+启动耗时基准
+
+1. python -X importtime 导入 main / cli 的耗时拆分（按累计耗时排序）
+2. 界面首次绘制时间（time-to-first-paint），需要图形环境，无显示器时跳过
+3. 命令行冷启动一次 XIRR 的总耗时
+
+用法: python benchmarks/bench_startup.py [--top 15] [--repeat 3] [--json out.json]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FIRST_PAINT_SNIPPET = r"""
+import json, time
+t0 = time.perf_counter()
+import main
+app = main.GroupedFundApp()
+state = {}
+
+def on_map(event):
+    if state: return
+    app.update_idletasks()
+    state["first_paint"] = time.perf_counter() - t0
+    app.after(10, app.destroy)
+
+app.bind("<Map>", on_map)
+app.after(10000, app.destroy)
+app.mainloop()
+print(json.dumps(state))
+"""
+
+
+def import_breakdown(module, top):
+    """返回 (总耗时秒, [(累计秒, 自身秒, 模块名)])"""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=ROOT, capture_output=True, text=True)
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line: continue
+        self_us, cum_us, name = line[len("import time:"):].split("|")
+        rows.append((int(cum_us) / 1e6, int(self_us) / 1e6, name.rstrip()))
+    total = next((r[0] for r in rows if r[2].strip() == module), float("nan"))
+    rows.sort(key=lambda r: -r[0])
+    return total, rows[:top]
+
+
+def first_paint(repeat):
+    best = None
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory() as tmp:
+            # 在空目录启动，避免读到真实数据文件
+            env = dict(os.environ, PYTHONPATH=ROOT)
+            proc = subprocess.run([sys.executable, "-c", FIRST_PAINT_SNIPPET], cwd=tmp, env=env,
+                                  capture_output=True, text=True)
+        if proc.returncode != 0:
+            return None, proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "unknown error"
+        value = json.loads(proc.stdout.strip().splitlines()[-1]).get("first_paint")
+        if value is not None:
+            best = value if best is None else min(best, value)
+    return best, None
+
+
+def cli_cold_start(repeat):
+    with tempfile.TemporaryDirectory() as tmp:
+        data = os.path.join(tmp, "ledger.json")
+        with open(data, "w", encoding="utf-8") as f:
+            json.dump({"initialized": True, "initial_capital": 10000, "start_date": "2020-01-01",
+                       "records": [], "drip_records": [], "drip_plans": []}, f)
+        best = float("inf")
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            subprocess.run([sys.executable, os.path.join(ROOT, "cli.py"), "--file", data,
+                            "xirr", "--end-value", "12000", "--end-date", "2021-01-01"],
+                           cwd=tmp, capture_output=True, check=True)
+            best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", help="把结果写入 JSON 文件，便于跟踪回归")
+    args = parser.parse_args()
+
+    result = {}
+    for module in ("main", "cli"):
+        total, rows = import_breakdown(module, args.top)
+        result[f"import_{module}_s"] = total
+        print(f"\nimport {module}: {total * 1000:.1f} ms")
+        print(f"{'cumulative(ms)':>15} {'self(ms)':>9}  module")
+        for cum, own, name in rows:
+            print(f"{cum * 1000:>15.1f} {own * 1000:>9.1f}  {name}")
+
+    paint, error = first_paint(args.repeat)
+    result["first_paint_s"] = paint
+    if paint is None:
+        print(f"\ntime-to-first-paint: 跳过 ({error})")
+    else:
+        print(f"\ntime-to-first-paint: {paint * 1000:.1f} ms")
+
+    result["cli_xirr_cold_start_s"] = cli_cold_start(args.repeat)
+    print(f"cli xirr cold start: {result['cli_xirr_cold_start_s'] * 1000:.1f} ms")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
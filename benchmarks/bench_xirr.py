@@ -0,0 +1,106 @@
+"""
+XIRR 基准：向量化引擎 vs 旧版 brentq + 列表推导式
+
+用法: python benchmarks/bench_xirr.py [--sizes 10000 100000 1000000] [--legacy-limit N] [--batch M]
+                                      [--curve-years Y]
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+import numpy as np
+from scipy import optimize
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import xirr  # noqa: E402
+
+
+def make_flows(n, years=10, seed=0):
+    """n 笔随机买入 + 期末市值，日期分布在 years 年内"""
+    rng = np.random.default_rng(seed)
+    start = date(2015, 1, 1)
+    offsets = np.sort(rng.integers(0, years * 365, n - 1))
+    dates = [start + timedelta(days=int(o)) for o in offsets]
+    amounts = list(-rng.uniform(10, 1000, n - 1))
+    dates.append(start + timedelta(days=years * 365 + 1))
+    amounts.append(-sum(amounts) * 1.3)
+    return dates, amounts
+
+
+def legacy_xirr(dates, amounts):
+    """与原 GroupedFundApp.calculate_xirr 相同的求解路径"""
+    years = [(d - dates[0]).days / 365.0 for d in dates]
+
+    def xnpv(rate):
+        if rate <= -1.0: return float('inf')
+        return sum([a / ((1 + rate) ** y) for a, y in zip(amounts, years)])
+
+    try:
+        return optimize.brentq(xnpv, -0.999, 100)
+    except Exception:
+        return optimize.newton(xnpv, 0.1, maxiter=50)
+
+
+def timeit(fn, repeat):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--legacy-limit", type=int, default=1_000_000, help="超过该规模不跑旧版路径")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--batch", type=int, default=200, help="批量求解对比的组合数量")
+    parser.add_argument("--curve-years", type=int, default=10, help="收益率曲线对比的年数（每天一个点）")
+    args = parser.parse_args()
+
+    print(f"{'flows':>10} {'legacy(s)':>10} {'numpy(s)':>10} {'speedup':>8} {'rate':>12}")
+    for n in args.sizes:
+        dates, amounts = make_flows(n)
+        # 引擎直接吃数组，日期转换不计入求解时间
+        days = xirr.to_day_numbers(dates)
+        arr = np.asarray(amounts)
+        t_new, rate = timeit(lambda: xirr.xirr(days, arr), args.repeat)
+        if n <= args.legacy_limit:
+            t_old, rate_old = timeit(lambda: legacy_xirr(dates, amounts), 1)
+            assert abs(rate_old - rate) < 1e-6, (rate_old, rate)
+            print(f"{n:>10} {t_old:>10.3f} {t_new:>10.4f} {t_old / t_new:>7.0f}x {rate:>12.6%}")
+        else:
+            print(f"{n:>10} {'-':>10} {t_new:>10.4f} {'-':>8} {rate:>12.6%}")
+
+    if args.batch:
+        # 逐组循环 vs xirr_batch 一次求解（每组 1000 笔左右）
+        series = [make_flows(800 + 50 * (i % 9), seed=i) for i in range(args.batch)]
+        t_loop, loop_rates = timeit(lambda: [xirr.xirr(d, a) for d, a in series], args.repeat)
+        t_batch, batch_rates = timeit(lambda: xirr.xirr_batch(series), args.repeat)
+        assert np.allclose(loop_rates, batch_rates, atol=1e-8)
+        print(f"\nbatch x{args.batch}: loop {t_loop:.4f}s, xirr_batch {t_batch:.4f}s ({t_loop / t_batch:.1f}x)")
+
+    if args.curve_years:
+        # 每日收益率曲线：每个点各自 xirr_batch 求解 vs xirr_curve 前缀矩 + 热启动
+        dates, amounts = make_flows(args.curve_years * 250, years=args.curve_years)
+        days = xirr.to_day_numbers(dates[:-1])
+        flows = np.asarray(amounts[:-1])
+        ends = np.arange(days[0] + 1, days[0] + args.curve_years * 365 + 1)
+        invested = np.interp(ends, days, np.cumsum(-flows))
+        values = invested * (1 + 0.2 * np.sin(np.arange(ends.size) / 90))
+        prefix = np.searchsorted(days, ends, side="right")
+        series = [(np.append(days[:p], e), np.append(flows[:p], v)) for p, e, v in zip(prefix, ends, values)]
+        t_batch, batch_rates = timeit(lambda: xirr.xirr_batch(series), 1)
+        t_curve, curve_rates = timeit(lambda: xirr.xirr_curve(days, flows, ends, values), args.repeat)
+        assert np.allclose(batch_rates, curve_rates, atol=1e-8, equal_nan=True)
+        print(f"\ncurve {ends.size} points x {flows.size} flows: xirr_batch {t_batch:.3f}s, "
+              f"xirr_curve {t_curve:.3f}s ({t_batch / t_curve:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
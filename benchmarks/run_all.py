@@ -0,0 +1,314 @@
+"""
+基准测试套件：在合成账本（synthetic.py）上依次测量
+
+    drip_full         没有定投记录的账本首次补录（generate_daily_drip_records 冷启动）
+    drip_incremental  已补录到昨天，今天再打开一次
+    xirr              期末结算（calculate_xirr 的求解部分，不用 flow_cache 里已有的现金流与结果）
+    xirr_curve        按月末市值求收益率曲线
+    save_json / load_json      JSON 快照写出 / 读入（save_data(compact=True) / load_data_from_file）
+    save_sqlite / load_sqlite  同上，SQLite 存储
+    render            明细树整体渲染（render_tree_view）；没有显示器时用内存里的假 Treeview，只测 Python 部分
+    projection        前景模拟：各计划未来 10 年、1 万条路径（单进程，projection.project）
+
+每项报告耗时（取 --repeat 次中最快的一次）与峰值内存（tracemalloc，另跑一次，含 numpy 数组）。
+--save 把结果连同参数、版本信息写成 JSON 基线；--compare 与旧基线对比，
+耗时或内存超过 --threshold 倍时标出并以退出码 1 结束，便于在不同版本之间发现性能回退。
+
+用法: python benchmarks/run_all.py [--plans 6] [--years 10] [--manual 10000] [--ignored 0.01]
+                                   [--only xirr save_json] [--save baselines/x.json] [--compare baselines/x.json]
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic import FREQUENCIES, TODAY, Params, make_ledger, synthetic_trading_days  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class FakeTree:
+    """ttk.Treeview 里 LedgerTree 用到的那部分接口，存在字典里"""
+
+    def __init__(self):
+        self.items = {"": {"children": [], "parent": None}}
+        self._next = 0
+
+    def bind(self, *args, **kwargs):
+        pass
+
+    def insert(self, parent, index, iid=None, **options):
+        if iid is None:
+            self._next += 1
+            iid = f"I{self._next}"
+        self.items[iid] = dict(options, children=[], parent=parent)
+        children = self.items[parent]["children"]
+        children.insert(len(children) if index == "end" else index, iid)
+        return iid
+
+    def delete(self, *iids):
+        for iid in iids:
+            item = self.items.pop(iid)
+            self.delete(*item["children"])
+            siblings = self.items.get(item["parent"])
+            if siblings is not None:
+                siblings["children"].remove(iid)
+
+    def get_children(self, iid=""):
+        return tuple(self.items[iid]["children"])
+
+    def item(self, iid, option=None, **options):
+        if option is not None:
+            return self.items[iid].get(option)
+        self.items[iid].update(options)
+
+    def focus(self):
+        return ""
+
+    def parent(self, iid):
+        return self.items[iid]["parent"]
+
+    def see(self, iid):
+        pass
+
+
+def make_tree():
+    """有显示器时用真正的 Treeview（含布局），否则用 FakeTree -> (tree, 刷新函数, 说明)"""
+    try:
+        import tkinter
+        from tkinter import ttk
+    except ImportError as e:
+        return FakeTree(), lambda: None, f"headless ({e})"
+    try:
+        root = tkinter.Tk()
+    except tkinter.TclError as e:
+        return FakeTree(), lambda: None, f"headless ({e})"
+    root.withdraw()
+    tree = ttk.Treeview(root, columns=("type", "amount", "remark"))
+    tree.pack(fill="both", expand=True)
+    return tree, root.update_idletasks, "tk"
+
+
+# ================= 各项基准：setup() -> 被测函数 =================
+
+def case_drip_full(params, tmp):
+    def setup():
+        ledger = make_ledger(params)
+        return lambda: ledger.generate_drip_records(TODAY, synthetic_trading_days)
+    return setup
+
+
+def case_drip_incremental(params, tmp):
+    def setup():
+        ledger = make_ledger(params, drip_through=TODAY - timedelta(days=1))
+        return lambda: ledger.generate_drip_records(TODAY, synthetic_trading_days)
+    return setup
+
+
+def _end_value(ledger):
+    days, amounts = ledger.cash_flow_arrays()
+    return int(-amounts.sum() * 1.3)
+
+
+def case_xirr(params, tmp):
+    from flow_cache import FlowCache
+
+    ledger = make_ledger(params, drip_through=TODAY)
+    end_value = _end_value(ledger)
+
+    def setup():
+        ledger.flow_cache = FlowCache()  # 冷启动：重新整理现金流、从默认初值求解
+        return lambda: ledger.xirr(TODAY, end_value)
+    return setup
+
+
+def case_xirr_curve(params, tmp):
+    ledger = make_ledger(params, drip_through=TODAY)
+    start = ledger.start_date_obj
+    ends = [date(y, m, 1) - timedelta(days=1) for y in range(start.year, TODAY.year + 1) for m in range(1, 13)
+            if start < date(y, m, 1) - timedelta(days=1) <= TODAY]
+    days, amounts = ledger.cash_flow_arrays()
+    # 市值 = 截至当天的净投入 * 1.1，够用来求解
+    order = np.argsort(days, kind="stable")
+    cum = np.cumsum(-amounts[order])
+    idx = np.searchsorted(days[order], [d.toordinal() for d in ends], side="right") - 1
+    values = (np.maximum(cum[idx], 1) * 1.1).astype(np.int64)
+    return lambda: ledger.xirr_curve(ends, values)
+
+
+def _store_cases(suffix):
+    def save(params, tmp):
+        from storage import open_store
+
+        ledger = make_ledger(params, drip_through=TODAY)
+        path = os.path.join(tmp, "save" + suffix)
+
+        def setup():
+            for extra in ("", ".journal", "-wal", "-shm"):
+                if os.path.exists(path + extra): os.remove(path + extra)
+            store = open_store(path)
+            return lambda: store.compact(ledger)
+        return setup
+
+    def load(params, tmp):
+        from storage import open_store
+
+        path = os.path.join(tmp, "load" + suffix)
+        if not os.path.exists(path):
+            open_store(path).compact(make_ledger(params, drip_through=TODAY))
+        return lambda: open_store(path).load()
+
+    return save, load
+
+
+case_save_json, case_load_json = _store_cases(".json")
+case_save_sqlite, case_load_sqlite = _store_cases(".db")
+
+
+def case_render(params, tmp):
+    from tree_view import LedgerTree
+
+    ledger = make_ledger(params, drip_through=TODAY)
+    tree, flush, _ = make_tree()
+    view = LedgerTree(tree)
+
+    def run():
+        view.render(ledger)
+        flush()
+    return run
+
+
+def case_projection(params, tmp):
+    import projection
+
+    ledger = make_ledger(params)
+    return lambda: projection.project(ledger.drip_plans, TODAY, 10, 10_000, seed=0,
+                                      trading_days=synthetic_trading_days, max_workers=1)
+
+
+CASES = {
+    "drip_full": case_drip_full,
+    "drip_incremental": case_drip_incremental,
+    "xirr": case_xirr,
+    "xirr_curve": case_xirr_curve,
+    "save_json": case_save_json,
+    "load_json": case_load_json,
+    "save_sqlite": case_save_sqlite,
+    "load_sqlite": case_load_sqlite,
+    "render": case_render,
+    "projection": case_projection,
+}
+
+# 这些项每次计时前都要重新准备（被测函数会改动账本或文件），case 返回的是 setup
+_NEEDS_SETUP = {"drip_full", "drip_incremental", "xirr", "save_json", "save_sqlite"}
+
+
+def measure(name, case, repeat):
+    """(最快耗时, 峰值内存 MB)；tracemalloc 会拖慢 Python 代码，计时与测内存分开跑"""
+    make = case if name in _NEEDS_SETUP else (lambda: case)
+    best = float("inf")
+    for _ in range(repeat):
+        fn = make()
+        gc.collect()
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    fn = make()
+    gc.collect()
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak / 2 ** 20
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                                text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {"commit": commit, "python": platform.python_version(), "numpy": np.__version__,
+            "platform": platform.platform(), "cpus": os.cpu_count(), "time": time.strftime("%Y-%m-%d %H:%M:%S")}
+
+
+def compare(results, baseline, threshold):
+    """打印与基线的对比，返回回退的项目列表"""
+    old = baseline["results"]
+    if baseline.get("params") is not None:
+        print(f"\n与基线对比（基线 commit {baseline.get('env', {}).get('commit')}，参数 {baseline['params']}）")
+    print(f"{'case':>17} {'time x':>8} {'memory x':>9}")
+    regressions = []
+    for name, r in results.items():
+        if name not in old: continue
+        t = r["seconds"] / old[name]["seconds"] if old[name]["seconds"] else float("nan")
+        m = r["peak_mb"] / old[name]["peak_mb"] if old[name]["peak_mb"] else float("nan")
+        flag = "  <-- 回退" if t > threshold or m > threshold else ""
+        if flag: regressions.append(name)
+        print(f"{name:>17} {t:>8.2f} {m:>9.2f}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    defaults = Params()
+    parser.add_argument("--plans", type=int, default=defaults.plans, help="定投计划数")
+    parser.add_argument("--freqs", nargs="+", choices=FREQUENCIES, default=list(defaults.freqs),
+                        help="计划频率，按顺序轮流分配")
+    parser.add_argument("--markets", nargs="+", default=list(defaults.markets), help="计划市场，按顺序轮流分配")
+    parser.add_argument("--years", type=int, default=defaults.years, help="历史年数")
+    parser.add_argument("--manual", type=int, default=defaults.manual, help="手工买卖记录条数")
+    parser.add_argument("--ignored", type=float, default=defaults.ignored, help="被忽略的定投日期比例")
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--only", nargs="+", choices=list(CASES), help="只跑这几项")
+    parser.add_argument("--save", help="把结果写成 JSON 基线")
+    parser.add_argument("--compare", help="与之前保存的 JSON 基线对比")
+    parser.add_argument("--threshold", type=float, default=1.25, help="超过基线多少倍算回退")
+    args = parser.parse_args()
+
+    params = Params(args.plans, tuple(args.freqs), tuple(args.markets), args.years, args.manual, args.ignored,
+                    args.seed)
+    sample = make_ledger(params, drip_through=TODAY)
+    print(f"参数: {dict(params._asdict())}")
+    print(f"账本: 手工 {len(sample.records)} 条, 定投 {len(sample.drip_records)} 条")
+    del sample
+
+    results = {}
+    print(f"\n{'case':>17} {'seconds':>9} {'peak MB':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in args.only or CASES:
+            seconds, peak = measure(name, CASES[name](params, tmp), args.repeat)
+            results[name] = {"seconds": round(seconds, 6), "peak_mb": round(peak, 3)}
+            print(f"{name:>17} {seconds:>9.4f} {peak:>9.1f}")
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({"env": environment(), "params": dict(params._asdict()), "results": results}, f,
+                      indent=2, ensure_ascii=False)
+        print(f"\n已保存基线: {args.save}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("params") not in (None, json.loads(json.dumps(params._asdict()))):
+            print("\n注意: 基线的账本参数与本次不同，对比没有意义")
+        if compare(results, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
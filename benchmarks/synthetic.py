@@ -0,0 +1,82 @@
+"""
+基准测试用的合成账本（确定性：同样的参数和种子总是生成同样的账本）
+
+可调：定投计划数、频率组合、市场、历史年数、手工买卖记录条数、被忽略日期（ignored_dates）的密度。
+交易日历默认用 synthetic_trading_days（工作日去掉固定节假日），不联网、不依赖本地缓存，
+结果在任何机器上都一样；需要真实日历时把 trading_days=None 传给 make_ledger。
+
+    from synthetic import Params, make_ledger
+    ledger = make_ledger(Params(plans=12, years=15, manual=100_000))
+"""
+import os
+import random
+import sys
+from collections import namedtuple
+from datetime import date, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ledger import FREQUENCIES, Ledger, next_nominal_date  # noqa: E402
+
+TODAY = date(2024, 6, 28)
+
+Params = namedtuple("Params", "plans freqs markets years manual ignored seed",
+                    defaults=(6, FREQUENCIES, ("CN", "US"), 10, 10_000, 0.01, 0))
+
+# 固定节假日（月, 日）；只求确定、有顺延，不求与交易所一致
+_HOLIDAYS = {
+    "CN": [(1, 1), (5, 1), (5, 2), (5, 3)] + [(10, d) for d in range(1, 8)],
+    "US": [(1, 1), (7, 4), (12, 25)],
+}
+
+
+def synthetic_trading_days(market, start_date, end_date):
+    """与 calendars.trading_day_ordinals 同样的签名：[start, end] 内的交易日序号数组（升序）"""
+    start, end = start_date.toordinal(), end_date.toordinal()
+    if start > end: return np.empty(0, dtype=np.int32)
+    days = np.arange(start, end + 1, dtype=np.int64)
+    weekday = (days - 1) % 7  # date.fromordinal(1) 是星期一
+    keep = weekday < 5
+    holidays = [date(y, m, d).toordinal() for y in range(start_date.year, end_date.year + 1)
+                for m, d in _HOLIDAYS.get(market, [])]
+    keep &= ~np.isin(days, holidays)
+    return days[keep].astype(np.int32)
+
+
+def make_ledger(params=Params(), today=TODAY, drip_through=None, trading_days=synthetic_trading_days):
+    """
+    生成账本：初始本金、params.manual 条手工买卖、params.plans 个定投计划（频率与市场轮流取），
+    每个计划按 params.ignored 的比例把名义日期标记为忽略。
+    drip_through 不为 None 时补录定投到这一天（模拟已经用了很久的账本），否则没有定投记录。
+    返回的账本没有待保存的操作，和刚从文件加载的一样。
+    """
+    rng = random.Random(params.seed)
+    start = today - timedelta(days=365 * params.years)
+    span = (today - start).days
+
+    ledger = Ledger()
+    manual = [(start + timedelta(days=rng.randrange(span)), rng.choice((-1, -1, -1, 1)) * rng.randrange(100, 10 ** 7),
+               rng.choice(("手动", "加仓", "分红", "赎回")), i + 1, None) for i in range(params.manual)]
+    ledger.load_rows(manual, [], params.manual + 1)
+    ledger.restore_aggregates()
+    ledger.lock_initial(start, 10 ** 9)
+
+    for i in range(params.plans):
+        frequency = params.freqs[i % len(params.freqs)]
+        plan_start = start + timedelta(days=rng.randrange(60))
+        ledger.add_plan(f"P{i}", params.markets[i % len(params.markets)], frequency,
+                        float(rng.choice((50, 100, 200, 500, 1000))), plan_start)
+        plan = ledger.drip_plans[-1]
+        plan["id"] = f"plan-{i}"  # uuid 每次不同，换成固定的
+        d = plan_start
+        while d <= today:
+            if rng.random() < params.ignored:
+                plan["ignored_dates"].append(d.strftime("%Y-%m-%d"))
+            d = next_nominal_date(d, frequency)
+
+    if drip_through is not None:
+        ledger.generate_drip_records(drip_through, trading_days)
+    ledger.take_pending_ops()
+    return ledger
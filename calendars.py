@@ -0,0 +1,190 @@
+"""
+交易日历（无界面依赖）
+
+按市场代码（CN/US）提供交易日；未安装 pandas_market_calendars 且没有本地缓存时
+返回空列表，由调用方降级为"名义日期即执行日期"。
+pandas_market_calendars 连带 pandas 导入较慢，因此首次用到时才导入，
+日历对象也按市场懒加载并缓存（可在后台线程中调用 preload 预热）。
+
+交易日另外落盘缓存在 CACHE_DIR 下：每个市场一个升序 int32 日序号数组（.npy，
+按 date.toordinal()，内存映射读取）加一个记录覆盖区间与日历库版本的 .json。
+请求区间超出缓存时只向 mcal 拉取缺失的首/尾部分；日历库版本变化时整体重新拉取，
+拉取失败则继续用旧缓存。离线或未安装 mcal 时直接使用已有缓存，此时返回的交易日可能
+只覆盖缓存的区间（定投补录不会用缓存之外的名义日期推进水位线，见 Ledger.plan_drip）。
+"""
+import importlib.metadata
+import importlib.util
+import json
+import os
+import threading
+from datetime import date
+
+import numpy as np
+
+import profiling
+from columns import from_datetime64
+
+# 只探测是否安装，不在导入本模块时加载
+HAS_MCAL = importlib.util.find_spec("pandas_market_calendars") is not None
+if not HAS_MCAL:
+    print("提示: 未检测到 pandas_market_calendars，将无法自动剔除节假日。")
+
+MARKETS = {
+    'CN': 'XSHG',  # A股
+    'US': 'NYSE',  # 美股
+}
+
+CACHE_DIR = "calendar_cache"
+
+
+_calendars = {}
+_lock = threading.Lock()
+
+
+def mcal_version():
+    if not HAS_MCAL: return None
+    try:
+        return importlib.metadata.version("pandas_market_calendars")
+    except importlib.metadata.PackageNotFoundError:
+        return None
+
+
+def get_calendar(market):
+    """返回市场对应的 mcal 日历对象，失败返回 None"""
+    if not HAS_MCAL or market not in MARKETS: return None
+    with _lock:
+        if market not in _calendars:
+            try:
+                with profiling.span("calendar.build", market=market):
+                    import pandas_market_calendars as mcal
+                    _calendars[market] = mcal.get_calendar(MARKETS[market])
+            except Exception as e:
+                print(f"日历初始化失败 ({market}): {e}")
+                _calendars[market] = None
+        return _calendars[market]
+
+
+def preload(markets=None, start_date=None, end_date=None):
+    """
+    预先准备日历（适合在界面显示后放到后台线程执行）。
+    给定区间时确保该区间已进入本地缓存（缓存已覆盖则不会加载 mcal），否则只构建日历对象。
+    """
+    for market in markets or MARKETS:
+        if start_date is not None and end_date is not None:
+            trading_day_ordinals(market, start_date, end_date)
+        else:
+            get_calendar(market)
+
+
+# ================= 本地缓存 =================
+
+def _cache_paths(market):
+    return os.path.join(CACHE_DIR, f"{market}.npy"), os.path.join(CACHE_DIR, f"{market}.json")
+
+
+@profiling.traced("calendar.cache_read")
+def _read_cache(market):
+    """返回 (meta, ordinals)，缓存不存在或损坏时返回 (None, None)"""
+    npy_path, meta_path = _cache_paths(market)
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        days = np.load(npy_path, mmap_mode="r")
+    except (OSError, ValueError):
+        return None, None
+    if meta.get("calendar") != MARKETS.get(market) or days.dtype != np.int32:
+        return None, None
+    return meta, days
+
+
+def _write_cache(market, days, start, end, version):
+    """先写临时文件再替换，避免写一半的缓存；临时文件名带进程号，多个进程同时补录时互不干扰"""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    npy_path, meta_path = _cache_paths(market)
+    suffix = f".{os.getpid()}.tmp"
+    with open(npy_path + suffix, "wb") as f:
+        np.save(f, np.ascontiguousarray(days, dtype=np.int32))
+    os.replace(npy_path + suffix, npy_path)
+    meta = {"calendar": MARKETS[market], "mcal_version": version, "start": int(start), "end": int(end)}
+    with open(meta_path + suffix, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(meta_path + suffix, meta_path)
+
+
+def _fetch(market, start, end):
+    """从 mcal 拉取 [start, end]（日序号）内的交易日，失败返回 None"""
+    cal = get_calendar(market)
+    if cal is None: return None
+    try:
+        with profiling.span("calendar.fetch", market=market, days=int(end - start + 1)):
+            schedule = cal.schedule(start_date=date.fromordinal(int(start)), end_date=date.fromordinal(int(end)))
+    except Exception as e:
+        print(f"获取 {market} 日历失败: {e}")
+        return None
+    days = from_datetime64(schedule.index.values)
+    return np.unique(days).astype(np.int32)
+
+
+def trading_day_ordinals(market, start_date, end_date):
+    """
+    [start_date, end_date] 内的交易日，升序 int32 日序号数组（date.toordinal()）。
+    优先读本地缓存，只补拉缺失的区间；没有任何数据来源时返回空数组。
+    """
+    start, end = start_date.toordinal(), end_date.toordinal()
+    if market not in MARKETS or start > end: return np.empty(0, dtype=np.int32)
+
+    with _lock:
+        meta, days = _read_cache(market)
+    version = mcal_version()
+    stale = None
+    if meta is not None and HAS_MCAL and meta.get("mcal_version") != version:
+        stale, meta = days, None  # 日历库升级，节假日规则可能变化；拉取失败时仍用旧缓存
+
+    if meta is None:
+        fetched = _fetch(market, start, end)
+        if fetched is None:
+            if stale is None: return np.empty(0, dtype=np.int32)
+            days, dirty = stale, False
+        else:
+            days, lo, hi = fetched, start, end
+            dirty = True
+        stale = None  # 释放内存映射（同下）
+    else:
+        lo, hi = meta["start"], meta["end"]
+        parts = [days]
+        dirty = False
+        if HAS_MCAL and start < lo:
+            head = _fetch(market, start, lo - 1)
+            if head is not None:
+                parts.insert(0, head)
+                lo, dirty = start, True
+        if HAS_MCAL and end > hi:
+            tail = _fetch(market, hi + 1, end)
+            if tail is not None:
+                parts.append(tail)
+                hi, dirty = end, True
+        if dirty:
+            days = np.concatenate(parts)
+        del parts  # 释放内存映射，Windows 下被映射的文件无法替换
+
+    if dirty:
+        try:
+            with _lock:
+                _write_cache(market, days, lo, hi, version)
+        except OSError as e:
+            print(f"写入 {market} 日历缓存失败: {e}")
+
+    i, j = np.searchsorted(days, [start, end + 1])
+    return np.array(days[i:j])  # 拷贝出来，不让调用方持有内存映射
+
+
+def roll_forward(days, targets):
+    """
+    把每个目标日序号顺延到不早于它的第一个交易日（一次 searchsorted）。
+    超出日历范围或没有日历时保持原值（降级模式：名义日期即执行日期）。
+    """
+    targets = np.asarray(targets, dtype=np.int64)
+    if days is None or len(days) == 0: return targets
+    idx = np.searchsorted(days, targets, side="left")
+    inside = idx < len(days)
+    return np.where(inside, np.asarray(days, dtype=np.int64)[np.minimum(idx, len(days) - 1)], targets)
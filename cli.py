@@ -0,0 +1,317 @@
+"""
+命令行入口（无界面）
+
+    python cli.py xirr --end-value 123456.78 [--end-date 2024-12-31] [--file my_fund_data.json]
+    python cli.py curve values.csv [--out curve.csv] [--file my_fund_data.json]
+    python cli.py metrics --end-value 123456.78 [--values values.csv] [--end-date 2024-12-31]
+    python cli.py project [--years 10 --paths 100000 --mean 0.08 --vol 0.2 --start-value 50000]
+    python cli.py drip [--today 2024-12-31] [--file my_fund_data.json]
+    python cli.py monthly [--file ledger.db]
+    python cli.py import backup.json [--file my_fund_data.json]
+    python cli.py export backup.json [--file my_fund_data.json]
+    python cli.py import-csv statement.csv [--date-col 成交日期 --amount-col 发生金额 --sign invest ...]
+
+--file 以 .db/.sqlite/.sqlite3 结尾时使用 SQLite 存储；
+JSON 与 SQLite 之间迁移：python cli.py --file ledger.db import my_fund_data.json
+
+多组合工作区（目录里每个数据文件是一个组合，见 workspace.py）：
+
+    python cli.py --workspace funds portfolios
+    python cli.py --workspace funds drip-all [--today 2024-12-31]
+    python cli.py --workspace funds xirr-all 招商=123456.78 养老=45678 [--end-date 2024-12-31]
+
+性能分析（见 profiling.py）：python cli.py --profile trace.json drip，或 --cprofile run.prof
+"""
+import argparse
+import csv
+import sys
+
+import profiling
+from ledger import DATA_FILE, Ledger, parse_date, solve_xirr, solve_xirr_curve, today_beijing
+from money import fmt, to_cents
+from storage import open_store
+
+
+def cmd_xirr(args):
+    import xirr
+
+    store = open_store(args.file)
+    end_date = parse_date(args.end_date) if args.end_date else today_beijing()
+    end_value = to_cents(args.end_value)
+    try:
+        # 存储层直接给出数组（SQLite 不构造完整账本）
+        days, amounts = store.cash_flow_arrays()
+        rate, profit = solve_xirr(days, amounts, end_date, end_value)
+    except xirr.XirrConvergenceError:
+        print("计算失败: 数据可能不收敛", file=sys.stderr)
+        return 1
+    print(f"年化: {rate * 100:.2f}% | 盈亏: {fmt(profit, grouping=True)}")
+    return 0
+
+
+def read_values(path):
+    """历史市值 CSV：每行 日期,市值(元)，首行是表头时跳过 -> (日期列表, 市值(分)列表)"""
+    dates, values = [], []
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        for i, row in enumerate(csv.reader(f)):
+            if not row or not row[0].strip(): continue
+            try:
+                d = parse_date(row[0].strip())
+            except ValueError:
+                if i == 0: continue
+                raise ValueError(f"{path} 第 {i + 1} 行日期无效: {row[0]!r}") from None
+            if len(row) < 2:
+                raise ValueError(f"{path} 第 {i + 1} 行缺少市值")
+            dates.append(d)
+            values.append(to_cents(row[1]))
+    return dates, values
+
+
+def cmd_metrics(args):
+    import analytics
+    from flow_cache import make_flows
+
+    store = open_store(args.file)
+    end_date = parse_date(args.end_date) if args.end_date else today_beijing()
+    end_value = to_cents(args.end_value)
+    valuations = read_values(args.values) if args.values else None
+    metrics = analytics.analyze(make_flows(*store.cash_flow_arrays()), end_date, end_value, valuations)
+    for line in analytics.describe(metrics):
+        print(line)
+    return 0 if metrics.xirr is not None else 1
+
+
+def cmd_project(args):
+    import projection
+
+    ledger = open_store(args.file).load()
+    today = parse_date(args.today) if args.today else today_beijing()
+    start_value = to_cents(args.start_value) if args.start_value else 0
+    result = projection.project(ledger.drip_plans, today, args.years, args.paths, args.mean, args.vol, start_value,
+                                args.seed, max_workers=args.workers)
+    print(f"模拟 {result.paths} 条路径，{today} 至 {result.end_date}，投入合计 {fmt(result.contributed, grouping=True)}")
+    print(f"{'分位':>6} {'期末市值':>18} {'年化':>9}")
+    for level, value, rate in zip(result.levels, result.values.tolist(), result.rates.tolist()):
+        print(f"{level:>5}% {fmt(value, grouping=True):>20} {'—' if rate != rate else f'{rate * 100:.2f}%':>10}")
+    print(f"期末市值均值 {fmt(result.mean_value, grouping=True)}，亏损概率 {result.loss_probability * 100:.1f}%")
+    return 0
+
+
+def cmd_curve(args):
+    dates, values = read_values(args.values)
+    days, amounts = open_store(args.file).cash_flow_arrays()
+    rates = solve_xirr_curve(days, amounts, dates, values)
+
+    out = open(args.out, "w", newline="", encoding="utf-8") if args.out else sys.stdout
+    try:
+        writer = csv.writer(out)
+        writer.writerow(["date", "value", "xirr"])
+        for d, v, r in zip(dates, values, rates.tolist()):
+            writer.writerow([d.strftime("%Y-%m-%d"), fmt(v), "" if r != r else f"{r:.6f}"])
+    finally:
+        if args.out: out.close()
+    return 0
+
+
+def cmd_monthly(args):
+    # SQLite 存储直接用 SQL 聚合，不加载整个账本
+    store = open_store(args.file)
+    rows = store.monthly_net_flow()
+    print(f"{'月份':<8} {'流入':>16} {'流出':>16} {'净流':>16}")
+    for month, inflow, outflow, net in rows:
+        print(f"{month:<10} {fmt(inflow, grouping=True):>18} {fmt(outflow, grouping=True):>18} "
+              f"{fmt(net, grouping=True):>18}")
+    invested, cash = store.totals()
+    print(f"累计投入: {fmt(invested, grouping=True)} | 剩余现金: {fmt(cash, grouping=True)}")
+    return 0
+
+
+def cmd_drip(args):
+    store = open_store(args.file)
+    ledger = store.load()
+    today = parse_date(args.today) if args.today else today_beijing()
+    new_cnt = ledger.generate_drip_records(today)
+    store.commit(ledger)
+    print(f"已自动补录 {new_cnt} 条记录 (包含顺延处理)")
+    return 0
+
+
+def cmd_import(args):
+    store = open_store(args.file)
+    store.load()  # 取得现有日志的序号，新快照的序号不能回退
+    store.compact(Ledger.load(args.path))
+    print(f"已导入 {args.path} -> {args.file}")
+    return 0
+
+
+def cmd_import_csv(args):
+    import csv_import
+
+    store = open_store(args.file)
+    ledger = store.load()
+    if not ledger.is_initialized:
+        raise ValueError("数据文件尚未锁定初始本金")
+    buy_values = tuple(v.strip() for v in args.buy_values.split(",")) if args.buy_values else None
+    added, dupes, invalid = csv_import.import_csv(
+        ledger, args.path, match_remark=not args.ignore_remark, dry_run=args.dry_run,
+        date=args.date_col, amount=args.amount_col, remark=args.remark_col, date_format=args.date_format,
+        sign=args.sign, side=args.side_col, buy_values=buy_values, encoding=args.encoding, delimiter=args.delimiter)
+    if added and not args.dry_run:
+        store.commit(ledger)
+    print(f"{'将' if args.dry_run else '已'}导入 {added} 条，跳过重复 {dupes} 条，无效行 {invalid} 条")
+    return 0
+
+
+def cmd_export(args):
+    open_store(args.file).load().save(args.path)
+    print(f"已导出 {args.file} -> {args.path}")
+    return 0
+
+
+def _workspace(args):
+    from workspace import Workspace
+
+    if not args.workspace:
+        raise ValueError("请用 --workspace 指定工作区目录")
+    return Workspace(args.workspace)
+
+
+def cmd_portfolios(args):
+    ws = _workspace(args)
+    for name in ws.names():
+        print(f"{name}\t{ws.path(name)}")
+    return 0
+
+
+def cmd_drip_all(args):
+    today = parse_date(args.today) if args.today else today_beijing()
+    ws = _workspace(args)
+    try:
+        counts = ws.drip_all(today)
+    finally:
+        ws.close()
+    for name, new_cnt in counts.items():
+        print(f"{name}: 补录 {new_cnt} 条")
+    return 0
+
+
+def cmd_xirr_all(args):
+    ws = _workspace(args)
+    end_values = {}
+    for item in args.values:
+        name, sep, value = item.rpartition("=")
+        if not sep or not name:
+            raise ValueError(f"参数应为 组合名=市值: {item}")
+        ws.path(name)
+        end_values[name] = to_cents(value)
+    end_date = parse_date(args.end_date) if args.end_date else today_beijing()
+    try:
+        result = ws.xirr_all(end_values, end_date)
+    finally:
+        ws.close()
+    for name in end_values:
+        if name in result.errors:
+            print(f"{name}: 计算失败 ({result.errors[name]})")
+        else:
+            rate, profit = result.rates[name]
+            print(f"{name}: 年化 {rate * 100:.2f}% | 盈亏 {fmt(profit, grouping=True)}")
+    if isinstance(result.total, Exception):
+        print(f"汇总: 计算失败 ({result.total})")
+        return 1
+    rate, profit = result.total
+    print(f"汇总: 年化 {rate * 100:.2f}% | 盈亏 {fmt(profit, grouping=True)}")
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="annualized-return", description="基金/股票年化收益记账本（命令行）")
+    parser.add_argument("--file", default=DATA_FILE, help=f"数据文件，默认 {DATA_FILE}")
+    parser.add_argument("--workspace", help="多组合工作区目录（portfolios / drip-all / xirr-all 使用）")
+    parser.add_argument("--profile", metavar="PATH",
+                        help="记录各阶段耗时，.json 写 Chrome trace，其他扩展名写 JSON 行日志（见 profiling.py）")
+    parser.add_argument("--cprofile", metavar="PATH", help="整个运行包在 cProfile 里，结果写到 PATH")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("xirr", help="计算年化收益率")
+    p.add_argument("--end-value", required=True, help="当前总市值（元）")
+    p.add_argument("--end-date", help="结算日期 YYYY-MM-DD，默认北京时间今天")
+    p.set_defaults(func=cmd_xirr)
+
+    p = sub.add_parser("metrics", help="一次计算年化、Modified Dietz、时间加权收益与资金回撤")
+    p.add_argument("--end-value", required=True, help="当前总市值（元）")
+    p.add_argument("--end-date", help="结算日期 YYYY-MM-DD，默认北京时间今天")
+    p.add_argument("--values", help="中间市值 CSV（日期,市值），给了才计算时间加权收益")
+    p.set_defaults(func=cmd_metrics)
+
+    p = sub.add_parser("project", help="蒙特卡洛模拟定投计划未来的期末市值与年化分布")
+    p.add_argument("--years", type=int, default=10, help="模拟年数，默认 10")
+    p.add_argument("--paths", type=int, default=10_000, help="路径数，默认 10000")
+    p.add_argument("--mean", type=float, default=0.08, help="年化期望收益，默认 0.08")
+    p.add_argument("--vol", type=float, default=0.2, help="年化波动率，默认 0.2")
+    p.add_argument("--start-value", help="当前市值（元），计入今天的投入")
+    p.add_argument("--today", help="模拟起点 YYYY-MM-DD，默认北京时间今天")
+    p.add_argument("--seed", type=int, help="随机种子，相同则结果相同")
+    p.add_argument("--workers", type=int, help="进程数，默认按 CPU 核数；1 为不开进程池")
+    p.set_defaults(func=cmd_project)
+
+    p = sub.add_parser("curve", help="按历史市值序列计算年化收益率曲线")
+    p.add_argument("values", help="历史市值 CSV（日期,市值），如每个月末一行")
+    p.add_argument("--out", help="输出 CSV，默认打印到屏幕")
+    p.set_defaults(func=cmd_curve)
+
+    p = sub.add_parser("monthly", help="按月汇总流入、流出与净流")
+    p.set_defaults(func=cmd_monthly)
+
+    p = sub.add_parser("drip", help="补录定投记录并保存")
+    p.add_argument("--today", help="补录截止日期 YYYY-MM-DD，默认北京时间今天")
+    p.set_defaults(func=cmd_drip)
+
+    p = sub.add_parser("import", help="从备份文件恢复到数据文件")
+    p.add_argument("path")
+    p.set_defaults(func=cmd_import)
+
+    p = sub.add_parser("import-csv", help="批量导入 CSV 流水（券商对账单等），自动跳过已有记录")
+    p.add_argument("path")
+    p.add_argument("--date-col", help="日期列名，默认按表头猜测")
+    p.add_argument("--amount-col", help="金额列名，默认按表头猜测")
+    p.add_argument("--remark-col", help="备注列名，默认按表头猜测，没有时备注为“导入”")
+    p.add_argument("--date-format", help="日期格式，如 %%Y%%m%%d，默认自动识别")
+    p.add_argument("--sign", choices=("cash", "invest"), help="cash: 负数为买入（默认）；invest: 正数为买入")
+    p.add_argument("--side-col", help="买卖方向列名，指定后按该列判断买卖，金额取绝对值")
+    p.add_argument("--buy-values", help="买卖方向列中表示买入的值，逗号分隔")
+    p.add_argument("--encoding", help="文件编码，默认先试 UTF-8 再试 GBK")
+    p.add_argument("--delimiter", help="分隔符，默认逗号")
+    p.add_argument("--ignore-remark", action="store_true", help="去重时不比较备注，只按日期和金额")
+    p.add_argument("--dry-run", action="store_true", help="只统计，不写入")
+    p.set_defaults(func=cmd_import_csv)
+
+    p = sub.add_parser("export", help="把数据文件导出为备份")
+    p.add_argument("path")
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser("portfolios", help="列出工作区里的组合")
+    p.set_defaults(func=cmd_portfolios)
+
+    p = sub.add_parser("drip-all", help="所有组合并行补录定投并保存")
+    p.add_argument("--today", help="补录截止日期 YYYY-MM-DD，默认北京时间今天")
+    p.set_defaults(func=cmd_drip_all)
+
+    p = sub.add_parser("xirr-all", help="各组合与汇总的年化收益率（并行计算）")
+    p.add_argument("values", nargs="+", help="组合名=当前总市值（元），只计算列出的组合")
+    p.add_argument("--end-date", help="结算日期 YYYY-MM-DD，默认北京时间今天")
+    p.set_defaults(func=cmd_xirr_all)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    profiling.configure(args.profile, args.cprofile)
+    try:
+        return args.func(args)
+    except ValueError as e:
+        print(f"错误: {e}", file=sys.stderr)
+        return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
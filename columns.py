@@ -0,0 +1,254 @@
+"""
+列式记录容器
+
+账本的买卖记录与定投记录按列存放在 numpy 数组里：
+日序号(int32, date.toordinal)、金额(int64 分)、类型、计划编码、备注编码、记录 id、存活标记。
+备注与计划 id 各自驻留成一张小表，"计划:xxx" 不再每行存一份字符串。
+追加按容量倍增摊销 O(1)；删除只把存活标记清掉 O(1)，死行过多时再整体压缩。
+view() 在没有死行时直接返回数组切片（零拷贝），XIRR、汇总与界面渲染都从这里取数。
+定投行另有按 (备注, 金额) 分组的索引（drip_days），补录去重只看续算起点之后的行；
+索引只在主线程建立和维护，后台线程通过 drip_snapshot() 拿只读快照。
+"""
+from collections import namedtuple
+from datetime import date
+
+import numpy as np
+
+KIND_RECORD = 0  # 手动买卖
+KIND_DRIP = 1  # 定投
+
+NO_PLAN = -1
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()  # datetime64[D] 的 0 对应的日序号
+
+View = namedtuple("View", "day amount kind plan remark rid row")
+
+
+def to_datetime64(days):
+    """日序号(数组) -> datetime64[D]"""
+    return (np.asarray(days, dtype=np.int64) - EPOCH_ORDINAL).astype("datetime64[D]")
+
+
+def from_datetime64(values):
+    """datetime64 数组（任意精度）-> 日序号数组(int64)"""
+    return np.asarray(values).astype("datetime64[D]").astype(np.int64) + EPOCH_ORDINAL
+
+
+class Columns:
+    def __init__(self, capacity=1024):
+        self.n = 0  # 已用行数（含已删除的死行）
+        self.dead = 0
+        self.edits = 0  # 删除/压缩的次数；只追加时不变（flow_cache 据此判断能否增量更新）
+        self.day = np.empty(capacity, dtype=np.int32)
+        self.amount = np.empty(capacity, dtype=np.int64)
+        self.kind = np.empty(capacity, dtype=np.int8)
+        self.plan = np.empty(capacity, dtype=np.int32)  # plan_ids 表下标，NO_PLAN 表示没有
+        self.remark = np.empty(capacity, dtype=np.int32)  # remarks 表下标
+        self.rid = np.empty(capacity, dtype=np.int64)
+        self.alive = np.empty(capacity, dtype=bool)
+        self.remarks = []
+        self._remark_code = {}
+        self.plan_ids = []
+        self._plan_code = {}
+        self.row_of = {}  # 记录 id -> 行号
+        # 定投去重索引：(备注编码, 金额) -> [日序号数组, 行号数组, 条数, 日期是否非降]，
+        # 按追加顺序；第一次用到时建立（见 drip_snapshot），压缩后重建
+        self._drip = None
+
+    def __len__(self):
+        return self.n - self.dead
+
+    # ================= 驻留表 =================
+
+    def remark_code(self, text):
+        code = self._remark_code.get(text)
+        if code is None:
+            code = self._remark_code[text] = len(self.remarks)
+            self.remarks.append(text)
+        return code
+
+    def plan_code(self, plan_id):
+        if plan_id is None: return NO_PLAN
+        code = self._plan_code.get(plan_id)
+        if code is None:
+            code = self._plan_code[plan_id] = len(self.plan_ids)
+            self.plan_ids.append(plan_id)
+        return code
+
+    def find_remark(self, text):
+        """备注编码，表里没有返回 None（用于按备注筛选）"""
+        return self._remark_code.get(text)
+
+    # ================= 追加 / 删除 =================
+
+    _FIELDS = ("day", "amount", "kind", "plan", "remark", "rid", "alive")
+
+    def _reserve(self, extra):
+        need = self.n + extra
+        cap = len(self.day)
+        if need <= cap: return
+        cap = max(need, cap * 2)
+        for name in self._FIELDS:
+            old = getattr(self, name)
+            new = np.empty(cap, dtype=old.dtype)
+            new[:self.n] = old[:self.n]
+            setattr(self, name, new)
+
+    def append(self, day, amount, kind, remark, rid, plan_id=None):
+        """追加一行，day 为日序号；返回行号"""
+        self._reserve(1)
+        i = self.n
+        self.day[i] = day
+        self.amount[i] = amount
+        self.kind[i] = kind
+        self.plan[i] = self.plan_code(plan_id)
+        self.remark[i] = self.remark_code(remark)
+        self.rid[i] = rid
+        self.alive[i] = True
+        self.row_of[rid] = i
+        self.n += 1
+        if kind == KIND_DRIP and self._drip is not None:
+            self._index_drip(i, i + 1)
+        return i
+
+    def extend(self, days, amounts, kind, remarks, rids, plan_ids):
+        """批量追加同一类型的多行（定投补录、加载）"""
+        k = len(rids)
+        if not k: return
+        self._reserve(k)
+        s = slice(self.n, self.n + k)
+        self.day[s] = days
+        self.amount[s] = amounts
+        self.kind[s] = kind
+        self.plan[s] = [self.plan_code(p) for p in plan_ids]
+        self.remark[s] = [self.remark_code(r) for r in remarks]
+        self.rid[s] = rids
+        self.alive[s] = True
+        self.row_of.update(zip(rids, range(self.n, self.n + k)))
+        self.n += k
+        if kind == KIND_DRIP and self._drip is not None:
+            self._index_drip(s.start, s.stop)
+
+    def delete(self, rid):
+        """按记录 id 删除，返回被删的行号；不存在返回 None"""
+        i = self.row_of.pop(rid, None)
+        if i is None: return None
+        self.alive[i] = False
+        self.dead += 1
+        self.edits += 1
+        return i
+
+    def compact(self):
+        """去掉死行（行号会变，记录 id 不变）"""
+        if not self.dead: return
+        keep = np.flatnonzero(self.alive[:self.n])
+        for name in self._FIELDS:
+            arr = getattr(self, name)
+            arr[:len(keep)] = arr[keep]
+        self.n, self.dead = len(keep), 0
+        self.edits += 1
+        self.row_of = dict(zip(self.rid[:self.n].tolist(), range(self.n)))
+        self._drip = None
+
+    def maybe_compact(self):
+        if self.dead > 1024 and self.dead * 2 > self.n:
+            self.compact()
+
+    # ================= 定投去重索引 =================
+
+    def _index_drip(self, start, stop):
+        """把 [start, stop) 里的定投行按 (备注, 金额) 追加进索引"""
+        rows = np.arange(start, stop)
+        rows = rows[self.kind[start:stop] == KIND_DRIP]
+        if not rows.size: return
+        remark, amount = self.remark[rows], self.amount[rows]
+        order = np.lexsort((amount, remark))  # 稳定排序，组内保持追加顺序
+        rows, remark, amount = rows[order], remark[order], amount[order]
+        cut = np.flatnonzero((remark[1:] != remark[:-1]) | (amount[1:] != amount[:-1])) + 1
+        for part in np.split(rows, cut):
+            key = (int(self.remark[part[0]]), int(self.amount[part[0]]))
+            days = self.day[part]
+            entry = self._drip.get(key)
+            if entry is None:
+                entry = self._drip[key] = [np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int64), 0, True]
+            k = entry[2]
+            need = k + len(part)
+            if need > len(entry[0]):
+                cap = max(need, 2 * len(entry[0]), 16)
+                for j, dtype in ((0, np.int32), (1, np.int64)):
+                    new = np.empty(cap, dtype=dtype)
+                    new[:k] = entry[j][:k]
+                    entry[j] = new
+            entry[3] = entry[3] and (k == 0 or days[0] >= entry[0][k - 1]) and bool((days[1:] >= days[:-1]).all())
+            entry[0][k:need] = days
+            entry[1][k:need] = part
+            entry[2] = need
+
+    def drip_snapshot(self):
+        """
+        定投索引的只读快照：(备注编码, 金额) -> (日序号数组, 行号数组, 日期是否非降)。
+        索引还没建立时先建立，所以要在主线程调用；快照里的数组是索引已写部分的切片，
+        之后的追加只写在切片之外（或换成新数组），后台线程可以放心读。
+        """
+        if self._drip is None:
+            self._drip = {}
+            self._index_drip(0, self.n)
+        return {key: (e[0][:e[2]], e[1][:e[2]], e[3]) for key, e in self._drip.items()}
+
+    def drip_days(self, remark, amount, since, snapshot=None):
+        """
+        备注编码、金额(分)相同的存活定投行里，日序号不早于 since 的那些日序号（定投补录去重用）。
+        snapshot 为 drip_snapshot() 的结果，不传时现取（只能在主线程）；
+        组内按日期追加时（通常如此）二分定位，只取 since 之后的部分，耗时与历史记录条数无关。
+        """
+        if snapshot is None:
+            snapshot = self.drip_snapshot()
+        entry = snapshot.get((remark, amount))
+        if entry is None: return np.empty(0, dtype=np.int32)
+        days, rows, ordered = entry
+        if ordered:
+            start = int(np.searchsorted(days, since))
+            days, rows = days[start:], rows[start:]
+        else:
+            keep = days >= since
+            days, rows = days[keep], rows[keep]
+        return days[self.alive[rows]]
+
+    # ================= 读取 =================
+
+    def view(self, kind=None):
+        """
+        存活行的各列（按追加顺序）。没有死行且不筛类型时是切片视图，不拷贝；
+        调用方不要修改返回的数组。
+        """
+        n = self.n
+        if self.dead == 0 and kind is None:
+            return View(self.day[:n], self.amount[:n], self.kind[:n], self.plan[:n], self.remark[:n],
+                        self.rid[:n], np.arange(n))
+        mask = self.alive[:n].copy()
+        if kind is not None:
+            mask &= self.kind[:n] == kind
+        rows = np.flatnonzero(mask)
+        return View(self.day[rows], self.amount[rows], self.kind[rows], self.plan[rows], self.remark[rows],
+                    self.rid[rows], rows)
+
+    def record(self, i):
+        """第 i 行 -> (date, amount, remark, id, plan_id)"""
+        p = int(self.plan[i])
+        return (date.fromordinal(int(self.day[i])), int(self.amount[i]), self.remarks[self.remark[i]],
+                int(self.rid[i]), self.plan_ids[p] if p != NO_PLAN else None)
+
+    def get(self, rid):
+        """按记录 id 取 (记录, 是否定投)，不存在返回 None"""
+        i = self.row_of.get(rid)
+        if i is None: return None
+        return self.record(i), bool(self.kind[i] == KIND_DRIP)
+
+    def records(self, kind, by_date=False):
+        """某一类型的存活记录，元组列表；by_date=True 时按日期稳定排序"""
+        v = self.view(kind)
+        order = np.argsort(v.day, kind="stable") if by_date else slice(None)
+        days, amounts = v.day[order].tolist(), v.amount[order].tolist()
+        remarks, plans, rids = v.remark[order].tolist(), v.plan[order].tolist(), v.rid[order].tolist()
+        return [(date.fromordinal(d), a, self.remarks[r], i, self.plan_ids[p] if p != NO_PLAN else None)
+                for d, a, r, p, i in zip(days, amounts, remarks, plans, rids)]
@@ -0,0 +1,192 @@
+"""
+批量导入 CSV（券商对账单、其他记账软件导出的流水）
+
+1. read_csv：pandas 读取整个文件，日期、金额整列向量化解析，列名、日期格式、正负号约定可配置
+   （CsvFormat；不指定时按表头猜测常见列名）；
+2. plan_import：与账本现有记录（买卖 + 定投）按 日期/金额/备注 去重，
+   用 (日期+备注, 金额) 的哈希索引统计已有条数——同一笔在文件里出现 k 次、账本里已有 j 次时只导入 k-j 次，
+   所以同一个文件重复导入、相邻月份对账单有重叠都不会重复记账。只读账本，可以放到后台线程；
+3. Ledger.apply_import：一条 import 操作一次写入，界面只整体刷新一次。
+"""
+from collections import namedtuple
+
+import numpy as np
+
+import profiling
+from columns import from_datetime64, to_datetime64
+from money import to_cents_array
+
+
+SIGNS = ("cash", "invest")
+
+# date / amount / remark / side 为列名；date_format 为 strftime 格式，None 时自动识别；
+# encoding 为 None 时先按 UTF-8 读，失败再按 GBK（国内券商导出的文件常见）；
+# sign: "cash" 金额按资金流向（负数为买入，与账本一致），"invest" 正数为买入；
+# side 不为空时按该列判断买卖（值在 buy_values 里为买入），金额取绝对值
+CsvFormat = namedtuple("CsvFormat", "date amount remark date_format sign side buy_values encoding delimiter",
+                       defaults=(None, None, "cash", None, ("买入", "证券买入", "申购", "buy", "B"), None, ","))
+
+DEFAULT_REMARK = "导入"
+
+# 猜测表头时认识的列名（小写比较）
+_ALIASES = {
+    "date": ("date", "日期", "成交日期", "交易日期", "发生日期", "trade date"),
+    "amount": ("amount", "金额", "发生金额", "成交金额", "清算金额", "资金发生数", "net amount"),
+    "remark": ("remark", "备注", "摘要", "证券名称", "description", "memo"),
+    "side": ("side", "买卖方向", "买卖标志", "操作", "业务名称", "action"),
+}
+
+# 自动识别时依次尝试的日期格式（都是整列向量化解析），都不行时逐个解析
+_DATE_FORMATS = ("ISO8601", "%Y/%m/%d", "%Y%m%d", "%Y.%m.%d")
+
+
+def guess_format(columns, **overrides):
+    """按表头猜测列名；找不到日期或金额列时抛出 ValueError"""
+    found = {}
+    lower = {str(c).strip().lower(): c for c in columns}
+    for field, names in _ALIASES.items():
+        for name in names:
+            if name in lower:
+                found[field] = lower[name]
+                break
+    found.update({k: v for k, v in overrides.items() if v is not None})
+    if "date" not in found or "amount" not in found:
+        raise ValueError(f"无法识别日期/金额列，请指定列名（表头: {', '.join(map(str, columns))}）")
+    return CsvFormat(**found)
+
+
+def _parse_dates(values, date_format):
+    """字符串列 -> 日序号数组（无法解析为 -1）；流水里日期大量重复，只解析不同的值"""
+    import pandas as pd
+
+    codes, uniques = pd.factorize(values.str.strip())
+    values = pd.Series(uniques, dtype=str)
+    for fmt in (date_format,) if date_format else _DATE_FORMATS:
+        parsed = pd.to_datetime(values, format=fmt, errors="coerce")
+        if not date_format and (parsed.isna() & (values != "")).any():
+            continue  # 这种格式解析不了全部，换下一种
+        break
+    else:
+        parsed = pd.to_datetime(values, format="mixed", errors="coerce")
+    days = from_datetime64(parsed.to_numpy(dtype="datetime64[D]"))
+    days = np.where(parsed.isna().to_numpy(), -1, days)
+    return days[codes] if len(days) else np.full(len(codes), -1, dtype=np.int64)
+
+
+def _read_frame(path, fmt, overrides, encoding, delimiter):
+    """先只读表头确定各列，再整体读取：金额列交给 C 解析器直接转成浮点数（支持千分位），其余列按字符串读"""
+    import pandas as pd
+
+    opts = dict(encoding=encoding, sep=delimiter, skipinitialspace=True)
+    names = [str(c).strip() for c in pd.read_csv(path, nrows=0, **opts).columns]
+    if fmt is None:
+        fmt = guess_format(names, **overrides)
+    elif overrides:
+        fmt = fmt._replace(**{k: v for k, v in overrides.items() if v is not None})
+    if fmt.sign not in SIGNS:
+        raise ValueError(f"未知的正负号约定: {fmt.sign}（可选 {', '.join(SIGNS)}）")
+    for col in (fmt.date, fmt.amount, fmt.remark, fmt.side):
+        if col is not None and col not in names:
+            raise ValueError(f"CSV 中没有列: {col}")
+    df = pd.read_csv(path, header=0, names=names, dtype={c: str for c in names if c != fmt.amount},
+                     keep_default_na=False, na_values={fmt.amount: [""]}, thousands=",", low_memory=False, **opts)
+    return fmt, df
+
+
+@profiling.traced("import.read_csv")
+def read_csv(path, fmt=None, **overrides):
+    """
+    读取 CSV -> (日序号数组, 金额(分)数组, 备注列表, 跳过的无效行数)。
+    fmt 为 None 时按表头猜测列名，overrides 可以覆盖个别字段（如 date_format="%Y%m%d"）。
+    日期或金额为空/无法解析、金额为 0 的行跳过。
+    """
+    import pandas as pd
+
+    encoding = overrides.get("encoding") or (fmt.encoding if fmt else None)
+    delimiter = overrides.get("delimiter") or (fmt.delimiter if fmt else ",")
+    for enc in [encoding] if encoding else ["utf-8-sig", "gbk"]:
+        try:
+            fmt, df = _read_frame(path, fmt, overrides, enc, delimiter)
+            break
+        except UnicodeDecodeError:
+            if enc == "gbk" or encoding: raise
+
+    days = _parse_dates(df[fmt.date], fmt.date_format)
+    amounts = df[fmt.amount]
+    if not pd.api.types.is_numeric_dtype(amounts):
+        # 带货币符号等 C 解析器不认识的写法：去掉后再整列转成数字
+        amounts = pd.to_numeric(amounts.astype(str).str.replace(r"[,\s¥￥$]", "", regex=True), errors="coerce")
+    amounts = amounts.to_numpy(dtype=np.float64, na_value=np.nan)
+    valid = (days >= 0) & np.isfinite(amounts)
+    cents = to_cents_array(np.where(valid, amounts, 0))
+    if fmt.side is not None:
+        buy = df[fmt.side].str.strip().isin(fmt.buy_values).to_numpy()
+        cents = np.where(buy, -np.abs(cents), np.abs(cents))
+    elif fmt.sign == "invest":
+        cents = -cents
+    valid &= cents != 0
+
+    if fmt.remark is not None:
+        remarks = df[fmt.remark].str.strip().to_numpy(dtype=object)[valid].tolist()
+    else:
+        remarks = [DEFAULT_REMARK] * int(valid.sum())
+    return days[valid], cents[valid], remarks, int((~valid).sum())
+
+
+@profiling.traced("import.dedupe")
+def plan_import(ledger, days, cents, remarks, match_remark=True):
+    """
+    计算要导入的记录（只读账本）-> (import 操作或 None, 因重复跳过的条数)。
+    match_remark=False 时只按 日期/金额 去重（对账单的备注与手工记录不一致时使用）。
+    """
+    import pandas as pd
+
+    days = np.asarray(days, dtype=np.int64)
+    cents = np.asarray(cents, dtype=np.int64)
+    if not len(days): return None, 0
+
+    # 备注转成账本驻留表里的编码，账本里没有的备注为 -1（不可能与已有记录重复）
+    cols = ledger.cols
+    if match_remark:
+        codes = pd.Categorical(remarks, categories=cols.remarks).codes.astype(np.int64)
+    else:
+        codes = np.zeros(len(days), dtype=np.int64)
+
+    v = cols.view()
+    near = (v.day >= days.min()) & (v.day <= days.max())  # 只有日期范围内的已有记录可能重复
+    old_codes = v.remark[near].astype(np.int64) if match_remark else np.zeros(int(near.sum()), dtype=np.int64)
+    # (日期, 备注编码) 合成一个 int64 键，与金额一起作为哈希索引的键
+    old = pd.DataFrame({"key": v.day[near].astype(np.int64) << 32 | (old_codes + 1), "amount": v.amount[near]})
+    have = old.groupby(["key", "amount"]).size()
+
+    new = pd.DataFrame({"key": days << 32 | (codes + 1), "amount": cents})
+    occurrence = new.groupby(["key", "amount"]).cumcount().to_numpy()  # 文件里第几次出现
+    existing = have.reindex(pd.MultiIndex.from_frame(new), fill_value=0).to_numpy()
+    keep = occurrence >= existing
+    skipped = int((~keep).sum())
+    if not keep.any(): return None, skipped
+
+    idx = np.flatnonzero(keep)
+    uniq, inverse = np.unique(days[idx], return_inverse=True)  # 每个日期只格式化一次
+    texts = np.array(np.datetime_as_string(to_datetime64(uniq)).tolist(), dtype=object)
+    op = {
+        "op": "import",
+        "first_id": ledger.next_id,
+        "dates": texts[inverse].tolist(),
+        "amounts": (cents[idx] / 100).tolist(),  # 日志里仍写元
+        "remarks": [remarks[i] for i in idx.tolist()],
+    }
+    return op, skipped
+
+
+def import_csv(ledger, path, fmt=None, match_remark=True, dry_run=False, **overrides):
+    """
+    读取 + 去重 + 应用，返回 (导入条数, 重复跳过条数, 无效跳过条数)；命令行使用。
+    dry_run=True 时不修改账本，导入条数为将要导入的条数。
+    界面在后台线程 read_csv + plan_import，回到主线程再 apply_import（见 main.import_csv_job）。
+    """
+    days, cents, remarks, invalid = read_csv(path, fmt, **overrides)
+    op, dupes = plan_import(ledger, days, cents, remarks, match_remark)
+    if dry_run:
+        return (len(op["dates"]) if op else 0), dupes, invalid
+    return ledger.apply_import(op), dupes, invalid
@@ -0,0 +1,149 @@
+"""
+XIRR 现金流缓存（按账本版本记忆）
+
+账本每次修改 version 加一（见 Ledger._apply）。这里按版本缓存：
+- 整理好的现金流：同一天合并、按日期排序的日序号与金额（分）、相对第一天的年化时间；
+  账本只是追加了记录（补录定投、新增买卖、CSV 导入）时，把新增的行合并进上一版本的数组，
+  不再整体排序；删除、压缩、改初始本金之后才重新整理；
+- 求解结果：(种类, 版本, 结束日期, 期末市值) -> 结果（xirr 为 (年化, 盈亏)，metrics 为 analytics.Metrics），
+  什么都没改时再按“计算”直接返回；
+  只改了期末市值时用上一次的收益率作为初值（热启动），通常少迭代几步。
+  热启动只用在根唯一的情形（现金流只变号一次），多根时结果不随之前算过什么而变。
+两者都按最近使用淘汰（LRU），数量有上限。
+
+Flows 一旦生成就不再修改，可以直接交给后台线程/进程求解，不必拷贝。
+"""
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+
+from xirr import DAYS_PER_YEAR
+
+MAX_VERSIONS = 4  # 保留的现金流版本数
+MAX_RESULTS = 64  # 保留的求解结果数
+
+# days: 升序、不重复的日序号(int64)；t: 相对 days[0] 的年化时间；cents: 每天的净现金流(int64 分)；
+# total: 现金流合计(分)
+Flows = namedtuple("Flows", "version days t cents total")
+
+
+def group_by_day(days, cents):
+    """
+    日序号/金额(分) -> 按日期排序、同一天合并后的 (日序号, 金额)，金额求和是精确的整数。
+    日期跨度不大时（通常如此）按天计数，不用排序。
+    """
+    days = np.asarray(days, dtype=np.int64)
+    cents = np.asarray(cents, dtype=np.int64)
+    if not days.size: return days, cents
+    first = int(days.min())
+    span = int(days.max()) - first + 1
+    if span <= 4 * days.size + 4096 and np.abs(cents).sum() < 2 ** 53:
+        # 合计不超过 2^53 分时 float64 加法是精确的
+        offset = days - first
+        present = np.flatnonzero(np.bincount(offset, minlength=span))
+        sums = np.bincount(offset, weights=cents, minlength=span)[present]
+        return present + first, np.rint(sums).astype(np.int64)
+    order = np.argsort(days, kind="stable")
+    days, cents = days[order], cents[order]
+    starts = np.flatnonzero(np.concatenate(([True], days[1:] != days[:-1])))
+    return days[starts], np.add.reduceat(cents, starts)
+
+
+def _merge(days, cents, new_days, new_cents):
+    """把新增的现金流合并进已排好序的数组（返回新数组，原数组不变）"""
+    new_days, new_cents = group_by_day(new_days, new_cents)
+    pos = np.searchsorted(days, new_days)
+    same = np.zeros(len(new_days), dtype=bool)
+    inside = pos < len(days)
+    same[inside] = days[pos[inside]] == new_days[inside]
+    cents = cents.copy()
+    cents[pos[same]] += new_cents[same]
+    fresh = ~same
+    return np.insert(days, pos[fresh], new_days[fresh]), np.insert(cents, pos[fresh], new_cents[fresh])
+
+
+def _year_fractions(days):
+    return (days - days[0]) / DAYS_PER_YEAR if days.size else np.empty(0)
+
+
+def make_flows(days, cents, version=None):
+    """任意顺序的现金流数组（如 SQLite 存储直接读出的）-> Flows"""
+    days, cents = group_by_day(days, cents)
+    return Flows(version, days, _year_fractions(days), cents, int(cents.sum()))
+
+
+class FlowCache:
+    def __init__(self, max_versions=MAX_VERSIONS, max_results=MAX_RESULTS):
+        self.max_versions = max_versions
+        self.max_results = max_results
+        self._flows = OrderedDict()  # 版本 -> (Flows, 生成时的列状态)
+        self._results = OrderedDict()  # (种类, 版本, 结束日序号, 期末市值) -> 结果
+        self._last_rate = None
+
+    # ================= 现金流 =================
+
+    @staticmethod
+    def _state(ledger):
+        """判断能否增量更新所需的账本状态：列对象、删除/压缩次数、行数、初始本金"""
+        cols = ledger.cols
+        init = (ledger.start_date_obj.toordinal(), ledger.initial_capital) if ledger.is_initialized else None
+        return cols, cols.edits, cols.n, init
+
+    def flows(self, ledger):
+        """账本当前版本的 Flows（在主线程调用）"""
+        entry = self._flows.get(ledger.version)
+        if entry is not None:
+            self._flows.move_to_end(ledger.version)
+            return entry[0]
+
+        state = self._state(ledger)
+        last = next(reversed(self._flows.values()), None)
+        if last is not None and last[1][:2] == state[:2] and last[1][3] == state[3] and last[1][2] <= state[2]:
+            # 上一版本之后只追加过行：合并 cols[旧行数:新行数]
+            old, cols = last[0], ledger.cols
+            s = slice(last[1][2], state[2])
+            days, cents = old.days, old.cents
+            if s.start < s.stop:
+                days, cents = _merge(days, cents, cols.day[s], cols.amount[s])
+            t = old.t if days is old.days else _year_fractions(days)
+            flows = Flows(ledger.version, days, t, cents, old.total + int(cols.amount[s].sum()))
+        else:
+            flows = make_flows(*ledger.cash_flow_arrays(), version=ledger.version)
+
+        self._flows[ledger.version] = (flows, state)
+        while len(self._flows) > self.max_versions:
+            self._flows.popitem(last=False)
+        return flows
+
+    # ================= 求解结果 =================
+
+    def lookup(self, version, end_date, end_value, kind="xirr"):
+        """之前算过同样的 (种类, 版本, 结束日期, 期末市值) 时返回上次的结果，否则 None"""
+        key = (kind, version, end_date.toordinal(), end_value)
+        result = self._results.get(key)
+        if result is not None:
+            self._results.move_to_end(key)
+        return result
+
+    def remember(self, version, end_date, end_value, result, kind="xirr"):
+        """result[0] 为收益率（不收敛时为 None），记下来作为下次的初值"""
+        self._results[(kind, version, end_date.toordinal(), end_value)] = result
+        while len(self._results) > self.max_results:
+            self._results.popitem(last=False)
+        if result[0] is not None:
+            self._last_rate = result[0]
+
+    def guess(self, flows, end_date, end_value, default=0.1):
+        """
+        热启动用的初值：上一次求得的收益率。flows 截到 end_date 后加上期末市值，
+        金额只变号一次时 NPV 在 (-1, ∞) 上只有一个根（笛卡尔符号法则），从哪里出发结果都一样；
+        否则可能有多个根，热启动会让结果取决于之前算过什么，改用固定的 default。
+        """
+        if self._last_rate is None: return default
+        end = end_date.toordinal()
+        p = int(np.searchsorted(flows.days, end, side="right"))
+        cents = np.append(flows.cents[:p], end_value)
+        if p and flows.days[p - 1] == end:
+            cents[-2:] = (0, cents[-2] + end_value)  # 结束日当天的现金流与期末市值是同一项
+        signs = np.sign(cents[cents != 0])
+        return self._last_rate if int((signs[1:] != signs[:-1]).sum()) == 1 else default
@@ -0,0 +1,233 @@
+"""
+账本 JSON 的流式读写
+
+读：按块读取文件，顶层字段逐个解析；records / drip_records 两个大数组逐个元素解码，
+每攒够 BATCH 条就批量转换（日期用 datetime64 向量化解析，金额整体换算成分）后追加进账本的列，
+不会先把整个文件变成一个大字典，内存占用只与块大小、批大小有关。
+写：从 Ledger.snapshot() 的列数据分块生成文本，紧凑格式（不缩进）。
+文件名以 .gz 结尾时写成 gzip；读取时按文件头自动识别是否压缩。
+"""
+import gzip
+import io
+import json
+import os
+import re
+
+import numpy as np
+
+import profiling
+from columns import KIND_DRIP, KIND_RECORD, NO_PLAN, from_datetime64, to_datetime64
+from ledger import parse_date
+from money import to_cents_array
+
+CHUNK = 1 << 20  # 每次读取的字符数
+BATCH = 65536  # 记录数组每批转换的条数
+_LOOKAHEAD = 64  # 比任何一个 JSON 数字都长
+
+_GZIP_MAGIC = b"\x1f\x8b"
+_decoder = json.JSONDecoder()
+_WHITESPACE = re.compile(r"[ \t\r\n]*")
+_SEPARATOR = re.compile(r"[ \t\r\n]*([,\]])[ \t\r\n]*")
+
+_ARRAYS = {"records": KIND_RECORD, "drip_records": KIND_DRIP}
+
+
+def _open_text(path):
+    with open(path, "rb") as f:
+        magic = f.read(2)
+    if magic == _GZIP_MAGIC:
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+
+# ================= 读取 =================
+
+class _Scanner:
+    """在按块读入的文本上逐个解码 JSON 值"""
+
+    def __init__(self, f):
+        self.f = f
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        data = self.f.read(CHUNK)
+        if not data:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """跳过空白，返回下一个字符（文件结束时为空串）"""
+        while True:
+            self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf): return self.buf[self.pos]
+            if not self._fill(): return ""
+
+    def expect(self, ch):
+        if self.peek() != ch:
+            raise ValueError(f"JSON 格式错误: 期望 {ch!r}，实际 {self.peek()!r}")
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                obj, end = _decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self._fill(): continue
+                raise
+            # 数字可能正好被块边界截断（如 "123." 后面的小数还没读进来），
+            # 离缓冲区末尾太近时多读一块再解一次
+            if len(self.buf) - end < _LOOKAHEAD and not self.eof and self._fill():
+                continue
+            self.pos = end
+            return obj
+
+    def items(self):
+        """顶层对象的 (键, 扫描器)；调用方必须在取下一个键之前把值读掉"""
+        self.expect("{")
+        if self.peek() == "}": return
+        while True:
+            key = self.value()
+            self.expect(":")
+            yield key, self
+            ch = self.peek()
+            self.pos += 1
+            if ch == "}": return
+            if ch != ",":
+                raise ValueError(f"JSON 格式错误: 期望 ',' 或 '}}'，实际 {ch!r}")
+
+    def elements(self):
+        """
+        逐个产出数组元素。这是读大文件的热点：直接用 C 实现的 scan_once 在缓冲区上连续解码，
+        元素之间的分隔符用一个正则跳过，只在缓冲区快用完时才读下一块。
+        """
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        scan = _decoder.scan_once
+        while True:
+            buf, pos = self.buf, self.pos
+            limit = len(buf) if self.eof else len(buf) - _LOOKAHEAD  # 离末尾太近的元素读入下一块再解
+            while pos < limit:
+                try:
+                    obj, end = scan(buf, pos)
+                except (StopIteration, json.JSONDecodeError) as e:
+                    if self.eof:  # 已读完仍解不出来：文件本身有错
+                        raise ValueError(f"JSON 格式错误: 位置 {pos} 附近") from e
+                    break  # 元素被块边界截断
+                m = _SEPARATOR.match(buf, end)
+                if end > limit or m is None:
+                    break
+                pos = m.end()
+                yield obj
+                if m.group(1) == "]":
+                    self.pos = pos
+                    return
+            self.pos = pos
+            if not self._fill():
+                raise ValueError("JSON 格式错误: 数组元素之间缺少 ',' 或数组不完整")
+
+
+def _day_ordinals(texts):
+    """'YYYY-MM-DD' 字符串列表 -> 日序号数组；有不规范的日期时逐个解析"""
+    try:
+        return from_datetime64(np.array(texts, dtype="datetime64[D]"))
+    except ValueError:
+        return np.array([parse_date(t).toordinal() for t in texts], dtype=np.int64)
+
+
+def _flush(ledger, kind, batch):
+    if not batch: return
+    ledger.append_rows(kind, _day_ordinals([r["date"] for r in batch]),
+                       to_cents_array([r["amount"] for r in batch]), [r.get("remark", "") for r in batch],
+                       [r.get("id") for r in batch], [r.get("plan_id") for r in batch])
+    batch.clear()
+
+
+@profiling.traced("io.read_json")
+def read_ledger(path, ledger):
+    """流式读取 JSON（或 gzip 压缩的 JSON）账本文件到空账本 ledger，返回 ledger"""
+    header = {}
+    with _open_text(path) as f:
+        ledger.begin_rows()
+        for key, scanner in _Scanner(f).items():
+            kind = _ARRAYS.get(key)
+            if kind is None:
+                header[key] = scanner.value()
+                continue
+            batch = []
+            for rec in scanner.elements():
+                batch.append(rec)
+                if len(batch) >= BATCH:
+                    _flush(ledger, kind, batch)
+            _flush(ledger, kind, batch)
+    ledger.finish_load(header)  # 其余字段都很小
+    return ledger
+
+
+# ================= 写入 =================
+
+def _dumps(value):
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+def _write_rows(f, snap, kind, chunk):
+    v = snap.view
+    rows = np.flatnonzero(v.kind == kind)
+    if kind == KIND_DRIP:
+        rows = rows[np.argsort(v.day[rows], kind="stable")]  # 与 Ledger.drip_records 一样按日期
+    remarks = [_dumps(r) for r in snap.remarks]  # 每种备注只编码一次
+    plans = [_dumps(p) for p in snap.plan_ids]
+    f.write("[")
+    for s in range(0, len(rows), chunk):
+        part = rows[s:s + chunk]
+        days = np.datetime_as_string(to_datetime64(v.day[part]))
+        amounts = (v.amount[part] / 100).tolist()  # 文件里仍是元
+        rids, codes = v.rid[part].tolist(), v.remark[part].tolist()
+        if kind == KIND_DRIP:
+            pcodes = v.plan[part].tolist()
+            text = ",".join(f'{{"id":{i},"date":"{d}","amount":{a!r},"remark":{remarks[r]},'
+                            f'"plan_id":{plans[p] if p != NO_PLAN else "null"}}}'
+                            for i, d, a, r, p in zip(rids, days.tolist(), amounts, codes, pcodes))
+        else:
+            text = ",".join(f'{{"id":{i},"date":"{d}","amount":{a!r},"remark":{remarks[r]}}}'
+                            for i, d, a, r in zip(rids, days.tolist(), amounts, codes))
+        f.write("," + text if s else text)
+    f.write("]")
+
+
+@profiling.traced("io.write_json")
+def write_ledger(snap, path, chunk=8192):
+    """
+    把 Ledger.snapshot() 写成紧凑 JSON（路径以 .gz 结尾时 gzip 压缩），键的顺序与 Ledger.to_dict 相同。
+    先写临时文件再替换，中途崩溃不会留下半个文件。
+    """
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as raw:
+        stream = gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6) if path.endswith(".gz") else raw
+        f = io.TextIOWrapper(stream, encoding="utf-8", write_through=False)
+        header = snap.header
+        f.write("{")
+        for key in ("initialized", "initial_capital", "start_date"):
+            f.write(f'"{key}":{_dumps(header[key])},')
+        f.write('"records":')
+        _write_rows(f, snap, KIND_RECORD, chunk)
+        f.write(',"drip_records":')
+        _write_rows(f, snap, KIND_DRIP, chunk)
+        for key, value in header.items():
+            if key not in ("initialized", "initial_capital", "start_date"):
+                f.write(f',"{key}":{_dumps(value)}')
+        f.write("}\n")
+        f.flush()
+        f.detach()
+        if stream is not raw:
+            stream.close()  # 写出 gzip 尾部，不关闭 raw
+        raw.flush()
+        os.fsync(raw.fileno())
+    os.replace(tmp, path)
@@ -0,0 +1,671 @@
+"""
+记账核心（无界面依赖）
+
+账本状态（初始本金、买卖记录、定投记录、定投计划）、定投补录、JSON 持久化
+与 XIRR 计算都在这里，不引用 customtkinter / tkcalendar / tkinter，
+可在服务器、定时任务或进程池中直接使用。界面层只负责展示与交互。
+"""
+import calendar
+import hashlib
+import json
+import os
+import uuid
+from collections import namedtuple
+from datetime import date, datetime, timedelta, timezone
+
+import numpy as np
+
+import profiling
+from aggregates import Aggregates
+from columns import KIND_DRIP, KIND_RECORD, NO_PLAN, Columns, View, from_datetime64
+from flow_cache import FlowCache, Flows, make_flows
+from money import to_cents, to_cents_array, yuan
+
+DATA_FILE = "my_fund_data.json"
+
+FREQUENCIES = ("daily", "weekly", "monthly")
+
+
+def today_beijing():
+    """北京时间的今天"""
+    utc_now = datetime.now(timezone.utc)
+    return utc_now.astimezone(timezone(timedelta(hours=8))).date()
+
+
+def parse_date(text):
+    try:
+        return date.fromisoformat(text)  # 比 strptime 快一个数量级
+    except ValueError:
+        return datetime.strptime(text, "%Y-%m-%d").date()
+
+
+def add_months(d, months=1):
+    """月份加减，日超出当月天数时取月末（与 pandas DateOffset(months=n) 一致）"""
+    month_index = d.year * 12 + d.month - 1 + months
+    year, month = divmod(month_index, 12)
+    month += 1
+    return date(year, month, min(d.day, calendar.monthrange(year, month)[1]))
+
+
+def plan_signature(plan):
+    """
+    影响补录结果的计划参数摘要。与水位线一起保存，参数（含 ignored_dates）
+    被外部修改后摘要对不上，该计划就从 start_date 重新补录。
+    """
+    key = [plan.get('name'), plan.get('market', 'CN'), plan.get('frequency', 'daily'), plan['amount'],
+           plan['start_date'], sorted(plan.get('ignored_dates', []))]
+    return hashlib.sha1(json.dumps(key, ensure_ascii=False).encode("utf-8")).hexdigest()[:16]
+
+
+def plan_to_json(p):
+    return {
+        "id": p.get("id", str(uuid.uuid4())),
+        "name": p.get("name"),
+        "market": p.get("market", "CN"),
+        "frequency": p.get("frequency", "daily"),  # 保存频率
+        "amount": p["amount"],
+        "start_date": p["start_date"],
+        "active": p.get("active", True),
+        "ignored_dates": list(p.get("ignored_dates", [])),  # 拷贝一份，后台线程写盘时界面可能还在改
+        # 补录水位线：该日期（含）之前的名义日期都已处理
+        "generated_through": p.get("generated_through"),
+        "generated_sig": p.get("generated_sig")
+    }
+
+
+def plan_from_json(p):
+    return {
+        "id": p.get("id", str(uuid.uuid4())),
+        "name": p.get("name", "定投计划"),
+        "market": p.get("market", "CN"),
+        "frequency": p.get("frequency", "daily"),  # 读取频率，默认daily
+        "amount": p["amount"],
+        "start_date": p["start_date"],
+        "start_date_obj": parse_date(p["start_date"]),
+        "active": p.get("active", True),
+        "ignored_dates": list(p.get("ignored_dates", [])),
+        "generated_through": p.get("generated_through"),
+        "generated_sig": p.get("generated_sig")
+    }
+
+
+def next_nominal_date(nominal_date, frequency):
+    """下一个【名义】日期 (保持节奏，不受顺延影响)"""
+    if frequency == 'weekly':
+        return nominal_date + timedelta(weeks=1)
+    if frequency == 'monthly':
+        return add_months(nominal_date, 1)
+    return nominal_date + timedelta(days=1)  # 默认日
+
+
+# 账本快照：header 为不含记录数组的 JSON 字典，view 为拷贝出来的列数据（见 Ledger.snapshot）
+Snapshot = namedtuple("Snapshot", "header view remarks plan_ids")
+
+
+class Ledger:
+    def __init__(self):
+        # 买卖记录与定投记录按列存放（见 columns.Columns）；单条记录对外表示为
+        # (date, amount, remark, id, plan_id)，amount 为 int 分（见 money），负数为投入，
+        # id 在账本内唯一且不复用（界面上作为 Treeview 的 iid），plan_id 为所属定投计划
+        self.cols = Columns()
+        self.next_id = 1
+        self.drip_plans = []
+        self.initial_capital = 0  # 分
+        self.start_date_obj = None
+        self.is_initialized = False
+        self.totals = Aggregates()  # 累计投入/剩余现金/月度净流，随每次修改增量更新
+        # 操作日志：每次修改都是一条可序列化的操作，seq 单调递增，
+        # pending_ops 为尚未写入存储的操作（见 storage.JournalStore）
+        self.seq = 0
+        self.pending_ops = []
+        # 内存里的版本号：每次修改（含重放、加载）加一，只增不减，不保存；
+        # flow_cache 按它缓存整理好的现金流与求解结果
+        self.version = 0
+        self.flow_cache = FlowCache()
+
+    # ================= 持久化 =================
+
+    def to_dict(self, with_records=True):
+        """整个账本 -> JSON 字典；with_records=False 时不含 records / drip_records 两个大数组"""
+        data = {
+            "initialized": self.is_initialized,
+            "initial_capital": yuan(self.initial_capital),
+            "start_date": self.start_date_obj.strftime("%Y-%m-%d") if self.start_date_obj else None,
+        }
+        if with_records:
+            data["records"] = [{"id": r[3], "date": r[0].strftime("%Y-%m-%d"), "amount": yuan(r[1]), "remark": r[2]}
+                               for r in self.records]
+            data["drip_records"] = [{"id": d[3], "date": d[0].strftime("%Y-%m-%d"), "amount": yuan(d[1]),
+                                     "remark": d[2], "plan_id": d[4]} for d in self.drip_records]
+        data.update({
+            "drip_plans": [plan_to_json(p) for p in self.drip_plans],
+            "next_id": self.next_id,
+            "aggregates": self.totals.to_json(),
+            "journal_seq": self.seq
+        })
+        return data
+
+    def restore_aggregates(self, saved=None):
+        """
+        使用保存的汇总；没有保存、格式不对或条数与记录对不上（文件被手工改过）时重新统计。
+        load_rows 之后调用。
+        """
+        expected = len(self.cols) + (1 if self.is_initialized else 0)
+        try:
+            totals = Aggregates.from_json(saved)
+            if totals.rows == expected:
+                self.totals = totals
+                return
+        except (TypeError, KeyError, ValueError, AttributeError):
+            pass
+        self.totals = Aggregates.build(self)
+
+    def load_rows(self, records, drip_records, next_id=1):
+        """
+        用记录元组列表（金额为分）整体替换记录（加载时使用），drip_plans 需先设置好。
+        旧版文件里的记录没有 id / plan_id：按顺序分配新 id，定投记录按备注里的计划名补上所属计划。
+        """
+        self.begin_rows(len(records) + len(drip_records))
+        for rows, kind in ((records, KIND_RECORD), (drip_records, KIND_DRIP)):
+            self.append_rows(kind, [r[0].toordinal() for r in rows], [r[1] for r in rows], [r[2] for r in rows],
+                             [r[3] for r in rows], [r[4] for r in rows])
+        self.end_rows(next_id)
+
+    # 分批加载（流式读取大文件时使用，见 json_stream）：begin_rows -> 多次 append_rows -> end_rows，
+    # 从 JSON 文件加载时最后一步用 finish_load（连同其余字段一起设置）
+
+    def begin_rows(self, capacity=0):
+        self.cols = Columns(max(1024, capacity))
+
+    def append_rows(self, kind, days, cents, remarks, rids, plan_ids):
+        """追加一批同类型记录，days 为日序号；rid / plan_id 可以是 None（旧版文件），在 end_rows 里补上"""
+        self.cols.extend(days, cents, kind, remarks, [-1 if i is None else i for i in rids], plan_ids)
+
+    def end_rows(self, next_id=1):
+        """
+        旧版文件里的记录没有 id / plan_id：按 买卖记录、定投记录 的顺序分配新 id，
+        定投记录按备注里的计划名补上所属计划（drip_plans 需先设置好）。
+        """
+        self.version += 1
+        cols = self.cols
+        rid, kind = cols.rid[:cols.n], cols.kind[:cols.n]
+        self.next_id = max(next_id, int(rid.max()) + 1 if cols.n else 1)
+        missing = rid == -1
+        if missing.any():
+            rows = np.concatenate((np.flatnonzero(missing & (kind == KIND_RECORD)),
+                                   np.flatnonzero(missing & (kind == KIND_DRIP))))
+            rid[rows] = np.arange(self.next_id, self.next_id + len(rows))
+            self.next_id += len(rows)
+            cols.row_of = dict(zip(rid.tolist(), range(cols.n)))
+
+        orphan = (kind == KIND_DRIP) & (cols.plan[:cols.n] == NO_PLAN)
+        if orphan.any():
+            for remark, plan_id in {f"计划:{p['name']}": p['id'] for p in self.drip_plans}.items():
+                code = cols.find_remark(remark)
+                if code is not None:
+                    cols.plan[:cols.n][orphan & (cols.remark[:cols.n] == code)] = cols.plan_code(plan_id)
+
+    def finish_load(self, header):
+        """
+        JSON 文件分批加载的最后一步（代替 end_rows）：header 为不含记录数组的 JSON 字典
+        （to_dict(with_records=False) 的格式），设置初始本金、定投计划、id、汇总与日志序号。
+        """
+        self.is_initialized = bool(header.get("initialized"))
+        self.initial_capital = to_cents(header["initial_capital"]) if self.is_initialized else 0
+        self.start_date_obj = parse_date(header["start_date"]) if self.is_initialized else None
+        self.drip_plans = [plan_from_json(p) for p in header.get("drip_plans", [])]
+        self.end_rows(header.get("next_id", 1))
+        self.restore_aggregates(header.get("aggregates"))
+        self.seq = header.get("journal_seq", 0)
+        self.pending_ops = []
+
+    @property
+    def records(self):
+        """手动买卖记录的元组列表（按添加顺序，每次调用都新建，计算请直接用 self.cols）"""
+        return self.cols.records(KIND_RECORD)
+
+    @property
+    def drip_records(self):
+        """定投记录的元组列表（按日期排序，每次调用都新建）"""
+        return self.cols.records(KIND_DRIP, by_date=True)
+
+    @classmethod
+    def load(cls, filepath=DATA_FILE):
+        """
+        读取 JSON 文件（可以是 gzip 压缩的）；文件不存在时返回空账本，文件损坏时抛出异常。
+        记录数组是流式解析的，内存占用与文件大小无关（见 json_stream）。
+        """
+        import json_stream
+
+        if not os.path.exists(filepath): return cls()
+        return json_stream.read_ledger(filepath, cls())
+
+    def save(self, filepath=DATA_FILE):
+        """写完整快照，文件名以 .gz 结尾时 gzip 压缩"""
+        import json_stream
+
+        json_stream.write_ledger(self.snapshot(), filepath)
+
+    def snapshot(self):
+        """
+        写盘用的只读副本：列数据拷贝一份 + 其余字段的 JSON 字典（与 to_dict 的键、顺序相同）。
+        取快照很快，之后可以在后台线程写文件，账本继续修改不受影响。
+        """
+        header = self.to_dict(with_records=False)
+        return Snapshot(header, View(*(np.array(a) for a in self.cols.view())),
+                        list(self.cols.remarks), list(self.cols.plan_ids))
+
+    # ================= 修改 =================
+    # 所有修改都先构造成一条操作，经 _do 应用到内存并放入 pending_ops；
+    # 加载时对快照 replay 同样的操作即可恢复，保证两条路径结果一致。
+
+    def _do(self, op):
+        self._apply(op)
+        self.seq += 1
+        self.pending_ops.append(dict(op, seq=self.seq))
+
+    def replay(self, op):
+        """重放日志中的一条操作（不再记入 pending_ops）"""
+        self._apply(op)
+        self.seq = op["seq"]
+
+    def take_pending_ops(self):
+        ops, self.pending_ops = self.pending_ops, []
+        return ops
+
+    # 操作里的金额仍以"元"记录，与旧版日志兼容；应用时再转成分
+    def lock_initial(self, start_date, cents):
+        if cents <= 0: raise ValueError("初始本金必须为正数")
+        self._do({"op": "init", "date": start_date.strftime("%Y-%m-%d"), "amount": yuan(cents)})
+
+    def add_record(self, d, cents, remark=""):
+        """cents 为带方向的金额（分）：负数投入，正数取出。返回新记录"""
+        rid = self.next_id
+        self._do({"op": "add", "id": rid, "date": d.strftime("%Y-%m-%d"), "amount": yuan(cents), "remark": remark})
+        return self.cols.get(rid)[0]
+
+    def add_plan(self, name, market, frequency, amount, start_date):
+        """amount 为每期金额（元，计划配置里按元保存）"""
+        if amount <= 0: raise ValueError("定投金额必须为正数")
+        plan_id = str(uuid.uuid4())
+        self._do({"op": "plan", "plan": {
+            "id": plan_id,
+            "name": name,
+            "market": market,
+            "frequency": frequency,
+            "amount": amount,
+            "start_date": start_date.strftime("%Y-%m-%d"),
+            "active": True,
+            "ignored_dates": []
+        }})
+        return self._plan_by_id(plan_id)
+
+    def remove_plan(self, plan):
+        """删除计划不会删除已生成的记录"""
+        self._do({"op": "remove_plan", "id": plan["id"]})
+
+    def set_plan_active(self, plan, active):
+        """
+        暂停/恢复计划。暂停期间水位线不前进，恢复后从水位线续算，
+        与从头重算一样会补上暂停期间的记录。
+        """
+        self._do({"op": "plan", "plan": plan_to_json(dict(plan, active=bool(active)))})
+
+    def update_plan(self, plan, **changes):
+        """修改计划参数；参数变化后签名不一致，下次补录自动从头重算该计划"""
+        self._do({"op": "plan", "plan": plan_to_json(dict(plan, **changes))})
+
+    def _plan_by_id(self, plan_id):
+        for p in self.drip_plans:
+            if p['id'] == plan_id:
+                return p
+        return None
+
+    def apply_import(self, op):
+        """应用 csv_import.plan_import 算出的导入操作（一次写入），返回新增条数"""
+        if op is None: return 0
+        self._do(op)
+        return len(op["dates"])
+
+    def get_record(self, rid):
+        """按 id 取 (记录, 是否定投)，不存在返回 None"""
+        return self.cols.get(rid)
+
+    def delete_records(self, ids, ignore_date=False):
+        """
+        按 id 批量删除记录，返回实际删除的记录。
+        ignore_date=True 时，把被删定投记录的日期写入所属计划的 ignored_dates，
+        以后补录时跳过这一天（保存的是记录上的实际执行日期）。
+        不忽略时清掉所属计划的水位线，下次补录会像从头重算一样把这条补回来。
+        """
+        ids = [rid for rid in dict.fromkeys(ids) if rid in self.cols.row_of]
+        if not ids: return []
+        deleted = [self.cols.get(rid)[0] for rid in ids]
+        self._do({"op": "delete", "ids": ids, "ignore": bool(ignore_date)})
+        return deleted
+
+    def _apply(self, op):
+        self.version += 1
+        kind = op["op"]
+        if kind == "init":
+            if self.is_initialized:  # 重新锁定本金：先撤掉旧的
+                self.totals.set_initial(self.start_date_obj, self.initial_capital, -1)
+            self.start_date_obj = parse_date(op["date"])
+            self.initial_capital = to_cents(op["amount"])
+            self.is_initialized = True
+            self.totals.set_initial(self.start_date_obj, self.initial_capital)
+        elif kind == "add":
+            rid = op.get("id") or self.next_id  # 旧版日志的操作没有 id
+            d, cents = parse_date(op["date"]), to_cents(op["amount"])
+            self.cols.append(d.toordinal(), cents, KIND_RECORD, op["remark"], rid)
+            self.next_id = max(self.next_id, rid + 1)
+            self.totals.add(d, cents)
+        elif kind == "drip":
+            # 一次补录：新增的定投记录 [日期, 金额, 备注, id, 计划 id] + 各计划的新水位线
+            rows = op["rows"]
+            if rows and len(rows[0]) < 5:  # 旧版日志
+                plan_ids = {f"计划:{p['name']}": p['id'] for p in self.drip_plans}
+                rows = [[d, a, r, self.next_id + i, plan_ids.get(r)] for i, (d, a, r) in enumerate(rows)]
+            days = [parse_date(row[0]) for row in rows]
+            cents = [to_cents(row[1]) for row in rows]
+            self.cols.extend([d.toordinal() for d in days], cents, KIND_DRIP,
+                             [row[2] for row in rows], [row[3] for row in rows], [row[4] for row in rows])
+            for d, c, row in zip(days, cents, rows):
+                self.totals.add(d, c)
+                self.next_id = max(self.next_id, row[3] + 1)
+            for plan_id, (through, sig) in op.get("marks", {}).items():
+                plan = self._plan_by_id(plan_id)
+                if plan is not None:
+                    plan['generated_through'], plan['generated_sig'] = through, sig
+        elif kind == "import":
+            # 批量导入的买卖记录（见 csv_import），按列存放，id 从 first_id 起连续
+            n = len(op["dates"])
+            try:
+                days = from_datetime64(np.array(op["dates"], dtype="datetime64[D]"))
+            except ValueError:
+                days = np.array([parse_date(d).toordinal() for d in op["dates"]], dtype=np.int64)
+            cents = to_cents_array(op["amounts"])
+            rids = list(range(op["first_id"], op["first_id"] + n))
+            self.cols.extend(days, cents, KIND_RECORD, op["remarks"], rids, [None] * n)
+            self.next_id = max(self.next_id, op["first_id"] + n)
+            self.totals.add_many(days, cents)
+        elif kind == "delete":
+            self._apply_delete(op)
+        elif kind == "plan":
+            new = plan_from_json(op["plan"])
+            plan = self._plan_by_id(new["id"])
+            if plan is None:
+                self.drip_plans.append(new)
+            else:
+                plan.update(new)  # 原地更新，界面持有的引用保持有效
+        elif kind == "remove_plan":
+            self.drip_plans = [p for p in self.drip_plans if p['id'] != op["id"]]
+        else:
+            raise ValueError(f"未知操作: {kind}")
+
+    def _apply_delete(self, op):
+        ids = op["ids"] if "ids" in op else self._legacy_delete_target(op)
+        for rid in ids:
+            entry = self.cols.get(rid)
+            if entry is None: continue  # 日志与快照不一致时跳过，不影响其余操作
+            rec, drip = entry
+            self.cols.delete(rid)
+            self.totals.remove(rec[0], rec[1])
+            plan = self._plan_by_id(rec[4]) if drip else None
+            if plan is not None:
+                self._after_drip_delete(plan, rec[0].strftime("%Y-%m-%d"), op["ignore"])
+        self.cols.maybe_compact()
+
+    def _legacy_delete_target(self, op):
+        """旧版日志按 日期/金额/备注 指定被删记录，取第一条匹配的"""
+        code = self.cols.find_remark(op["remark"])
+        if code is None: return []
+        v = self.cols.view(KIND_DRIP if op["drip"] else KIND_RECORD)
+        hit = np.flatnonzero((v.day == parse_date(op["date"]).toordinal()) & (v.amount == to_cents(op["amount"]))
+                             & (v.remark == code))
+        return [int(v.rid[hit[0]])] if hit.size else []
+
+    @staticmethod
+    def _after_drip_delete(plan, date_str, ignore):
+        if ignore:
+            # 只增加忽略日期不会让已处理的区间多出记录，水位线仍然有效
+            still_valid = plan.get('generated_sig') == plan_signature(plan)
+            if date_str not in plan['ignored_dates']:
+                plan['ignored_dates'].append(date_str)
+            if still_valid:
+                plan['generated_sig'] = plan_signature(plan)
+        else:
+            plan['generated_through'] = None
+
+    # ================= 定投补录 =================
+
+    def generate_drip_records(self, today=None, trading_days=None, full=False):
+        """补录定投记录，返回新增条数（plan_drip + apply_drip）"""
+        return self.apply_drip(self.plan_drip(today, trading_days, full))
+
+    def apply_drip(self, op):
+        """应用 plan_drip 算出的补录操作，返回新增条数"""
+        if op is None: return 0
+        self._do(op)
+        return len(op["rows"])
+
+    @profiling.traced("drip.plan")
+    def plan_drip(self, today=None, trading_days=None, full=False, drip_index=None):
+        """
+        计算需要补录的定投记录，只读不改账本，返回一条 drip 操作（无需补录时为 None）。
+        可以放到后台线程执行（交易日历加载是耗时的 I/O），再在主线程 apply_drip；
+        这时要在主线程先取 cols.drip_snapshot() 作为 drip_index 传入，后台线程不碰共享的去重索引；
+        期间账本若有修改（seq 变了）结果作废，需要重新计算。
+        1. 支持 日/周/月 频率。
+        2. 计算名义日期，如果名义日期非交易日，则顺延至下一个交易日。
+        3. 顺延不影响下一次名义日期的计算（例如：周五顺延到下周一，下一次定投依然是下周五）。
+        4. 每个计划记录水位线 generated_through，下次只从水位线之后续算；
+           full=True 时忽略水位线从 start_date 重算（结果相同，只是更慢）。
+        trading_days 为 (market, start, end) -> 升序交易日序号数组(date.toordinal) 的函数，
+        默认使用 calendars.trading_day_ordinals。
+        """
+        today = today or today_beijing()
+        active_plans = [p for p in self.drip_plans if p.get('active', True)]
+        if not active_plans: return None
+
+        # 每个计划的续算起点（名义日期）
+        resume = {}
+        for plan in active_plans:
+            through = plan.get('generated_through')
+            if full or not through or plan.get('generated_sig') != plan_signature(plan):
+                resume[plan['id']] = plan['start_date_obj']
+            else:
+                resume[plan['id']] = next_nominal_date(parse_date(through), plan.get('frequency', 'daily'))
+
+        earliest_start = min(resume.values())
+        if earliest_start > today: return None
+
+        import calendars
+        import schedule
+        if trading_days is None:
+            trading_days = calendars.trading_day_ordinals
+
+        # --- 批量获取日历 ---
+        # 我们多取一点时间，防止顺延到未来；往前也多取一段，离线时即使续算起点已超出本地缓存，
+        # 也能从最后一个交易日看出日历覆盖到哪里
+        search_start_date = earliest_start - timedelta(days=30)
+        search_end_date = today + timedelta(days=15)
+        trading_day_arrays = {}  # 升序交易日序号，二分查找"下一个交易日"
+        for market_code in {p.get('market', 'CN') for p in active_plans}:
+            with profiling.span("drip.calendar", market=market_code):
+                trading_day_arrays[market_code] = trading_days(market_code, search_start_date, search_end_date)
+
+        # --- 现有记录按 (金额, 备注) 去重（columns.drip_days）---
+        # 执行日期不早于名义日期，只需要各计划续算起点之后的记录
+        if drip_index is None:
+            drip_index = self.cols.drip_snapshot()
+        added = {}  # 本次新增的执行日期，同名同额的计划之间也要去重
+
+        today_ord = today.toordinal()
+        rows = []
+        marks = {}
+        for plan in active_plans:
+            ignored_ords = set()
+            for s in plan.get('ignored_dates', []):
+                try:
+                    ignored_ords.add(parse_date(s).toordinal())
+                except ValueError:
+                    pass
+
+            # 名义日期不超过今天（如果是月定投，名义日期没到下个月就不该投），一次生成；
+            # 顺延、忽略、去重都是数组运算
+            with profiling.span("drip.nominal", plan=plan['name']):
+                nominal = schedule.nominal_ordinals(resume[plan['id']], today, plan.get('frequency', 'daily'))
+            days = trading_day_arrays.get(plan.get('market', 'CN'))
+            head_missing = False
+            if days is not None and len(days):
+                # 日历没覆盖到今天（离线且本地缓存不够新）：最后一个交易日之后的名义日期无法顺延，
+                # 留到拿到日历后再补，水位线也不越过这里
+                nominal = nominal[nominal <= days[-1]]
+                if days[0] > search_start_date.toordinal():
+                    # 缓存也没覆盖到续算起点：之前的名义日期会全部顺延到第一个缓存的交易日，
+                    # 同样留到以后再补，这一轮水位线不动（已补的记录下次按已有记录去重）
+                    head_missing = bool(nominal.size) and nominal[0] < days[0]
+                    nominal = nominal[nominal >= days[0]]
+            profiling.count("drip.nominal_dates", len(nominal))
+            target = -to_cents(plan['amount'])
+            remark_text = f"计划:{plan['name']}"
+            key = (target, remark_text)
+            code = self.cols.find_remark(remark_text)
+            if code is not None:
+                seen = self.cols.drip_days(code, target, resume[plan['id']].toordinal(), drip_index)
+            else:
+                seen = np.empty(0, dtype=np.int32)
+            if key in added:
+                seen = np.concatenate((seen, added[key]))
+            new_ords, last_done = schedule.plan_executions(nominal, days, today_ord, ignored_ords, seen)
+            added[key] = np.concatenate((added[key], new_ords)) if key in added else new_ords
+
+            new_ords = new_ords.tolist()
+            first_id = self.next_id + len(rows)
+            rows.extend([date.fromordinal(o).strftime("%Y-%m-%d"), yuan(target), remark_text, first_id + i, plan['id']]
+                        for i, o in enumerate(new_ords))
+
+            if last_done is not None and not head_missing:
+                mark = [date.fromordinal(last_done).strftime("%Y-%m-%d"), plan_signature(plan)]
+                if mark != [plan.get('generated_through'), plan.get('generated_sig')]:
+                    marks[plan['id']] = mark
+
+        if not (rows or marks): return None
+        return {"op": "drip", "rows": rows, "marks": marks}
+
+    # ================= 统计与计算 =================
+
+    def summary(self):
+        """返回 (累计投入, 剩余现金)，单位为分"""
+        return self.totals.invested, self.totals.cash
+
+    def cash_flow_arrays(self):
+        """
+        全部现金流（含初始本金）-> (日序号数组, 金额数组 int64 分)，按记录添加顺序而非日期排序。
+        没有初始本金且没有删除过记录时直接是列数据的视图。
+        """
+        v = self.cols.view()
+        if not self.is_initialized:
+            return v.day, v.amount
+        return (np.concatenate(([self.start_date_obj.toordinal()], v.day)),
+                np.concatenate(([-self.initial_capital], v.amount)))
+
+    def prepared_flows(self):
+        """
+        按日期排序、同一天合并后的现金流（flow_cache.Flows，含初始本金），求解直接用它。
+        账本没变时直接复用，只追加了记录时在上一版本上增量合并；返回的数组不会再被修改。
+        """
+        return self.flow_cache.flows(self)
+
+    def xirr(self, end_date, end_value):
+        """
+        end_value 为期末市值（分），返回 (年化收益率, 盈亏(分))。
+        结束日期之后的现金流不计入（见 solve_flows）；
+        结束日期不晚于开始日期时抛出 ValueError，不收敛时抛出 xirr.XirrConvergenceError。
+        同一版本、同样的结束日期与市值直接返回上次的结果；否则根唯一时以上次的收益率为初值求解
+        （见 FlowCache.guess）。
+        """
+        cache = self.flow_cache
+        result = cache.lookup(self.version, end_date, end_value)
+        if result is None:
+            flows = self.prepared_flows()
+            result = solve_flows(flows, end_date, end_value, cache.guess(flows, end_date, end_value))
+            cache.remember(self.version, end_date, end_value, result)
+        return result
+
+    def metrics(self, end_date, end_value, valuations=None):
+        """
+        一次算出 XIRR、Modified Dietz、时间加权收益、累计投入与资金回撤（analytics.Metrics）。
+        valuations 为可选的中间市值点 (日期列表, 市值(分)列表)；没有时结果按版本缓存。
+        """
+        import analytics
+
+        cache = self.flow_cache
+        result = None if valuations else cache.lookup(self.version, end_date, end_value, "metrics")
+        if result is None:
+            flows = self.prepared_flows()
+            guess = cache.guess(flows, end_date, end_value)
+            result = analytics.analyze(flows, end_date, end_value, valuations, guess)
+            if not valuations:
+                cache.remember(self.version, end_date, end_value, result, "metrics")
+        return result
+
+    def xirr_curve(self, end_dates, end_values):
+        """历史市值序列（日期、分）-> 每个日期当时的年化收益率数组，无解处为 NaN"""
+        flows = self.prepared_flows()
+        return solve_xirr_curve(flows.days, flows.cents, end_dates, end_values)
+
+
+def solve_xirr(dates, cents, end_date, end_value):
+    """
+    历史现金流（date 列表或日序号数组，不要求有序；金额为分）+ 期末市值（分）
+    -> (年化收益率, 盈亏(分))。存储层可以直接传入数组，不必先构造 Ledger。
+    与 solve_flows 相同，结束日期之后的现金流不计入。
+    """
+    import xirr
+
+    return solve_flows(make_flows(xirr.to_day_numbers(dates), cents), end_date, end_value)
+
+
+def flows_until(flows, end_date):
+    """flow_cache.Flows 截到结束日期（含）为止：期末市值只反映在此之前的现金流"""
+    p = int(np.searchsorted(flows.days, end_date.toordinal(), side="right"))
+    if p == len(flows.days): return flows
+    cents = flows.cents[:p]
+    return Flows(flows.version, flows.days[:p], flows.t[:p], cents, int(cents.sum()))
+
+
+def solve_flows(flows, end_date, end_value, guess=0.1):
+    """
+    整理好的现金流 flow_cache.Flows（已排序、年化时间已算好）+ 期末市值（分）
+    -> (年化收益率, 盈亏(分))，guess 为迭代初值。
+    结束日期之后的现金流不计入（见 flows_until，与收益率曲线、analytics.analyze 的口径相同）；
+    结束日期不晚于第一笔现金流时抛出 ValueError，不收敛时抛出 xirr.XirrConvergenceError。
+    Flows 不会被修改，可以在后台线程/进程调用。
+    """
+    import xirr
+
+    flows = flows_until(flows, end_date)
+    days, end = flows.days, end_date.toordinal()
+    if not days.size or end <= days[0]:
+        raise ValueError("结束日期必须晚于开始日期")
+
+    t = np.append(flows.t, (end - int(days[0])) / xirr.DAYS_PER_YEAR)
+    a = np.append(flows.cents, end_value) / 100  # 只有求解时才用浮点
+    rate = xirr.solve_rows(t[None, :], a[None, :], guess=guess)[0]
+    if not np.isfinite(rate):
+        raise xirr.XirrConvergenceError("数据可能不收敛")
+    # 盈亏 = 取出 + 期末市值 - 投入
+    return float(rate), flows.total + end_value
+
+
+def solve_xirr_curve(dates, cents, end_dates, end_values):
+    """
+    历史现金流 + 一串 (日期, 市值(分)) -> 收益率曲线（每个点只计入当天及之前的现金流）。
+    与 solve_xirr 一样可以直接传存储层读出的数组。
+    """
+    import xirr
+
+    values = np.asarray(end_values, dtype=np.int64)
+    return xirr.xirr_curve(dates, np.asarray(cents, dtype=np.int64) / 100, end_dates, values / 100)
@@ -1,29 +1,28 @@
 import customtkinter as ctk
 from tkinter import messagebox, ttk, filedialog
-from datetime import date, datetime, timedelta, timezone
-from scipy import optimize
+from datetime import date, datetime, timedelta
 from tkcalendar import DateEntry
-import json
 import os
-import shutil
-import uuid
-import pandas as pd  # 引入pandas处理日期的加减（月度/周度）
 
-# 尝试导入金融日历库
-try:
-    import pandas_market_calendars as mcal
-
-    HAS_MCAL = True
-except ImportError:
-    HAS_MCAL = False
-    print("提示: 未检测到 pandas_market_calendars，将无法自动剔除节假日。")
+import analytics
+import csv_import
+import profiling
+import projection
+from json_stream import write_ledger
+from ledger import DATA_FILE, Ledger, today_beijing
+from money import fmt, to_cents
+from storage import open_store
+from tasks import SaveCoalescer, TaskRunner
+from tree_view import LedgerTree, record_id
+import workspace
+
+# 现金流超过这个笔数时 XIRR 放到子进程求解，否则线程池就够了（启动子进程本身要几百毫秒）
+PROCESS_MIN_FLOWS = 500_000
 
 # 设置外观
 ctk.set_appearance_mode("System")
 ctk.set_default_color_theme("blue")
 
-DATA_FILE = "my_fund_data.json"
-
 
 class GroupedFundApp(ctk.CTk):
     def __init__(self):
@@ -32,29 +31,35 @@ class GroupedFundApp(ctk.CTk):
         self.title("基金年化记账本 (增强版：多周期定投+自动顺延)")
         self.geometry("1100x900")
 
-        # 数据变量
-        self.records = []
-        self.drip_records = []
-        self.drip_plans = []
-        self.initial_capital = 0.0
-        self.start_date_obj = None
-        self.is_initialized = False
-
-        # --- 1. 初始化多市场日历 ---
-        self.calendars = {}
-        if HAS_MCAL:
-            try:
-                print("正在初始化交易日历，请稍候...")
-                self.calendars['CN'] = mcal.get_calendar('XSHG')  # A股
-                self.calendars['US'] = mcal.get_calendar('NYSE')  # 美股
-                print("日历加载完成。")
-            except Exception as e:
-                print(f"日历初始化部分失败: {e}")
+        # 数据变量（账本逻辑见 ledger.py，界面只负责展示与交互）
+        self.ledger = Ledger()
+        # 环境变量 FUND_WORKSPACE 指定目录时按多组合工作区运行（见 workspace.py），目录里每个数据文件是一个组合；
+        # 否则 FUND_DATA_FILE 可指定数据文件，.db 结尾时使用 SQLite 存储
+        self.workspace = None
+        self.portfolio = None
+        if os.environ.get("FUND_WORKSPACE"):
+            self.workspace = workspace.Workspace(os.environ["FUND_WORKSPACE"])
+            if not self.workspace.names():
+                self.workspace.create("默认")
+            self.portfolio = self.workspace.names()[0]
+            self.store = self.workspace.open(self.portfolio)[0]
+        else:
+            self.store = open_store(os.environ.get("FUND_DATA_FILE", DATA_FILE))
 
         # 获取北京时间
-        utc_now = datetime.now(timezone.utc)
-        beijing_now = utc_now.astimezone(timezone(timedelta(hours=8)))
-        self.today_bj = beijing_now.date()
+        self.today_bj = today_beijing()
+
+        # 耗时操作在后台执行，结果经 after() 回到主线程（见 tasks.py）；多次保存合并成一次写入
+        self.tasks = TaskRunner(self)
+        # 切换组合前会 flush，写入时的 self.store 就是 prepare 时的那个
+        self.saver = SaveCoalescer(self.tasks, lambda compact: self.store.prepare(self.ledger, compact),
+                                   lambda payload: self.store.write(payload),
+                                   on_error=lambda e: messagebox.showerror("保存失败", str(e)))
+        self._drip_task = None
+        self._xirr_task = None
+        self._csv_task = None
+        self._ws_task = None
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
 
         # ============ UI 布局 ============
         self.grid_columnconfigure(0, weight=1)
@@ -79,6 +84,15 @@ class GroupedFundApp(ctk.CTk):
         self.btn_init = ctk.CTkButton(self.frame_init, text="锁定初始值", command=self.lock_initial)
         self.btn_init.grid(row=1, column=3, padx=10, pady=10)
 
+        if self.workspace is not None:
+            self.option_portfolio = ctk.CTkOptionMenu(self.frame_init, values=self.workspace.names(),
+                                                      command=self.switch_portfolio)
+            self.option_portfolio.set(self.portfolio)
+            self.option_portfolio.grid(row=1, column=4, padx=10, pady=10)
+            self.btn_new_portfolio = ctk.CTkButton(self.frame_init, text="新建组合", width=80,
+                                                   command=self.new_portfolio)
+            self.btn_new_portfolio.grid(row=1, column=5, padx=5, pady=10)
+
         # --- 中部：操作区域 ---
         self.frame_ops = ctk.CTkFrame(self)
         self.frame_ops.grid(row=1, column=0, padx=20, pady=10, sticky="ew")
@@ -127,7 +141,7 @@ class GroupedFundApp(ctk.CTk):
         style.map("Treeview", background=[('selected', '#1f538d')], foreground=[('selected', 'white')])
 
         columns = ("type", "amount", "remark")
-        self.tree = ttk.Treeview(self.tree_frame, columns=columns, selectmode="browse")
+        self.tree = ttk.Treeview(self.tree_frame, columns=columns, selectmode="extended")
 
         self.tree.heading("#0", text="日期 / 月份分组")
         self.tree.heading("type", text="操作类型")
@@ -143,6 +157,7 @@ class GroupedFundApp(ctk.CTk):
         self.tree.configure(yscrollcommand=self.scrollbar.set)
         self.scrollbar.pack(side="right", fill="y")
         self.tree.pack(side="left", fill="both", expand=True)
+        self.tree_view = LedgerTree(self.tree)
 
         # --- 底部：期末计算 ---
         self.frame_calc = ctk.CTkFrame(self, border_width=2, border_color="#3498DB")
@@ -177,6 +192,11 @@ class GroupedFundApp(ctk.CTk):
                                      command=self.calculate_xirr)
         self.btn_run.grid(row=1, column=3, padx=10)
 
+        if self.workspace is not None:
+            self.btn_ws_xirr = ctk.CTkButton(self.frame_calc, text="汇总年化", height=40, fg_color="#5D6D7E",
+                                             hover_color="#34495E", command=self.open_workspace_xirr)
+            self.btn_ws_xirr.grid(row=1, column=4, padx=10)
+
         self.result_label = ctk.CTkLabel(self.frame_calc, text="准备就绪", font=("微软雅黑", 16))
         self.result_label.grid(row=2, column=0, columnspan=5, pady=10)
 
@@ -187,287 +207,132 @@ class GroupedFundApp(ctk.CTk):
         self.btn_export = ctk.CTkButton(self.frame_data, text="📤 导出备份", fg_color="#5D6D7E", hover_color="#34495E",
                                         command=self.export_backup)
         self.btn_export.pack(side="left", padx=10)
+        self.btn_import_csv = ctk.CTkButton(self.frame_data, text="📄 导入 CSV", fg_color="#5D6D7E",
+                                            hover_color="#34495E", command=self.import_csv)
+        self.btn_import_csv.pack(side="left", padx=10)
+        self.btn_project = ctk.CTkButton(self.frame_data, text="🔮 前景模拟", fg_color="#5D6D7E",
+                                         hover_color="#34495E", command=self.open_projection)
+        self.btn_project.pack(side="left", padx=10)
         self.btn_import = ctk.CTkButton(self.frame_data, text="📥 导入数据", fg_color="#5D6D7E", hover_color="#34495E",
                                         command=self.import_backup)
         self.btn_import.pack(side="right", padx=10)
 
-        # 启动逻辑
-        self.load_data_from_file(DATA_FILE)
-        self.generate_daily_drip_records()
+        # 启动逻辑：先加载数据让窗口尽快显示，交易日历加载与补录计算放到后台，完成后在主线程补录
+        self.load_data_from_file()
         self.update_summary_labels()
+        self.after(100, self.generate_daily_drip_records)
+        if self.workspace is not None:
+            self.after(200, self.drip_other_portfolios)
 
     # ================= 渲染与统计 =================
 
     def render_tree_view(self):
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-
-        all_items = []
-        if self.is_initialized:
-            all_items.append({
-                "date": self.start_date_obj,
-                "type": "【初始本金】",
-                "amount": -self.initial_capital,
-                "remark": "---",
-                "is_init": True
-            })
-
-        for r in self.records:
-            all_items.append({
-                "date": r[0],
-                "type": "买入/追加" if r[1] < 0 else "卖出/取现",
-                "amount": r[1],
-                "remark": r[2],
-                "is_init": False
-            })
-
-        for d in self.drip_records:
-            all_items.append({
-                "date": d[0],
-                "type": "【定投】",
-                "amount": d[1],
-                "remark": d[2],
-                "is_init": False
-            })
-
-        all_items.sort(key=lambda x: x["date"])
-
-        current_month_key = None
-        month_items = []
-
-        def insert_month_group(month_key, items):
-            if not month_key: return
-            month_sum = sum(item["amount"] for item in items)
-            sum_text = f"月度净流: {month_sum:+.2f}"
-            p_id = self.tree.insert("", "end", text=f"📅 {month_key} ({sum_text})", open=True, tags=('group',))
-            for item in items:
-                display_date = item["date"].strftime("%Y-%m-%d")
-                val_tuple = (item["type"], f"{item['amount']}", item["remark"])
-                self.tree.insert(p_id, "end", text=display_date, values=val_tuple)
-
-        for item in all_items:
-            month_key = item["date"].strftime("%Y年%m月")
-            if month_key != current_month_key:
-                insert_month_group(current_month_key, month_items)
-                current_month_key = month_key
-                month_items = []
-            month_items.append(item)
-
-        insert_month_group(current_month_key, month_items)
+        # 只插入月份分组，明细行在展开时才插入（见 tree_view.LedgerTree）
+        self.tree_view.render(self.ledger)
         self.update_summary_labels()
 
     def update_summary_labels(self):
-        total_invested = 0.0
-        if self.is_initialized:
-            total_invested += self.initial_capital
-
-        current_cash = 0.0
-        if self.is_initialized:
-            current_cash += self.initial_capital
-
-        for r in self.records:
-            if r[1] < 0: total_invested += abs(r[1])
-            current_cash += r[1]
-
-        for d in self.drip_records:
-            if d[1] < 0: total_invested += abs(d[1])
-            current_cash += d[1]
-
-        self.lbl_total_principal.configure(text=f"累计投入: {total_invested:,.2f}")
-        self.lbl_current_cash.configure(text=f"剩余现金: {current_cash:,.2f}")
+        total_invested, current_cash = self.ledger.summary()
+        self.lbl_total_principal.configure(text=f"累计投入: {fmt(total_invested, grouping=True)}")
+        self.lbl_current_cash.configure(text=f"剩余现金: {fmt(current_cash, grouping=True)}")
 
     # ================= 业务逻辑：增强版自动定投 =================
 
     def generate_daily_drip_records(self):
-        """
-        核心逻辑重写：
-        1. 支持 日/周/月 频率。
-        2. 计算名义日期，如果名义日期非交易日，则顺延至下一个交易日。
-        3. 顺延不影响下一次名义日期的计算（例如：周五顺延到下周一，下一次定投依然是下周五）。
-        """
-        if not self.drip_plans: return
-        active_plans = [p for p in self.drip_plans if p.get('active', True)]
+        """后台加载交易日历并计算要补录的记录（只读账本），完成后在主线程应用；再次调用会取消上一次"""
+        active_plans = [p for p in self.ledger.drip_plans if p.get('active', True)]
         if not active_plans: return
+        if self._drip_task is not None:
+            self._drip_task.cancel()
 
+        ledger, seq = self.ledger, self.ledger.seq
+        markets = sorted({p.get('market', 'CN') for p in active_plans})
         earliest_start = min(p['start_date_obj'] for p in active_plans)
-        if earliest_start > self.today_bj: return
-
-        # --- 批量获取日历 (缓存) ---
-        # 我们多取一点时间，防止顺延到未来
-        search_end_date = self.today_bj + timedelta(days=15)
-
-        trading_days_map = {}
-        sorted_trading_days_list = {}  # 用于快速查找"下一个交易日"
-
-        for market_code in ['CN', 'US']:
-            trading_days_map[market_code] = set()
-            sorted_trading_days_list[market_code] = []
-            if market_code in self.calendars:
-                try:
-                    schedule = self.calendars[market_code].schedule(start_date=earliest_start, end_date=search_end_date)
-                    # 转换为 Python date 对象
-                    dates = [ts.date() for ts in schedule.index]
-                    trading_days_map[market_code] = set(dates)
-                    sorted_trading_days_list[market_code] = sorted(dates)
-                except Exception as e:
-                    print(f"获取 {market_code} 日历失败: {e}")
-
-        # --- 现有记录哈希，防止重复 ---
-        existing_hashes = set()
-        for r in self.drip_records:
-            existing_hashes.add((r[0], round(r[1], 2), r[2]))
-
-        new_cnt = 0
-
-        for plan in active_plans:
-            market = plan.get('market', 'CN')
-            frequency = plan.get('frequency', 'daily')  # daily, weekly, monthly
-            ignored_dates = set(plan.get('ignored_dates', []))
-
-            # 名义上的计划执行日期
-            nominal_date = plan['start_date_obj']
-            target_val = -plan['amount']
-            remark_text = f"计划:{plan['name']}"
-
-            # 辅助函数：查找 target_date 或之后的第一个交易日
-            def find_execution_date(target_date, mkt):
-                # 降级模式：如果没有日历，就当天
-                if not HAS_MCAL or mkt not in sorted_trading_days_list:
-                    return target_date
-
-                days_list = sorted_trading_days_list[mkt]
-                for d in days_list:
-                    if d >= target_date:
-                        return d
-                return target_date  # 如果超出了日历范围（极少见），就返回当天
-
-            # 循环直到 名义日期 超过今天
-            # 注意：这里判断的是 nominal_date，因为如果是月定投，名义日期没到下个月就不该投
-            # 但是执行日期(execution_date)必须 <= today_bj 才能入账
-
-            while nominal_date <= self.today_bj:
-
-                # 1. 计算顺延后的实际交易日
-                execution_date = find_execution_date(nominal_date, market)
-
-                # 2. 如果顺延后的日期还没到今天，或者刚好是今天，则尝试记录
-                #    如果顺延到了明天，那今天就还不能记
-                if execution_date <= self.today_bj:
-
-                    # 检查是否被用户忽略 (检查的是名义日期，因为用户通常是想忽略这一期)
-                    # 或者是 实际执行日期
-                    nominal_str = nominal_date.strftime("%Y-%m-%d")
-                    exec_str = execution_date.strftime("%Y-%m-%d")
-
-                    if nominal_str not in ignored_dates and exec_str not in ignored_dates:
-                        record_key = (execution_date, round(target_val, 2), remark_text)
-
-                        if record_key not in existing_hashes:
-                            self.drip_records.append((execution_date, target_val, remark_text))
-                            existing_hashes.add(record_key)
-                            new_cnt += 1
-
-                # 3. 计算下一个【名义】日期 (保持节奏，不受顺延影响)
-                if frequency == 'daily':
-                    nominal_date += timedelta(days=1)
-                elif frequency == 'weekly':
-                    nominal_date += timedelta(weeks=1)
-                elif frequency == 'monthly':
-                    # 使用 pandas DateOffset 处理月度增加 (自动处理大小月)
-                    next_ts = pd.Timestamp(nominal_date) + pd.DateOffset(months=1)
-                    nominal_date = next_ts.date()
-                else:
-                    nominal_date += timedelta(days=1)  # 默认日
-
+        drip_index = ledger.cols.drip_snapshot()  # 去重索引在主线程建立，后台只读快照
+        self._drip_task = self.tasks.submit(
+            plan_drip_job, ledger, drip_index, markets, earliest_start, self.today_bj,
+            on_done=lambda op: self._apply_drip(ledger, seq, op),
+            on_error=lambda e: self._drip_failed(ledger, seq, e),
+            on_progress=self._drip_progress)
+
+    def _drip_progress(self, done, total):
+        if done < total:
+            self.result_label.configure(text=f"正在加载交易日历 ({done}/{total})…", text_color=("gray10", "gray90"))
+        elif self.result_label.cget("text").startswith("正在加载"):
+            self.result_label.configure(text="准备就绪")
+
+    def _apply_drip(self, ledger, seq, op):
+        self._drip_task = None
+        if ledger is not self.ledger: return  # 期间导入了别的数据
+        if ledger.seq != seq:
+            # 计算期间账本被修改过，结果作废；日历已经缓存，在主线程重算很快
+            op = ledger.plan_drip(self.today_bj)
+        new_cnt = ledger.apply_drip(op)
         if new_cnt > 0:
-            self.drip_records.sort(key=lambda x: x[0])
             self.save_data()
             self.render_tree_view()
             messagebox.showinfo("定投助手", f"已自动补录 {new_cnt} 条记录 (包含顺延处理)")
 
-    def save_data(self):
-        data = {
-            "initialized": self.is_initialized,
-            "initial_capital": self.initial_capital,
-            "start_date": self.start_date_obj.strftime("%Y-%m-%d") if self.start_date_obj else None,
-            "records": [{"date": r[0].strftime("%Y-%m-%d"), "amount": r[1], "remark": r[2]} for r in self.records],
-            "drip_records": [{"date": d[0].strftime("%Y-%m-%d"), "amount": d[1], "remark": d[2]} for d in
-                             self.drip_records],
-            "drip_plans": []
-        }
-        for p in self.drip_plans:
-            data["drip_plans"].append({
-                "id": p.get("id", str(uuid.uuid4())),
-                "name": p.get("name"),
-                "market": p.get("market", "CN"),
-                "frequency": p.get("frequency", "daily"),  # 保存频率
-                "amount": p["amount"],
-                "start_date": p["start_date"],
-                "active": p.get("active", True),
-                "ignored_dates": p.get("ignored_dates", [])
-            })
+    def _drip_failed(self, ledger, seq, e):
+        if ledger is self.ledger and ledger.seq != seq:
+            # 后台读账本时界面正在修改，读到了不一致的状态，重算即可
+            self._apply_drip(ledger, seq, None)
+            return
+        self._drip_task = None
+        messagebox.showerror("定投助手", f"补录失败: {e}")
+
+    def save_data(self, compact=False):
+        # 平时只追加操作日志；compact=True 时重写完整快照。短时间内的多次保存合并为一次后台写入
+        self.saver.request(compact)
 
+    def on_close(self):
+        for task in (self._drip_task, self._xirr_task, self._csv_task, self._ws_task):
+            if task is not None: task.cancel()
         try:
-            with open(DATA_FILE, "w", encoding="utf-8") as f:
-                json.dump(data, f, indent=4, ensure_ascii=False)
+            self.saver.flush()
+            if self.workspace is not None:
+                self.workspace.close()  # 关闭组合共用的进程池，等正在写文件的子进程写完
         except Exception as e:
             messagebox.showerror("保存失败", str(e))
+        self.tasks.shutdown(wait=False)
+        self.destroy()
 
-    def load_data_from_file(self, filepath):
-        if not os.path.exists(filepath): return
+    def load_data_from_file(self, filepath=None):
+        """不传路径时读取本地数据（快照 + 日志），否则读取备份文件"""
         try:
-            with open(filepath, "r", encoding="utf-8") as f:
-                data = json.load(f)
-
-            self.is_initialized = False
-            self.entry_start_date.configure(state="normal")
-            self.entry_init_money.configure(state="normal")
-            self.btn_init.configure(state="normal", text="锁定初始值")
-
-            if data.get("initialized"):
-                self.is_initialized = True
-                self.initial_capital = data["initial_capital"]
-                self.start_date_obj = datetime.strptime(data["start_date"], "%Y-%m-%d").date()
-                self.entry_start_date.set_date(self.start_date_obj)
-                self.entry_init_money.delete(0, "end")
-                self.entry_init_money.insert(0, str(self.initial_capital))
-                self.entry_start_date.configure(state="disabled")
-                self.entry_init_money.configure(state="disabled")
-                self.btn_init.configure(state="disabled", text="已锁定")
-
-            self.records = [(datetime.strptime(r["date"], "%Y-%m-%d").date(), r["amount"], r.get("remark", "")) for r in
-                            data.get("records", [])]
-            self.drip_records = [(datetime.strptime(d["date"], "%Y-%m-%d").date(), d["amount"], d.get("remark", "")) for
-                                 d in data.get("drip_records", [])]
-
-            self.drip_plans = []
-            for p in data.get("drip_plans", []):
-                self.drip_plans.append({
-                    "id": p.get("id", str(uuid.uuid4())),
-                    "name": p.get("name", "定投计划"),
-                    "market": p.get("market", "CN"),
-                    "frequency": p.get("frequency", "daily"),  # 读取频率，默认daily
-                    "amount": p["amount"],
-                    "start_date": p["start_date"],
-                    "start_date_obj": datetime.strptime(p["start_date"], "%Y-%m-%d").date(),
-                    "active": p.get("active", True),
-                    "ignored_dates": p.get("ignored_dates", [])
-                })
-
-            self.render_tree_view()
+            if filepath is not None:
+                self.ledger = Ledger.load(filepath)
+                if self.workspace is not None:
+                    self.workspace.replace(self.portfolio, self.ledger)
+            elif self.workspace is not None:
+                self.store, self.ledger = self.workspace.open(self.portfolio)
+            else:
+                self.ledger = self.store.load()
         except Exception as e:
             messagebox.showerror("加载失败", f"文件损坏: {e}")
+            return
+
+        ledger = self.ledger
+        self.entry_start_date.configure(state="normal")
+        self.entry_init_money.configure(state="normal")
+        self.btn_init.configure(state="normal", text="锁定初始值")
+        self.entry_init_money.delete(0, "end")  # 切换到未初始化的组合时不留上一个组合的值
+        if ledger.is_initialized:
+            self.entry_start_date.set_date(ledger.start_date_obj)
+            self.entry_init_money.insert(0, fmt(ledger.initial_capital))
+            self.entry_start_date.configure(state="disabled")
+            self.entry_init_money.configure(state="disabled")
+            self.btn_init.configure(state="disabled", text="已锁定")
+
+        self.render_tree_view()
 
     # ================= 用户交互 =================
 
     def lock_initial(self):
         try:
             d_obj = self.entry_start_date.get_date()
-            m = float(self.entry_init_money.get())
-            if m <= 0: raise ValueError
-            self.start_date_obj = d_obj
-            self.initial_capital = m
-            self.is_initialized = True
+            m = to_cents(self.entry_init_money.get())
+            self.ledger.lock_initial(d_obj, m)
             self.entry_start_date.configure(state="disabled")
             self.entry_init_money.configure(state="disabled")
             self.btn_init.configure(state="disabled", text="已锁定")
@@ -477,7 +342,7 @@ class GroupedFundApp(ctk.CTk):
             messagebox.showerror("错误", "请输入正数")
 
     def open_drip_setup(self):
-        if not self.is_initialized:
+        if not self.ledger.is_initialized:
             messagebox.showwarning("提示", "请先锁定初始本金！")
             return
 
@@ -536,22 +401,11 @@ class GroupedFundApp(ctk.CTk):
         def add_plan():
             try:
                 amt = float(amount_entry.get())
-                if amt <= 0: raise ValueError
                 name = name_entry.get().strip() or "未命名"
                 market = market_var.get()
                 freq = freq_var.get()  # daily, weekly, monthly
 
-                self.drip_plans.append({
-                    "id": str(uuid.uuid4()),
-                    "name": name,
-                    "market": market,
-                    "frequency": freq,
-                    "amount": amt,
-                    "start_date": start_date_entry.get_date().strftime("%Y-%m-%d"),
-                    "start_date_obj": start_date_entry.get_date(),
-                    "active": True,
-                    "ignored_dates": []
-                })
+                self.ledger.add_plan(name, market, freq, amt, start_date_entry.get_date())
                 self.save_data()
                 self.generate_daily_drip_records()
                 refresh_list()
@@ -569,23 +423,23 @@ class GroupedFundApp(ctk.CTk):
         list_scroll.pack(fill="both", expand=True, padx=10, pady=5)
 
         def toggle_plan(plan, var):
-            plan['active'] = bool(var.get())
+            self.ledger.set_plan_active(plan, var.get())
             self.save_data()
             if plan['active']: self.generate_daily_drip_records()
 
         def delete_plan(plan):
             if messagebox.askyesno("确认", "删除计划不会删除已生成的记录，确认删除？"):
-                self.drip_plans.remove(plan)
+                self.ledger.remove_plan(plan)
                 self.save_data()
                 refresh_list()
 
         def refresh_list():
             for w in list_scroll.winfo_children(): w.destroy()
-            if not self.drip_plans:
+            if not self.ledger.drip_plans:
                 ctk.CTkLabel(list_scroll, text="暂无计划").pack(pady=20)
                 return
 
-            for plan in self.drip_plans:
+            for plan in self.ledger.drip_plans:
                 p_frame = ctk.CTkFrame(list_scroll, fg_color=("white", "#2b2b2b"))
                 p_frame.pack(fill="x", pady=2, padx=2)
 
@@ -611,76 +465,43 @@ class GroupedFundApp(ctk.CTk):
         refresh_list()
 
     def add_record(self, op_type):
-        if not self.is_initialized:
+        if not self.ledger.is_initialized:
             messagebox.showwarning("提示", "请先锁定本金")
             return
         try:
-            m = float(self.entry_op_amount.get())
+            m = to_cents(self.entry_op_amount.get())  # 按十进制解析到分，避免浮点误差
             if m <= 0: raise ValueError
             val = -m if op_type == "buy" else m
-            self.records.append((self.entry_op_date.get_date(), val, self.entry_op_remark.get().strip()))
+            rec = self.ledger.add_record(self.entry_op_date.get_date(), val, self.entry_op_remark.get().strip())
             self.entry_op_amount.delete(0, "end")
             self.entry_op_remark.delete(0, "end")
             self.save_data()
-            self.render_tree_view()
+            self.tree_view.add_record(rec)
+            self.update_summary_labels()
         except:
             pass
 
     # ================= 修复后的删除逻辑 =================
 
     def delete_selected(self):
-        selected_id = self.tree.selection()
-        if not selected_id: return
-        item = self.tree.item(selected_id[0])
-        if 'group' in item.get('tags', []): return
-
-        values = item["values"]
-        if not values: return
-        item_date_str = item["text"]
-
-        if values[0] == "【初始本金】": return
-
-        del_amt = float(values[1])
-        # 兼容性处理，防止values长度不足
-        del_remark = values[2] if len(values) > 2 else ""
+        # 明细行的 iid 就是记录 id；分组、初始本金行不可删，支持多选
+        ids = [rid for rid in map(record_id, self.tree.selection()) if rid is not None]
+        if not ids: return
 
         try:
-            if values[0] == "【定投】":
-                target_idx = -1
-                for i, r in enumerate(self.drip_records):
-                    r_remark = r[2] if len(r) > 2 else ""
-
-                    if (r[0].strftime("%Y-%m-%d") == item_date_str and
-                            abs(r[1] - del_amt) < 0.001 and
-                            r_remark == del_remark):
-                        target_idx = i
-                        break
-
-                if target_idx != -1:
-                    msg = "您正在删除一条自动定投记录。\n\n下次启动时，是否永久不再补录这一天？\n(针对节假日或资金不足的情况建议选‘是’)"
-                    should_ignore = messagebox.askyesno("删除确认", msg)
-
-                    if should_ignore:
-                        plan_name = del_remark.replace("计划:", "")
-                        for p in self.drip_plans:
-                            if p['name'] == plan_name:
-                                if 'ignored_dates' not in p: p['ignored_dates'] = []
-                                # 这里保存的是界面上显示的日期（可能是顺延后的实际日期）
-                                # 为了稳健，我们应该同时忽略名义日期吗？
-                                # 简化策略：只忽略这一天。如果因为顺延导致第二天又补录，用户再删一次即可。
-                                if item_date_str not in p['ignored_dates']:
-                                    p['ignored_dates'].append(item_date_str)
-                                break
-                    self.drip_records.pop(target_idx)
-            else:
-                for i, r in enumerate(self.records):
-                    if (r[0].strftime("%Y-%m-%d") == item_date_str and
-                            abs(r[1] - del_amt) < 0.001):
-                        self.records.pop(i)
-                        break
+            drip_cnt = sum(1 for rid in ids if self.ledger.get_record(rid)[1])
+            should_ignore = False
+            if drip_cnt:
+                what, days = ("一条自动定投记录", "这一天") if drip_cnt == 1 else (f"{drip_cnt} 条自动定投记录", "这些日期")
+                msg = f"您正在删除{what}。\n\n下次启动时，是否永久不再补录{days}？\n(针对节假日或资金不足的情况建议选‘是’)"
+                should_ignore = messagebox.askyesno("删除确认", msg)
+                # 简化策略：只忽略这一天。如果因为顺延导致第二天又补录，用户再删一次即可。
+            deleted = self.ledger.delete_records(ids, ignore_date=should_ignore)
+            if not deleted: return
 
             self.save_data()
-            self.render_tree_view()
+            self.tree_view.remove_records(deleted)
+            self.update_summary_labels()
         except Exception as e:
             messagebox.showerror("系统错误", f"删除失败: {str(e)}")
             print(f"删除异常: {e}")
@@ -689,59 +510,293 @@ class GroupedFundApp(ctk.CTk):
 
     def calculate_xirr(self):
         try:
-            end_val = float(self.entry_end_val.get())
-            end_date = self.entry_end_date.get_date()
-            txs = [(self.start_date_obj, -self.initial_capital)]
-            txs += [(r[0], r[1]) for r in self.records]
-            txs += [(d[0], d[1]) for d in self.drip_records]
-            txs.append((end_date, end_val))
-            txs.sort(key=lambda x: x[0])
-
-            if txs[-1][0] <= txs[0][0]:
-                messagebox.showerror("错误", "结束日期必须晚于开始日期")
-                return
-
-            dates = [t[0] for t in txs]
-            amounts = [t[1] for t in txs]
-            years = [(d - dates[0]).days / 365.0 for d in dates]
-
-            def xnpv(rate):
-                if rate <= -1.0: return float('inf')
-                return sum([a / ((1 + rate) ** y) for a, y in zip(amounts, years)])
-
-            try:
-                res = optimize.brentq(xnpv, -0.999, 100)
-            except:
-                try:
-                    res = optimize.newton(xnpv, 0.1, maxiter=50)
-                except:
-                    self.result_label.configure(text="计算失败: 数据可能不收敛", text_color="red")
-                    return
-
-            rate_pct = res * 100
-            total_inv = sum([-a for a in amounts if a < 0])
-            profit = sum([a for a in amounts if a > 0]) - total_inv
-
-            color = "#C0392B" if rate_pct > 0 else "#27AE60"
-            self.result_label.configure(text=f"年化: {rate_pct:.2f}% | 盈亏: {profit:,.2f}", text_color=color)
+            end_val = to_cents(self.entry_end_val.get())
         except ValueError:
             messagebox.showerror("错误", "请输入有效的数字")
-        except Exception as e:
+            return
+        end_date = self.entry_end_date.get_date()
+        if self._xirr_task is not None:
+            self._xirr_task.cancel()
+            self._xirr_task = None
+
+        # 账本没变、结束日期与市值也没变时直接用上次的结果
+        ledger, cache = self.ledger, self.ledger.flow_cache
+        result = cache.lookup(ledger.version, end_date, end_val, "metrics")
+        if result is not None:
+            self._show_xirr(result)
+            return
+
+        # 整理好的现金流（按版本缓存、只读）交给后台一次算出各项指标，期间账本可以继续修改
+        flows = ledger.prepared_flows()
+
+        def done(result):
+            cache.remember(flows.version, end_date, end_val, result, "metrics")
+            self._show_xirr(result)
+
+        self.result_label.configure(text="计算中…", text_color=("gray10", "gray90"))
+        guess = cache.guess(flows, end_date, end_val)
+        self._xirr_task = self.tasks.submit(analytics.analyze, flows, end_date, end_val, None, guess,
+                                            cpu=len(flows.days) >= PROCESS_MIN_FLOWS,
+                                            on_done=done, on_error=self._xirr_failed)
+
+    def _show_xirr(self, metrics):
+        self._xirr_task = None
+        if metrics.xirr is None:
+            color = "red"
+        else:
+            color = "#C0392B" if metrics.xirr > 0 else "#27AE60"
+        self.result_label.configure(text="\n".join(analytics.describe(metrics)), text_color=color)
+
+    def _xirr_failed(self, e):
+        self._xirr_task = None
+        if isinstance(e, ValueError):
+            self.result_label.configure(text="准备就绪", text_color=("gray10", "gray90"))
+            messagebox.showerror("错误", str(e))
+        else:
             self.result_label.configure(text=f"计算出错: {e}", text_color="red")
 
     def export_backup(self):
         self.save_data()
         fn = f"backup_{datetime.now().strftime('%Y%m%d')}.json"
-        path = filedialog.asksaveasfilename(initialfile=fn, defaultextension=".json")
-        if path: shutil.copy(DATA_FILE, path)
+        path = filedialog.asksaveasfilename(initialfile=fn, defaultextension=".json",
+                                            filetypes=[("JSON", "*.json"), ("gzip 压缩 JSON", "*.json.gz")])
+        if path:
+            # 主线程取快照（拷贝列数据，很快），流式写文件放到后台
+            self.tasks.submit(write_ledger, self.ledger.snapshot(), path,
+                              on_error=lambda e: messagebox.showerror("导出失败", str(e)))
 
     def import_backup(self):
         path = filedialog.askopenfilename()
         if path:
             self.load_data_from_file(path)
-            self.save_data()
+            self.save_data(compact=True)
+
+    def import_csv(self):
+        """批量导入券商对账单等 CSV：后台解析 + 去重，完成后一次写入、一次刷新"""
+        if not self.ledger.is_initialized:
+            messagebox.showwarning("提示", "请先锁定初始本金！")
+            return
+        path = filedialog.askopenfilename(filetypes=[("CSV", "*.csv"), ("所有文件", "*.*")])
+        if not path: return
+        if self._csv_task is not None:
+            self._csv_task.cancel()
+        ledger, seq = self.ledger, self.ledger.seq
+        self.result_label.configure(text="正在导入 CSV…", text_color=("gray10", "gray90"))
+        self._csv_task = self.tasks.submit(
+            import_csv_job, ledger, seq, path,
+            on_done=lambda result: self._apply_csv(ledger, seq, result),
+            on_error=self._csv_failed)
+
+    def _apply_csv(self, ledger, seq, result):
+        self._csv_task = None
+        planned, (days, cents, remarks, invalid) = result
+        if ledger is not self.ledger: return
+        if planned is None or ledger.seq != seq:
+            # 解析期间账本被修改过，按最新的记录重新去重（文件已经解析好，很快）
+            planned = csv_import.plan_import(ledger, days, cents, remarks)
+        op, dupes = planned
+        added = ledger.apply_import(op)
+        if added:
+            self.save_data(compact=True)  # 一次导入大量记录，直接重写快照比追加日志更省
+            self.render_tree_view()
+        self.result_label.configure(text="准备就绪", text_color=("gray10", "gray90"))
+        messagebox.showinfo("导入 CSV", f"导入 {added} 条，跳过重复 {dupes} 条，无效行 {invalid} 条")
+
+    def _csv_failed(self, e):
+        self._csv_task = None
+        self.result_label.configure(text="准备就绪", text_color=("gray10", "gray90"))
+        messagebox.showerror("导入失败", str(e))
+
+    # ================= 多组合工作区 =================
+
+    def switch_portfolio(self, name):
+        if name == self.portfolio: return
+        for task in (self._drip_task, self._xirr_task, self._csv_task):
+            if task is not None: task.cancel()
+        self._drip_task = self._xirr_task = self._csv_task = None
+        try:
+            self.saver.flush()  # 当前组合写完再换，之后它可能被换出内存
+        except Exception as e:
+            messagebox.showerror("保存失败", str(e))
+            self.option_portfolio.set(self.portfolio)
+            return
+        try:
+            self.workspace.open(name)  # 加载后留在内存里，load_data_from_file 直接取用
+        except Exception as e:
+            messagebox.showerror("加载失败", f"文件损坏: {e}")
+            self.option_portfolio.set(self.portfolio)
+            return
+        self.portfolio = name
+        self.option_portfolio.set(name)
+        self.load_data_from_file()
+        self.result_label.configure(text="准备就绪", text_color=("gray10", "gray90"))
+        self.after(100, self.generate_daily_drip_records)
+
+    def new_portfolio(self):
+        name = ctk.CTkInputDialog(text="组合名称（即数据文件名）:", title="新建组合").get_input()
+        if not name: return
+        try:
+            self.saver.flush()
+            self.workspace.create(name.strip())
+        except Exception as e:
+            messagebox.showerror("新建组合", str(e))
+            return
+        self.option_portfolio.configure(values=self.workspace.names())
+        self.switch_portfolio(name.strip())
+
+    def drip_other_portfolios(self):
+        """启动时在进程池里并行补录其他组合的定投（当前组合走 generate_daily_drip_records）"""
+        paths = self.workspace.release(exclude=(self.portfolio,))
+        if not paths: return
+        # 子进程直接读写这些组合的文件，完成之前不允许切换过去
+        self.option_portfolio.configure(state="disabled")
+        self.btn_ws_xirr.configure(state="disabled")
+        self._ws_task = self.tasks.submit(workspace.drip_files, paths, self.today_bj, self.workspace.pool(),
+                                          on_done=self._other_drips_done, on_error=self._other_drips_failed)
+
+    def _other_drips_done(self, counts):
+        self._ws_task = None
+        self.option_portfolio.configure(state="normal")
+        self.btn_ws_xirr.configure(state="normal")
+        if sum(counts):
+            self.result_label.configure(text=f"其他组合已自动补录 {sum(counts)} 条定投记录",
+                                        text_color=("gray10", "gray90"))
+
+    def _other_drips_failed(self, e):
+        self._other_drips_done([])
+        messagebox.showerror("定投助手", f"其他组合补录失败: {e}")
+
+    def open_workspace_xirr(self):
+        """各组合分别填当前市值，并行计算各自的年化和合并现金流后的汇总年化"""
+        dialog = ctk.CTkToplevel(self)
+        dialog.title("汇总年化")
+        dialog.grab_set()
+
+        rows = {}
+        for i, name in enumerate(self.workspace.names()):
+            ctk.CTkLabel(dialog, text=name).grid(row=i, column=0, padx=10, pady=4, sticky="w")
+            entry = ctk.CTkEntry(dialog, placeholder_text="当前总市值（不填则不计入）", width=180)
+            entry.grid(row=i, column=1, padx=10, pady=4)
+            label = ctk.CTkLabel(dialog, text="", width=220, anchor="w")
+            label.grid(row=i, column=2, padx=10, pady=4)
+            rows[name] = (entry, label)
+        if self.entry_end_val.get().strip():
+            rows[self.portfolio][0].insert(0, self.entry_end_val.get().strip())
+
+        total_label = ctk.CTkLabel(dialog, text=f"结算日期: {self.entry_end_date.get_date()}", font=("微软雅黑", 14))
+        total_label.grid(row=len(rows), column=0, columnspan=2, padx=10, pady=10, sticky="w")
+
+        def run():
+            end_values = {}
+            for name, (entry, label) in rows.items():
+                label.configure(text="")
+                if not entry.get().strip(): continue
+                try:
+                    end_values[name] = to_cents(entry.get())
+                except ValueError:
+                    messagebox.showerror("错误", f"{name}: 请输入有效的数字", parent=dialog)
+                    return
+            if not end_values: return
+            end_date = self.entry_end_date.get_date()
+            # 已加载的组合在主线程拷贝现金流（含未保存的修改），其余由子进程读文件
+            sources = self.workspace.flow_sources(end_values)
+            total_label.configure(text="计算中…", text_color=("gray10", "gray90"))
+            self.tasks.submit(workspace.solve_all, sources, end_values, end_date, self.workspace.pool(),
+                              on_done=show, on_error=lambda e: messagebox.showerror("错误", str(e), parent=dialog))
+
+        def describe(result):
+            if isinstance(result, Exception):
+                return f"计算失败: {result}", "red"
+            rate, profit = result
+            color = "#C0392B" if rate > 0 else "#27AE60"
+            return f"年化: {rate * 100:.2f}% | 盈亏: {fmt(profit, grouping=True)}", color
+
+        def show(result):
+            if not dialog.winfo_exists(): return
+            for name, (_, label) in rows.items():
+                value = result.rates.get(name, result.errors.get(name))
+                if value is not None:
+                    text, color = describe(value)
+                    label.configure(text=text, text_color=color)
+            text, color = describe(result.total)
+            total_label.configure(text=f"汇总 {text}", text_color=color)
+
+        ctk.CTkButton(dialog, text="计算", command=run).grid(row=len(rows), column=2, padx=10, pady=10)
+
+    def open_projection(self):
+        """按当前的定投计划做蒙特卡洛模拟（见 projection.py），在后台线程运行，子进程并行模拟路径"""
+        if not any(p.get('active', True) for p in self.ledger.drip_plans):
+            messagebox.showinfo("前景模拟", "没有启用的定投计划")
+            return
+        dialog = ctk.CTkToplevel(self)
+        dialog.title("前景模拟")
+        dialog.grab_set()
+
+        fields = {}
+        for i, (key, label, default) in enumerate((("years", "模拟年数", "10"), ("paths", "路径数", "10000"),
+                                                    ("mean", "年化期望收益 (%)", "8"), ("vol", "年化波动率 (%)", "20"),
+                                                    ("start", "当前市值（计入今天）", self.entry_end_val.get().strip()))):
+            ctk.CTkLabel(dialog, text=label).grid(row=i, column=0, padx=10, pady=4, sticky="w")
+            entry = ctk.CTkEntry(dialog, width=160)
+            entry.insert(0, default)
+            entry.grid(row=i, column=1, padx=10, pady=4)
+            fields[key] = entry
+        result_label = ctk.CTkLabel(dialog, text="", font=("Consolas", 13), justify="left")
+        result_label.grid(row=len(fields) + 1, column=0, columnspan=2, padx=10, pady=10, sticky="w")
+
+        def run():
+            try:
+                years, paths = int(fields["years"].get()), int(fields["paths"].get())
+                mean, vol = float(fields["mean"].get()) / 100, float(fields["vol"].get()) / 100
+                start = to_cents(fields["start"].get()) if fields["start"].get().strip() else 0
+            except ValueError:
+                messagebox.showerror("错误", "请输入有效的数字", parent=dialog)
+                return
+            result_label.configure(text="模拟中…")
+            plans = [dict(p) for p in self.ledger.drip_plans]
+            self.tasks.submit(projection.project, plans, self.today_bj, years, paths, mean, vol, start, on_done=show,
+                              on_error=lambda e: messagebox.showerror("错误", str(e), parent=dialog))
+
+        def show(result):
+            if not dialog.winfo_exists(): return
+            lines = [f"{result.end_date} 期末（投入合计 {fmt(result.contributed, grouping=True)}）"]
+            for level, value, rate in zip(result.levels, result.values.tolist(), result.rates.tolist()):
+                lines.append(f"{level:>3}% 分位: {fmt(value, grouping=True):>16}   年化 "
+                             f"{'—' if rate != rate else f'{rate * 100:.2f}%'}")
+            lines.append(f"均值 {fmt(result.mean_value, grouping=True)}，亏损概率 {result.loss_probability * 100:.1f}%")
+            result_label.configure(text="\n".join(lines))
+
+        ctk.CTkButton(dialog, text="模拟", command=run).grid(row=len(fields), column=0, columnspan=2, pady=10)
+
+
+def import_csv_job(ledger, seq, path):
+    """
+    后台线程：解析 CSV 并与账本现有记录去重（只读账本）-> ((import 操作, 重复条数), 解析结果)。
+    去重时界面正在修改账本、读到了不一致的状态而出错时，去重结果为 None，由 _apply_csv 在主线程重算。
+    """
+    parsed = csv_import.read_csv(path)
+    try:
+        return csv_import.plan_import(ledger, *parsed[:3]), parsed
+    except Exception:
+        if ledger.seq == seq: raise
+        return None, parsed
+
+
+def plan_drip_job(ledger, drip_index, markets, start_date, today, report):
+    """
+    后台线程：逐个市场加载交易日历（可能要联网），再计算要补录的记录。
+    drip_index 为提交前在主线程取的 cols.drip_snapshot()，这里不碰共享的去重索引。
+    """
+    import calendars
+
+    for i, market in enumerate(markets):
+        report(i, len(markets))
+        calendars.preload([market], start_date, today + timedelta(days=15))
+    report(len(markets), len(markets))
+    return ledger.plan_drip(today, drip_index=drip_index)
 
 
 if __name__ == "__main__":
+    profiling.configure()  # FUND_PROFILE / FUND_PROFILE_CPROFILE 环境变量
     app = GroupedFundApp()
     app.mainloop()
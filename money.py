@@ -0,0 +1,39 @@
+"""
+金额：整数"分"
+
+账本内部的金额一律是 int（分），汇总、去重、删除都是精确的整数运算；
+只在边界处转换：界面/命令行输入 -> to_cents，显示 -> fmt，
+JSON/日志里仍写"元"（yuan，保持文件格式不变），XIRR 求解前才转成浮点。
+"""
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+
+import numpy as np
+
+
+def to_cents(value):
+    """元 -> 分。字符串按十进制精确解析，四舍五入到分；非法输入抛出 ValueError"""
+    if isinstance(value, str):
+        try:
+            return int((Decimal(value.strip()) * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+        except InvalidOperation:
+            raise ValueError(f"无效金额: {value!r}") from None
+    return int(round(value * 100))
+
+
+def to_cents_array(values):
+    """元（浮点数组）-> 分（int64 数组）"""
+    return np.rint(np.asarray(values, dtype=np.float64) * 100).astype(np.int64)
+
+
+def yuan(cents):
+    """分 -> 元（写文件、求解 XIRR 时使用）"""
+    return cents / 100
+
+
+def fmt(cents, sign=False, grouping=False):
+    """分 -> "1234.50"；sign 时正数带 +，grouping 时千分位"""
+    cents = int(cents)
+    whole, frac = divmod(abs(cents), 100)
+    text = f"{whole:,}" if grouping else str(whole)
+    prefix = "-" if cents < 0 else ("+" if sign else "")
+    return f"{prefix}{text}.{frac:02d}"
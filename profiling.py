@@ -0,0 +1,210 @@
+"""
+可选的性能埋点（默认关闭；关闭时每个埋点只是一次函数调用，几乎没有开销）
+
+打开方式（界面、命令行都适用）：
+- 环境变量 FUND_PROFILE=输出文件，或命令行 --profile 输出文件：
+  以 .json 结尾时写 Chrome trace（chrome://tracing 或 https://ui.perfetto.dev 打开），
+  其他扩展名写结构化日志（每行一个 JSON：span、计数器，最后一行是按阶段的汇总）；
+- 环境变量 FUND_PROFILE_CPROFILE=xxx.prof，或命令行 --cprofile xxx.prof：整个运行包在 cProfile 里
+  （只统计主线程），用 python -m pstats xxx.prof 查看。
+退出时写出文件，并在标准错误打印各阶段的调用次数与耗时。
+
+埋点：
+    with profiling.span("drip.lookup", plan=name):   # 一段耗时
+        ...
+    profiling.count("xirr.iterations", n)           # 计数器
+    @profiling.traced("io.read_json")                # 整个函数算一段
+
+阶段命名：calendar.*（交易日历）、drip.*（定投补录）、xirr.*（求解）、io.*（序列化/存储）、
+tree.*（明细树插入）、import.*（CSV 导入）、projection.*（前景模拟）。
+"""
+import atexit
+import functools
+import json
+import os
+import sys
+import threading
+import time
+
+_recorder = None  # 打开时为 _Recorder
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("recorder", "name", "args", "start")
+
+    def __init__(self, recorder, name, args):
+        self.recorder = recorder
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.recorder.add(self.name, self.start, time.perf_counter_ns(), self.args)
+        return False
+
+
+class _Recorder:
+    def __init__(self, path):
+        self.path = path
+        self.origin = time.perf_counter_ns()
+        self.spans = []  # (名称, 开始 ns, 结束 ns, 线程 id, 参数)
+        self.counters = {}  # 名称 -> 累计值
+        self.samples = []  # (名称, 时间 ns, 累计值)，Chrome trace 里画成曲线
+        self.threads = {}  # 线程 id -> 线程名
+        self.lock = threading.Lock()
+
+    def _thread(self):
+        tid = threading.get_ident()
+        if tid not in self.threads:
+            self.threads[tid] = threading.current_thread().name
+        return tid
+
+    def add(self, name, start, end, args):
+        with self.lock:
+            self.spans.append((name, start, end, self._thread(), args))
+
+    def count(self, name, n):
+        with self.lock:
+            value = self.counters[name] = self.counters.get(name, 0) + n
+            self.samples.append((name, time.perf_counter_ns(), value))
+
+    def summary(self):
+        """{阶段: {"calls", "total_ms", "max_ms"}}，按总耗时降序"""
+        stats = {}
+        for name, start, end, _, _ in self.spans:
+            s = stats.setdefault(name, {"calls": 0, "total_ms": 0.0, "max_ms": 0.0})
+            ms = (end - start) / 1e6
+            s["calls"] += 1
+            s["total_ms"] += ms
+            s["max_ms"] = max(s["max_ms"], ms)
+        return dict(sorted(stats.items(), key=lambda kv: -kv[1]["total_ms"]))
+
+    def _us(self, ns):
+        return (ns - self.origin) / 1000
+
+    def write_chrome(self, f):
+        pid = os.getpid()
+        events = [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+                  for tid, name in self.threads.items()]
+        events += [{"name": name, "ph": "X", "pid": pid, "tid": tid, "ts": self._us(start),
+                    "dur": (end - start) / 1000, "args": args}
+                   for name, start, end, tid, args in self.spans]
+        events += [{"name": name, "ph": "C", "pid": pid, "ts": self._us(ts), "args": {"value": value}}
+                   for name, ts, value in self.samples]
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f, ensure_ascii=False)
+
+    def write_log(self, f):
+        for name, start, end, tid, args in self.spans:
+            f.write(json.dumps({"type": "span", "name": name, "start_ms": self._us(start) / 1000,
+                                "dur_ms": (end - start) / 1e6, "thread": self.threads[tid], "args": args},
+                               ensure_ascii=False) + "\n")
+        for name, value in self.counters.items():
+            f.write(json.dumps({"type": "counter", "name": name, "value": value}, ensure_ascii=False) + "\n")
+        f.write(json.dumps({"type": "summary", "phases": self.summary()}, ensure_ascii=False) + "\n")
+
+    def dump(self):
+        with self.lock:
+            with open(self.path, "w", encoding="utf-8") as f:
+                if self.path.lower().endswith(".json"):
+                    self.write_chrome(f)
+                else:
+                    self.write_log(f)
+
+    def print_summary(self, file=None):
+        file = file or sys.stderr
+        print(f"\n{'phase':<24} {'calls':>7} {'total(ms)':>10} {'max(ms)':>9}", file=file)
+        for name, s in self.summary().items():
+            print(f"{name:<24} {s['calls']:>7} {s['total_ms']:>10.2f} {s['max_ms']:>9.2f}", file=file)
+        for name, value in self.counters.items():
+            print(f"{name:<24} {value:>7}", file=file)
+        print(f"已写入 {self.path}", file=file)
+
+
+# ================= 埋点 =================
+
+def enabled():
+    return _recorder is not None
+
+
+def span(name, **args):
+    """记录一段耗时的上下文管理器；关闭时返回共享的空对象"""
+    if _recorder is None: return _NULL
+    return _Span(_recorder, name, args)
+
+
+def count(name, n=1):
+    if _recorder is not None:
+        _recorder.count(name, n)
+
+
+def traced(name):
+    """装饰器版的 span，整个函数调用算一段"""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _recorder is None:
+                return fn(*args, **kwargs)
+            with _Span(_recorder, name, {}):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+# ================= 开关 =================
+
+def enable(path):
+    """开始记录，退出时写到 path"""
+    global _recorder
+    if _recorder is None:
+        atexit.register(_finish)
+    _recorder = _Recorder(path)
+
+
+def _finish():
+    global _recorder
+    recorder, _recorder = _recorder, None
+    if recorder is None: return
+    try:
+        recorder.dump()
+        recorder.print_summary()
+    except OSError as e:
+        print(f"写入性能记录失败: {e}", file=sys.stderr)
+
+
+def start_cprofile(path):
+    """用 cProfile 记录之后的整个运行（当前线程），退出时写出 pstats 文件"""
+    import cProfile
+
+    profiler = cProfile.Profile()
+
+    def finish():
+        profiler.disable()
+        profiler.dump_stats(path)
+        print(f"cProfile 结果已写入 {path}（python -m pstats {path}）", file=sys.stderr)
+
+    atexit.register(finish)
+    profiler.enable()
+
+
+def configure(path=None, cprofile=None):
+    """按参数或环境变量（FUND_PROFILE / FUND_PROFILE_CPROFILE）打开埋点；程序入口调用一次"""
+    path = path or os.environ.get("FUND_PROFILE")
+    cprofile = cprofile or os.environ.get("FUND_PROFILE_CPROFILE")
+    if path:
+        enable(path)
+    if cprofile:
+        start_cprofile(cprofile)
@@ -0,0 +1,157 @@
+"""
+定投前景模拟（蒙特卡洛）
+
+按活跃的定投计划把未来 years 年的每期投入排到真实交易日上（与补录相同：名义日期顺延到下一个交易日），
+再模拟 paths 条收益路径，得到期末市值与 XIRR 的分位数：
+- 收益模型：几何布朗运动，年化期望收益 mean、年化波动 vol；只在投入日之间取增量（每段的对数收益
+  ~ N((log(1+mean) - vol²/2)·Δt, vol²·Δt)），与逐日模拟的分布完全相同；
+- 路径 × 投入日 的矩阵一次生成，期末市值 = Σ 投入 × exp(之后各段对数收益之和)（反向累加）；
+  矩阵按 MAX_CELLS 分块，内存与路径数无关；
+- 路径分成若干批（每批独立的随机数流，由 seed 派生），可以放到进程池里并行，结果与并行度无关；
+- 除期末市值外其余现金流都是投入，XIRR 随期末市值单调递增，所以 XIRR 的分位数就是
+  市值分位数对应的 XIRR，只需批量求解几个点（xirr.xirr_scenarios）；
+  path_rates=True 时另外逐条路径批量求解，返回完整的 XIRR 分布（慢得多）。
+当前市值 start_value 视为今天的一笔投入。
+"""
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+import numpy as np
+
+import profiling
+import xirr
+from ledger import add_months, parse_date
+from money import to_cents
+
+PERCENTILES = (5, 25, 50, 75, 95)
+BATCH_PATHS = 10_000  # 每批路径数（进程池的一个任务）
+MAX_CELLS = xirr.MAX_CELLS  # 单个 路径 × 日期 矩阵的元素上限
+
+# levels: 分位点（百分数）；values: 各分位点的期末市值(分)；rates: 对应的 XIRR；
+# contributed: 投入合计(分，含当前市值)；mean_value: 期末市值均值(分)；loss_probability: 期末市值低于投入合计的比例；
+# days / cents: 投入日程（日序号、金额(分)，含今天的当前市值）；path_rates: 每条路径的 XIRR（未要求时为 None）
+Projection = namedtuple("Projection", "paths end_date levels values rates contributed mean_value loss_probability "
+                                      "days cents path_rates")
+
+
+def contribution_schedule(plans, today, end_date, trading_days=None):
+    """
+    活跃计划在 (today, end_date] 内的投入 -> (日序号数组, 金额(分，正数)数组)，按日期升序、同一天已合并。
+    trading_days 与 Ledger.plan_drip 相同，默认 calendars.trading_day_ordinals。
+    """
+    import calendars
+    import schedule
+    from flow_cache import group_by_day
+
+    if trading_days is None:
+        trading_days = calendars.trading_day_ordinals
+    plans = [p for p in plans if p.get('active', True)]
+    search_end = end_date + timedelta(days=15)  # 月末名义日期可能顺延到下个月初
+    calendars_by_market = {}
+    days, cents = [], []
+    for plan in plans:
+        market = plan.get('market', 'CN')
+        if market not in calendars_by_market:
+            calendars_by_market[market] = trading_days(market, today, search_end)
+        # 名义日期从计划起点生成（月定投的小月截断会一直沿用），只取今天之后的
+        nominal = schedule.nominal_ordinals(plan['start_date_obj'], end_date, plan.get('frequency', 'daily'))
+        nominal = nominal[nominal > today.toordinal()]
+        ignored = set()
+        for s in plan.get('ignored_dates', []):
+            try:
+                ignored.add(parse_date(s).toordinal())
+            except ValueError:
+                pass
+        executed, _ = schedule.plan_executions(nominal, calendars_by_market[market], end_date.toordinal(), ignored)
+        days.append(executed)
+        cents.append(np.full(len(executed), to_cents(plan['amount']), dtype=np.int64))
+    if not days: return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return group_by_day(np.concatenate(days), np.concatenate(cents))
+
+
+def _terminal_values(dt, amounts, drift, vol, seed, paths):
+    """
+    一批路径的期末市值（元）。dt: 各段长度（年，len = 日期数 - 1）；amounts: 各日期的投入（元），
+    最后一个日期是结束日。按 MAX_CELLS 分块生成 路径 × 段 的对数收益矩阵。
+    矩阵用 float32：耗时主要在生成随机数与 exp，单精度快一些，误差（约 1e-6）远小于抽样误差。
+    """
+    rng = np.random.default_rng(seed)
+    steps = len(dt)
+    if steps == 0:
+        return np.full(paths, float(amounts.sum()))
+    mu, sigma = (drift * dt).astype(np.float32), (vol * np.sqrt(dt)).astype(np.float32)
+    head, last = amounts[:-1].astype(np.float32), float(amounts[-1])
+    rows = max(1, MAX_CELLS // steps)
+    out = np.empty(paths)
+    for i in range(0, paths, rows):
+        n = min(rows, paths - i)
+        z = rng.standard_normal((n, steps), dtype=np.float32)
+        z *= sigma
+        z += mu
+        # 第 j 笔投入之后的对数收益之和 = 从第 j 段到最后一段的反向累加
+        growth = np.cumsum(z[:, ::-1], axis=1)[:, ::-1]
+        np.exp(growth, out=growth)
+        out[i:i + n] = growth @ head + last
+    return out
+
+
+def _batch(dt, amounts, drift, vol, seed, paths, flow_days, flows, end_ord):
+    """进程池任务：一批路径的期末市值（元）；flow_days 不为 None 时再逐条路径求 XIRR"""
+    values = _terminal_values(dt, amounts, drift, vol, seed, paths)
+    rates = None
+    if flow_days is not None:
+        rates = xirr.xirr_scenarios(flow_days, flows, end_ord, values)
+    return values, rates
+
+
+@profiling.traced("projection.run")
+def project(plans, today, years=10, paths=10_000, mean=0.08, vol=0.2, start_value=0, seed=None,
+            levels=PERCENTILES, trading_days=None, max_workers=None, path_rates=False):
+    """
+    模拟活跃定投计划未来 years 年的结果 -> Projection。
+    plans 为 Ledger.drip_plans；start_value 为当前市值（分），计入今天的投入；
+    mean / vol 为年化期望收益与波动；seed 相同则结果相同（与 max_workers 无关）；
+    max_workers 为 1 时不开进程池。没有任何投入时抛出 ValueError。
+    """
+    if paths <= 0: raise ValueError("路径数必须为正数")
+    if vol < 0 or mean <= -1: raise ValueError("收益模型参数无效")
+    end_date = add_months(today, 12 * years)
+    with profiling.span("projection.schedule"):
+        days, cents = contribution_schedule(plans, today, end_date, trading_days)
+    if start_value:
+        days = np.concatenate(([today.toordinal()], days))
+        cents = np.concatenate(([start_value], cents))
+    if not cents.any():
+        raise ValueError("没有可模拟的定投计划或当前市值")
+
+    # 日期网格：各投入日 + 结束日；结束日当天的投入不经历任何收益
+    grid = np.append(days, end_date.toordinal()) if days[-1] < end_date.toordinal() else days
+    amounts = np.zeros(len(grid))
+    amounts[:len(cents)] = cents / 100
+    dt = np.diff(grid) / xirr.DAYS_PER_YEAR
+    drift = np.log1p(mean) - vol * vol / 2
+
+    # XIRR 的现金流：投入为负 + 期末市值
+    flow_days, flows = grid, -amounts
+    sizes = [min(BATCH_PATHS, paths - i) for i in range(0, paths, BATCH_PATHS)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    jobs = [(dt, amounts, drift, vol, s, n, flow_days if path_rates else None, flows, int(grid[-1]))
+            for s, n in zip(seeds, sizes)]
+    workers = max_workers or min(len(jobs), os.cpu_count() or 1)
+    with profiling.span("projection.simulate", paths=paths, dates=len(grid)):
+        if workers <= 1:
+            results = [_batch(*job) for job in jobs]
+        else:
+            with ProcessPoolExecutor(workers) as pool:
+                results = list(pool.map(_batch, *zip(*jobs)))
+    values = np.concatenate([r[0] for r in results])
+    rates = np.concatenate([r[1] for r in results]) if path_rates else None
+
+    contributed = int(cents.sum())
+    pct = np.percentile(values, levels)
+    with profiling.span("projection.xirr"):
+        pct_rates = xirr.xirr_scenarios(flow_days, flows, int(grid[-1]), pct)
+    return Projection(paths, end_date, tuple(levels), np.round(pct * 100).astype(np.int64), pct_rates, contributed,
+                      int(round(values.mean() * 100)), float((values * 100 < contributed).mean()), days, cents, rates)
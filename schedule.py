@@ -0,0 +1,82 @@
+"""
+定投日程（向量化）
+
+一次生成计划的全部名义日期（日序号数组，date.toordinal()），
+再用数组/集合运算完成顺延、忽略日期过滤与去重，取代逐日推进的 while 循环。
+"""
+import numpy as np
+
+import profiling
+from calendars import roll_forward
+from columns import from_datetime64
+
+
+def monthly_ordinals(start_date, end_date):
+    """
+    月定投的名义日期。与逐月 +1 个月一致：遇到小月取月末，且之后一直沿用被截断后的日
+    （如 1/31 -> 2/28 -> 3/28），即日 = min(起始日, 途经各月天数) 的累计最小值。
+    """
+    first = np.datetime64(f"{start_date.year:04d}-{start_date.month:02d}", "M")
+    last = np.datetime64(f"{end_date.year:04d}-{end_date.month:02d}", "M")
+    months = np.arange(first, last + 1)
+    month_starts = months.astype("datetime64[D]")
+    days_in_month = ((months + 1).astype("datetime64[D]") - month_starts).astype(np.int64)
+    days_in_month[0] = start_date.day
+    day = np.minimum.accumulate(np.minimum(days_in_month, start_date.day))
+    ordinals = from_datetime64(month_starts) + day - 1
+    return ordinals[ordinals <= end_date.toordinal()]
+
+
+def nominal_ordinals(start_date, end_date, frequency):
+    """[start_date, end_date] 内计划的全部名义日期（升序 int64 日序号）"""
+    start, end = start_date.toordinal(), end_date.toordinal()
+    if start > end: return np.empty(0, dtype=np.int64)
+    if frequency == 'weekly':
+        return np.arange(start, end + 1, 7, dtype=np.int64)
+    if frequency == 'monthly':
+        return monthly_ordinals(start_date, end_date)
+    return np.arange(start, end + 1, dtype=np.int64)  # 默认日
+
+
+def _ordinals(values):
+    if isinstance(values, np.ndarray):
+        return values.astype(np.int64, copy=False)
+    return np.fromiter(values, dtype=np.int64, count=len(values))
+
+
+def plan_executions(nominal, trading_days, today_ord, ignored=(), existing=()):
+    """
+    由名义日期得到需要新增的执行日期。
+    nominal: 升序名义日期序号；trading_days: 升序交易日序号（可为空，表示不顺延）；
+    ignored: 用户忽略的日期序号（名义或实际日期命中都跳过）；existing: 已有同计划记录的执行日期序号；
+    两者可以是集合或数组。
+    返回 (新增执行日期序号数组, 已处理到的最后一个名义日期序号或 None)。
+    """
+    nominal = np.asarray(nominal, dtype=np.int64)
+    with profiling.span("drip.lookup", dates=len(nominal)):
+        executed = roll_forward(trading_days, nominal)
+
+    # 执行日期必须 <= 今天才能入账；顺延是单调的，只需截断尾部
+    cut = int(np.searchsorted(executed, today_ord, side="right"))
+    nominal, executed = nominal[:cut], executed[:cut]
+    if cut == 0: return executed, None
+
+    with profiling.span("drip.dedupe", dates=cut):
+        candidates = _filter(nominal, executed, ignored, existing)
+    return candidates, int(nominal[-1])
+
+
+def _filter(nominal, executed, ignored, existing):
+    """去掉忽略的日期、顺延后重复的日期和已有记录"""
+    keep = np.ones(len(nominal), dtype=bool)
+    if len(ignored):
+        ignored = _ordinals(ignored)
+        keep &= ~np.isin(nominal, ignored) & ~np.isin(executed, ignored)
+    candidates = executed[keep]
+    # 多个名义日期顺延到同一交易日时只记一次（已按升序，去掉相邻重复即可）
+    if candidates.size:
+        candidates = candidates[np.concatenate(([True], candidates[1:] != candidates[:-1]))]
+    if len(existing):
+        existing = _ordinals(existing)
+        candidates = candidates[~np.isin(candidates, existing)]
+    return candidates
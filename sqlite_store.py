@@ -0,0 +1,240 @@
+"""
+SQLite 账本存储（可选，标准库 sqlite3）
+
+与 storage.JournalStore 接口相同（load / commit / compact），数据文件以
+.db / .sqlite / .sqlite3 结尾时由 storage.open_store 选用。
+记录表的主键就是账本里的记录 id，每次提交只执行对应的 INSERT/DELETE
+（定投补录用 executemany 批量插入，删除按 id），
+记录表按日期、计划建索引；月度净流、累计投入等汇总直接用 SQL 聚合（命令行 monthly），
+cash_flow_arrays 以游标分批读取，大账本无需全部载入内存。
+金额列沿用 REAL（元），读出与聚合时用 CENTS 换算成整数分再求和，结果是精确的。
+"""
+import itertools
+import json
+import sqlite3
+import threading
+
+import numpy as np
+
+import profiling
+from columns import KIND_DRIP, KIND_RECORD, to_datetime64
+from ledger import Ledger, parse_date, plan_from_json, plan_to_json
+from money import to_cents, yuan
+
+SCHEMA_VERSION = 1
+
+CENTS = "CAST(ROUND(amount * 100) AS INTEGER)"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS records (
+    id INTEGER PRIMARY KEY,
+    kind INTEGER NOT NULL,
+    day TEXT NOT NULL,
+    amount REAL NOT NULL,
+    remark TEXT NOT NULL DEFAULT '',
+    plan_id TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_records_day ON records(day);
+CREATE INDEX IF NOT EXISTS idx_records_plan ON records(plan_id, day);
+CREATE TABLE IF NOT EXISTS plans (id TEXT PRIMARY KEY, pos INTEGER NOT NULL, data TEXT NOT NULL);
+"""
+
+
+class SqliteStore:
+    def __init__(self, path):
+        self.path = path
+        # 保存可能在后台线程执行（见 tasks.SaveCoalescer），连接允许跨线程，写入时持有 lock
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.conn:
+            self.conn.executescript(_SCHEMA)
+            self.conn.execute("INSERT OR IGNORE INTO meta VALUES ('schema_version', ?)", (str(SCHEMA_VERSION),))
+
+    def close(self):
+        self.conn.close()
+
+    # ================= 元数据 =================
+
+    def _meta(self):
+        return dict(self.conn.execute("SELECT key, value FROM meta"))
+
+    def _set_meta(self, **values):
+        self.conn.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)",
+                              [(k, json.dumps(v)) for k, v in values.items()])
+
+    def _header(self):
+        """(是否已初始化, 初始本金(分), 开始日期字符串, journal_seq)"""
+        meta = self._meta()
+        load = lambda k, default: json.loads(meta[k]) if k in meta else default  # noqa: E731
+        return (load("initialized", False), to_cents(load("initial_capital", 0)), load("start_date", None),
+                load("journal_seq", 0))
+
+    # ================= 存储接口 =================
+
+    @profiling.traced("io.sqlite_load")
+    def load(self):
+        """读取为内存账本（界面需要完整列表时使用）"""
+        ledger = Ledger()
+        initialized, capital, start, seq = self._header()
+        if initialized:
+            ledger.is_initialized = True
+            ledger.initial_capital = capital
+            ledger.start_date_obj = parse_date(start)
+        ledger.drip_plans = [plan_from_json(json.loads(data)) for data, in self.conn.execute(
+            "SELECT data FROM plans ORDER BY pos")]
+        meta = self._meta()
+        ledger.load_rows(
+            [(parse_date(d), a, r, i, None) for i, d, a, r in self.conn.execute(
+                f"SELECT id, day, {CENTS}, remark FROM records WHERE kind = ? ORDER BY id", (KIND_RECORD,))],
+            [(parse_date(d), a, r, i, p) for i, d, a, r, p in self.conn.execute(
+                f"SELECT id, day, {CENTS}, remark, plan_id FROM records WHERE kind = ? ORDER BY id", (KIND_DRIP,))],
+            json.loads(meta.get("next_id", "1")))
+        ledger.restore_aggregates(json.loads(meta["aggregates"]) if "aggregates" in meta else None)
+        ledger.seq = seq
+        return ledger
+
+    def commit(self, ledger):
+        """把账本里尚未落盘的操作写入数据库（一个事务）"""
+        self.write(self.prepare(ledger))
+
+    def compact(self, ledger):
+        """整体重写（导入备份、从 JSON 迁移时使用），批量插入"""
+        self.write(self.prepare(ledger, compact=True))
+
+    def prepare(self, ledger, compact=False):
+        """
+        与 JournalStore.prepare 相同：主线程取出要写的内容，write 可在后台线程执行。
+        计划列表、next_id、汇总在这里拷贝一份，写入时账本可以继续修改；
+        compact 时只拷贝列数据（Ledger.snapshot），记录表的行在 write 里生成。
+        连接是各线程共用的，读元数据也要持有 lock（后台线程可能正在事务里）。
+        """
+        ops = ledger.take_pending_ops()
+        plans = [(p['id'], i, json.dumps(plan_to_json(p), ensure_ascii=False))
+                 for i, p in enumerate(ledger.drip_plans)]
+        meta = {"next_id": ledger.next_id, "aggregates": ledger.totals.to_json()}
+        if compact:
+            with self.lock:
+                _, _, _, seq = self._header()
+            ledger.seq = max(ledger.seq, seq)
+            meta.update(initialized=ledger.is_initialized, initial_capital=yuan(ledger.initial_capital),
+                        start_date=ledger.start_date_obj.strftime("%Y-%m-%d") if ledger.start_date_obj else None,
+                        journal_seq=ledger.seq)
+            return "snapshot", ledger.snapshot(), plans, meta
+        if not ops: return None
+        meta["journal_seq"] = ops[-1]["seq"]
+        return "ops", ops, plans, meta
+
+    def write(self, payload):
+        if payload is None: return
+        kind, data, plans, meta = payload
+        rows = len(data.view.rid) if kind == "snapshot" else len(data)
+        with profiling.span("io.sqlite_write", kind=kind, rows=rows), self.lock, self.conn:
+            if kind == "snapshot":
+                self.conn.execute("DELETE FROM records")
+                self.conn.executemany(
+                    "INSERT INTO records (id, kind, day, amount, remark, plan_id) VALUES (?, ?, ?, ?, ?, ?)",
+                    _snapshot_rows(data))
+                self._write_plans(plans)
+            else:
+                self._write_ops(data, plans)
+            self._set_meta(**meta)
+
+    def _write_ops(self, ops, plans):
+        plans_dirty = False
+        for op in ops:
+            kind = op["op"]
+            if kind == "init":
+                self._set_meta(initialized=True, initial_capital=op["amount"], start_date=op["date"])
+            elif kind == "add":
+                self.conn.execute("INSERT INTO records (id, kind, day, amount, remark) VALUES (?, ?, ?, ?, ?)",
+                                  (op["id"], KIND_RECORD, op["date"], op["amount"], op["remark"]))
+            elif kind == "drip":
+                self.conn.executemany(
+                    "INSERT INTO records (id, kind, day, amount, remark, plan_id) VALUES (?, ?, ?, ?, ?, ?)",
+                    [(i, KIND_DRIP, d, a, r, p) for d, a, r, i, p in op["rows"]])
+                plans_dirty = plans_dirty or bool(op.get("marks"))
+            elif kind == "import":
+                self.conn.executemany(
+                    "INSERT INTO records (id, kind, day, amount, remark) VALUES (?, ?, ?, ?, ?)",
+                    zip(itertools.count(op["first_id"]), itertools.repeat(KIND_RECORD), op["dates"], op["amounts"],
+                        op["remarks"]))
+            elif kind == "delete":
+                self.conn.executemany("DELETE FROM records WHERE id = ?", [(i,) for i in op["ids"]])
+                plans_dirty = True  # 可能改了计划的忽略日期或水位线
+            elif kind in ("plan", "remove_plan"):
+                plans_dirty = True
+        if plans_dirty:
+            self._write_plans(plans)
+
+    def _write_plans(self, plans):
+        self.conn.execute("DELETE FROM plans")
+        self.conn.executemany("INSERT INTO plans VALUES (?, ?, ?)", plans)
+
+    # ================= 查询（不加载整个账本） =================
+
+    def count(self):
+        return self.conn.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+
+    def monthly_net_flow(self):
+        """
+        [(YYYY-MM, 流入, 流出, 净流)]（分），按月份升序，金额方向与记录一致（负数为投入），
+        含初始本金；与账本 totals 的月度汇总相同。
+        """
+        rows = self.conn.execute(
+            "SELECT substr(day, 1, 7) AS month, "
+            f"SUM(CASE WHEN amount > 0 THEN {CENTS} ELSE 0 END), "
+            f"SUM(CASE WHEN amount < 0 THEN {CENTS} ELSE 0 END), SUM({CENTS}) "
+            "FROM records GROUP BY month ORDER BY month").fetchall()
+        initialized, capital, start, _ = self._header()
+        if not initialized: return rows
+        month = start[:7]
+        out = {m: [i, o, n] for m, i, o, n in rows}
+        bucket = out.setdefault(month, [0, 0, 0])
+        bucket[1] -= capital
+        bucket[2] -= capital
+        return [(m, *out[m]) for m in sorted(out)]
+
+    def totals(self):
+        """(累计投入, 剩余现金)（分），口径与 Ledger.summary 一致"""
+        invested, cash = self.conn.execute(
+            f"SELECT COALESCE(SUM(CASE WHEN amount < 0 THEN -{CENTS} ELSE 0 END), 0), COALESCE(SUM({CENTS}), 0) "
+            "FROM records").fetchone()
+        initialized, capital, _, _ = self._header()
+        if initialized:
+            invested += capital
+            cash += capital
+        return invested, cash
+
+    def cash_flow_arrays(self, batch=50000):
+        """全部现金流（含初始本金）读成 (日序号 int64 数组, 金额 int64 分数组)，按日期升序"""
+        days, amounts = [], []
+        initialized, capital, start, _ = self._header()
+        if initialized:
+            days.append(np.array([parse_date(start).toordinal()], dtype=np.int64))
+            amounts.append(np.array([-capital], dtype=np.int64))
+        cur = self.conn.execute(f"SELECT day, {CENTS} FROM records ORDER BY day")
+        while True:
+            rows = cur.fetchmany(batch)
+            if not rows: break
+            days.append(np.fromiter((parse_date(d).toordinal() for d, _ in rows), dtype=np.int64, count=len(rows)))
+            amounts.append(np.fromiter((a for _, a in rows), dtype=np.int64, count=len(rows)))
+        if not days: return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        days, amounts = np.concatenate(days), np.concatenate(amounts)
+        order = np.argsort(days, kind="stable")  # 初始本金不一定最早
+        return days[order], amounts[order]
+
+
+def _snapshot_rows(snap, chunk=50000):
+    """Ledger.snapshot() -> records 表的行 (id, kind, day, amount, remark, plan_id)，按块生成"""
+    v = snap.view
+    plan_ids = snap.plan_ids + [None]  # 计划编码 NO_PLAN(-1) 取到末尾的 None
+    for s in range(0, len(v.rid), chunk):
+        part = slice(s, s + chunk)
+        days = np.datetime_as_string(to_datetime64(v.day[part])).tolist()
+        amounts = (v.amount[part] / 100).tolist()  # 表里仍是元
+        remarks = [snap.remarks[r] for r in v.remark[part].tolist()]
+        plans = [plan_ids[p] for p in v.plan[part].tolist()]
+        yield from zip(v.rid[part].tolist(), v.kind[part].tolist(), days, amounts, remarks, plans)
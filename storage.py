@@ -0,0 +1,139 @@
+"""
+账本存储：快照 + 追加日志
+
+每次修改只把新增的操作以一行 JSON 追加到 <数据文件>.journal 并 fsync，
+写入量与账本大小无关；日志超过阈值时压缩：原子地重写完整快照（临时文件 + 替换），
+再清空日志。快照中记录已包含的最后一个操作序号 journal_seq，
+加载时只重放序号更大的日志，因此压缩中途崩溃也不会重复应用操作；
+崩溃留下的半行日志会被丢弃。
+
+open_store 按文件扩展名选择后端：.db / .sqlite / .sqlite3 使用 SQLite（见 sqlite_store），
+其余使用 JSON 快照 + 日志。
+"""
+import json
+import os
+
+import profiling
+from json_stream import write_ledger
+from ledger import DATA_FILE, Ledger
+
+# 日志超过任一阈值即压缩为快照
+COMPACT_OPS = 2000
+COMPACT_BYTES = 4 * 1024 * 1024
+
+
+class JournalStore:
+    def __init__(self, path=DATA_FILE, compact_ops=COMPACT_OPS, compact_bytes=COMPACT_BYTES):
+        self.path = path
+        self.journal_path = path + ".journal"
+        self.compact_ops = compact_ops
+        self.compact_bytes = compact_bytes
+        self._journal_ops = 0
+        self._journal_bytes = 0
+        self._last_seq = 0
+
+    def _read_journal(self):
+        """读取完整的日志行；末尾不完整的一行（写入时崩溃）会被截掉"""
+        if not os.path.exists(self.journal_path): return []
+        ops = []
+        good_end = 0
+        with open(self.journal_path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"): break
+                try:
+                    ops.append(json.loads(line))
+                except ValueError:
+                    break
+                good_end += len(line)
+        if good_end != os.path.getsize(self.journal_path):
+            with open(self.journal_path, "r+b") as f:
+                f.truncate(good_end)
+        self._journal_ops = len(ops)
+        self._journal_bytes = good_end
+        return ops
+
+    def load(self):
+        """快照 + 重放日志；数据文件不存在时返回空账本"""
+        ledger = Ledger.load(self.path)
+        with profiling.span("io.journal_replay"):
+            ops = self._read_journal()
+            for op in ops:
+                if op["seq"] > ledger.seq:
+                    ledger.replay(op)
+        profiling.count("io.journal_ops_replayed", len(ops))
+        self._last_seq = ledger.seq
+        return ledger
+
+    def cash_flow_arrays(self):
+        """全部现金流（含初始本金）-> (日序号数组, 金额数组 int64 分)；JSON 快照没有单独的读法，加载整个账本"""
+        return self.load().cash_flow_arrays()
+
+    def monthly_net_flow(self):
+        """与 SqliteStore.monthly_net_flow 相同：[(YYYY-MM, 流入, 流出, 净流)]（分），取自账本的月度汇总"""
+        months = self.load().totals.months
+        return [(f"{y:04d}-{m:02d}", *months[(y, m)][:3]) for y, m in sorted(months)]
+
+    def totals(self):
+        """与 SqliteStore.totals 相同：(累计投入, 剩余现金)（分）"""
+        return self.load().summary()
+
+    def close(self):
+        """与 SqliteStore 一致；日志每次写完就关闭，没有要释放的"""
+
+    def commit(self, ledger):
+        """把账本里尚未落盘的操作追加到日志，必要时压缩"""
+        self.write(self.prepare(ledger))
+
+    def compact(self, ledger):
+        """
+        写入完整快照并清空日志（也用于导入备份后整体替换数据）。
+        序号不回退，避免崩溃后把旧日志重放到新快照上。
+        """
+        self.write(self.prepare(ledger, compact=True))
+
+    def prepare(self, ledger, compact=False):
+        """
+        保存分两步：prepare 在主线程从账本取出要写的内容（很快，之后账本可以继续修改），
+        write 可以放到后台线程执行（见 tasks.SaveCoalescer）。两步都要按顺序、一次一个地调用。
+        没有要写的内容时返回 None。
+        """
+        ops = ledger.take_pending_ops()
+        if not compact:
+            if not ops: return None
+            lines = "".join(json.dumps(op, ensure_ascii=False, separators=(",", ":")) + "\n" for op in ops)
+            data = lines.encode("utf-8")
+            if (self._journal_ops + len(ops) <= self.compact_ops and
+                    self._journal_bytes + len(data) <= self.compact_bytes):
+                return "append", data, len(ops), ops[-1]["seq"]
+        ledger.seq = max(ledger.seq, self._last_seq)
+        return "snapshot", ledger.snapshot(), ledger.seq
+
+    def write(self, payload):
+        if payload is None: return
+        if payload[0] == "append":
+            _, data, n, seq = payload
+            with profiling.span("io.journal_append", ops=n), open(self.journal_path, "ab") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            self._journal_ops += n
+            self._journal_bytes += len(data)
+            self._last_seq = seq
+            return
+        _, snap, seq = payload
+        write_ledger(snap, self.path)
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+        self._journal_ops = 0
+        self._journal_bytes = 0
+        self._last_seq = seq
+
+
+SQLITE_SUFFIXES = (".db", ".sqlite", ".sqlite3")
+
+
+def open_store(path=DATA_FILE):
+    if path.lower().endswith(SQLITE_SUFFIXES):
+        from sqlite_store import SqliteStore
+        return SqliteStore(path)
+    return JournalStore(path)
@@ -0,0 +1,183 @@
+"""
+后台任务
+
+Tk 不是线程安全的，耗时工作（交易日历加载、定投补录计算、保存、XIRR 求解）放到后台执行，
+完成后把结果放进队列，主线程用 after() 轮询队列再调用回调更新界面：
+- I/O（读写文件、拉取日历）走线程池；CPU 密集的大账本求解可以走进程池
+  （cpu=True，函数与参数需可 pickle，不支持进度汇报）；
+- 任务可以汇报进度、可以取消：取消后不再调用回调，尚未开始的任务直接丢弃，
+  正在执行的任务在下一次 report() 时抛出 Cancelled 提前结束；
+- SaveCoalescer 把短时间内的多次保存合并成一次写入，同一时刻最多一个写入。
+"""
+import queue
+import threading
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+POLL_MS = 30  # 主线程轮询结果队列的间隔
+
+
+class Cancelled(Exception):
+    """任务已被取消（由 Task.report 在工作线程里抛出）"""
+
+
+class Task:
+    def __init__(self, runner, on_done, on_error, on_progress):
+        self.runner = runner
+        self.on_done = on_done
+        self.on_error = on_error
+        self.on_progress = on_progress
+        self.future = None
+        self._cancel = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def cancel(self):
+        """主线程调用；之后不会再调用这个任务的任何回调"""
+        self._cancel.set()
+        if self.future is not None:
+            self.future.cancel()
+
+    def report(self, done, total=None):
+        """工作线程里调用：汇报进度，同时是取消检查点"""
+        if self._cancel.is_set():
+            raise Cancelled()
+        if self.on_progress is not None:
+            self.runner._queue.put((self.on_progress, (done, total), self))
+
+
+class TaskRunner:
+    def __init__(self, widget, io_workers=4, cpu_workers=None):
+        self.widget = widget  # 用来 after() 的任意 Tk 控件
+        self.io = ThreadPoolExecutor(io_workers, thread_name_prefix="io")
+        self._cpu = None  # 进程池第一次用到时才创建（启动子进程较慢）
+        self._cpu_workers = cpu_workers
+        self._queue = queue.SimpleQueue()
+        self._active = 0  # 尚未回调的任务数，为 0 时停止轮询
+        self._polling = False
+
+    def submit(self, fn, *args, on_done=None, on_error=None, on_progress=None, cpu=False):
+        """
+        在后台执行 fn(*args)，返回 Task。
+        on_done(result) / on_error(exc) / on_progress(done, total) 都在主线程调用；
+        传了 on_progress 时 fn 会多收到一个关键字参数 report=task.report。
+        """
+        task = Task(self, on_done, on_error, on_progress)
+        if cpu:
+            if on_progress is not None:
+                raise ValueError("进程池任务不支持进度汇报")
+            if self._cpu is None:
+                self._cpu = ProcessPoolExecutor(self._cpu_workers)
+            task.future = self._cpu.submit(fn, *args)
+        elif on_progress is not None:
+            task.future = self.io.submit(fn, *args, report=task.report)
+        else:
+            task.future = self.io.submit(fn, *args)
+        self._active += 1
+        task.future.add_done_callback(lambda f: self._queue.put((None, f, task)))
+        self._schedule()
+        return task
+
+    def _schedule(self):
+        if not self._polling:
+            self._polling = True
+            self.widget.after(POLL_MS, self._pump)
+
+    def _pump(self):
+        self._polling = False
+        while True:
+            try:
+                callback, arg, task = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if callback is not None:  # 进度
+                if not task.cancelled:
+                    callback(*arg)
+                continue
+            self._active -= 1
+            self._finish(task, arg)
+        if self._active:
+            self._schedule()
+
+    def _finish(self, task, future):
+        if task.cancelled or future.cancelled(): return
+        exc = future.exception()
+        if isinstance(exc, Cancelled): return
+        if exc is None:
+            if task.on_done is not None:
+                task.on_done(future.result())
+        elif task.on_error is not None:
+            task.on_error(exc)
+        else:
+            traceback.print_exception(type(exc), exc, exc.__traceback__)
+
+    def shutdown(self, wait=True):
+        """退出前调用：丢弃尚未开始的任务，wait=True 时等正在执行的任务结束"""
+        self.io.shutdown(wait=wait, cancel_futures=True)
+        if self._cpu is not None:
+            self._cpu.shutdown(wait=wait, cancel_futures=True)
+
+
+class SaveCoalescer:
+    """
+    合并保存。request() 只记下"需要保存"，delay 毫秒内的多次请求合并成一次写入；
+    写入期间来的请求等这次写完再合并写一次。
+    prepare(compact) 在主线程调用，从账本取出要写的内容（要快）；write(payload) 在 I/O 线程执行。
+    对应存储层的 prepare / write（见 storage.JournalStore）。
+    """
+
+    def __init__(self, runner, prepare, write, delay=300, on_error=None):
+        self.runner = runner
+        self.prepare = prepare
+        self.write = write
+        self.delay = delay
+        self.on_error = on_error
+        self._dirty = False
+        self._compact = False
+        self._timer = None
+        self._task = None  # 正在写入的任务
+
+    def request(self, compact=False):
+        self._dirty = True
+        self._compact = self._compact or compact
+        if self._timer is None and self._task is None:
+            self._timer = self.runner.widget.after(self.delay, self._fire)
+
+    def _take(self):
+        payload = self.prepare(self._compact)
+        self._dirty = self._compact = False
+        return payload
+
+    def _fire(self):
+        self._timer = None
+        if not self._dirty: return
+        self._task = task = self.runner.submit(self.write, self._take())
+        task.on_done = lambda _: self._written(task)
+        task.on_error = lambda exc: self._failed(task, exc)
+
+    def _written(self, task):
+        if task is not self._task: return  # flush() 已经等过这次写入
+        self._task = None
+        if self._dirty and self._timer is None:
+            self._timer = self.runner.widget.after(self.delay, self._fire)
+
+    def _failed(self, task, exc):
+        self._written(task)
+        if self.on_error is not None:
+            self.on_error(exc)
+
+    def flush(self):
+        """同步写完所有待保存的内容（退出、整体替换数据前调用），写入失败时抛出异常"""
+        if self._timer is not None:
+            self.runner.widget.after_cancel(self._timer)
+            self._timer = None
+        if self._task is not None:
+            future, self._task = self._task.future, None
+            try:
+                future.result()  # 等正在进行的写入完成；失败照常由 on_error 提示
+            except Exception:
+                pass
+        if self._dirty:
+            self.write(self._take())
@@ -0,0 +1,84 @@
+from datetime import date, timedelta
+
+import pytest
+
+import analytics
+from flow_cache import make_flows
+from ledger import Ledger, solve_xirr
+
+D0 = date(2023, 1, 1)
+
+
+def flows_at(*pairs):
+    """(距 D0 的天数, 金额(分)) -> Flows"""
+    return make_flows([D0.toordinal() + d for d, _ in pairs], [c for _, c in pairs])
+
+
+def day(n):
+    return D0 + timedelta(days=n)
+
+
+def make_ledger():
+    ledger = Ledger()
+    ledger.lock_initial(date(2023, 1, 1), 10_000_000)
+    ledger.add_record(date(2023, 3, 1), -2_000_000, "买入")
+    ledger.add_record(date(2023, 9, 1), 5_000_000, "卖出")  # 结束日期之后
+    ledger.add_record(date(2024, 1, 1), -1_000_000, "买入")
+    return ledger
+
+
+@pytest.mark.parametrize("end", [date(2023, 6, 30), date(2024, 6, 30)])
+def test_xirr_entry_points_agree(end):
+    ledger = make_ledger()
+    end_value = 12_500_000
+    rate, profit = ledger.xirr(end, end_value)
+    assert solve_xirr(*ledger.cash_flow_arrays(), end, end_value) == pytest.approx((rate, profit))
+    m = analytics.analyze(make_flows(*ledger.cash_flow_arrays()), end, end_value)
+    assert (m.xirr, m.profit) == pytest.approx((rate, profit))
+    assert ledger.metrics(end, end_value).profit == profit
+
+
+def test_flows_after_end_date_ignored():
+    ledger = make_ledger()
+    rate, profit = ledger.xirr(date(2023, 6, 30), 12_500_000)
+    assert profit == 12_500_000 - 10_000_000 - 2_000_000
+    assert rate > 0
+    with pytest.raises(ValueError):
+        ledger.xirr(date(2022, 12, 31), 12_500_000)
+
+
+def test_modified_dietz():
+    # 盈亏 20000；权重 1 与 0.5 -> 分母 100000 + 50000
+    m = analytics.analyze(flows_at((0, -100000), (50, -100000)), day(100), 220000)
+    assert m.profit == 20000
+    assert m.dietz == pytest.approx(20000 / 150000)
+    assert m.twr is None
+
+
+def test_twr_chains_subperiods():
+    # 0→50 天 +20%，50→100 天 -25%
+    m = analytics.analyze(flows_at((0, -100000)), day(100), 90000, ([day(50)], [120000]))
+    assert m.twr == pytest.approx(1.2 * 0.75 - 1)
+
+
+def test_twr_flow_on_valuation_date():
+    # 第 50 天的投入算在前一段末尾（权重 0），当天市值已含这笔投入：两段各 +10%
+    m = analytics.analyze(flows_at((0, -100000), (50, -100000)), day(100), 231000, ([day(50)], [210000]))
+    assert m.twr == pytest.approx(1.1 * 1.1 - 1)
+
+
+def test_invested_curves_and_drawdown():
+    m = analytics.analyze(flows_at((0, -100000), (30, 50000), (60, -80000)), day(90), 150000)
+    assert m.curve.invested.tolist() == [100000, 100000, 180000]
+    assert m.curve.cash.tolist() == [-100000, -50000, -130000]
+    assert m.curve.drawdown.tolist() == [0, 0, 80000]
+    assert (m.invested, m.net_invested) == (180000, 130000)
+    assert (m.max_drawdown, m.drawdown_start, m.drawdown_end) == (80000, day(30), day(60))
+
+
+def test_drawdown_without_decline():
+    # 只有取出：净现金曲线一路上升，没有回撤
+    m = analytics.analyze(flows_at((0, -100000), (30, 20000), (60, 30000)), day(90), 60000)
+    assert m.curve.drawdown.tolist() == [0, 0, 0]
+    assert (m.max_drawdown, m.drawdown_start, m.drawdown_end) == (0, None, None)
+    assert (m.invested, m.net_invested) == (100000, 50000)
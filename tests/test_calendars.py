@@ -0,0 +1,25 @@
+from datetime import date
+
+import numpy as np
+
+import calendars
+
+
+def test_stale_cache_used_when_refetch_fails(tmp_path, monkeypatch):
+    monkeypatch.setattr(calendars, "CACHE_DIR", str(tmp_path))
+    days = np.arange(date(2024, 1, 1).toordinal(), date(2024, 3, 1).toordinal(), 2, dtype=np.int32)
+    calendars._write_cache("CN", days, days[0], days[-1], "old")
+
+    monkeypatch.setattr(calendars, "HAS_MCAL", True)
+    monkeypatch.setattr(calendars, "mcal_version", lambda: "new")
+    monkeypatch.setattr(calendars, "_fetch", lambda market, start, end: None)  # 离线
+    got = calendars.trading_day_ordinals("CN", date(2024, 1, 10), date(2024, 2, 10))
+    expected = days[(days >= date(2024, 1, 10).toordinal()) & (days <= date(2024, 2, 10).toordinal())]
+    assert got.tolist() == expected.tolist()
+    assert calendars._read_cache("CN")[0]["mcal_version"] == "old"  # 旧缓存留着，联网后再刷新
+
+    fresh = np.array([date(2024, 1, 15).toordinal()], dtype=np.int32)
+    monkeypatch.setattr(calendars, "_fetch", lambda market, start, end: fresh)
+    got = calendars.trading_day_ordinals("CN", date(2024, 1, 10), date(2024, 2, 10))
+    assert got.tolist() == fresh.tolist()
+    assert calendars._read_cache("CN")[0]["mcal_version"] == "new"
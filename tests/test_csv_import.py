@@ -0,0 +1,20 @@
+from datetime import date
+
+import csv_import
+from ledger import Ledger
+
+
+def test_import_csv_dedupes_and_dry_run(tmp_path):
+    path = tmp_path / "statement.csv"
+    path.write_text("成交日期,发生金额,证券名称\n2024-01-05,1000,招商\n2024-01-06,-500,招商\n2024-01-07,,招商\n",
+                    encoding="utf-8")
+    ledger = Ledger()
+    ledger.lock_initial(date(2024, 1, 1), 1_000_000)
+    ledger.add_record(date(2024, 1, 5), -100000, "招商")
+
+    seq = ledger.seq
+    assert csv_import.import_csv(ledger, str(path), sign="invest", dry_run=True) == (1, 1, 1)
+    assert ledger.seq == seq and len(ledger.records) == 1
+    assert csv_import.import_csv(ledger, str(path), sign="invest") == (1, 1, 1)
+    assert sorted((d, a) for d, a, *_ in ledger.records) == [(date(2024, 1, 5), -100000), (date(2024, 1, 6), 50000)]
+    assert csv_import.import_csv(ledger, str(path), sign="invest") == (0, 2, 1)
@@ -0,0 +1,220 @@
+import random
+import threading
+from datetime import date, timedelta
+
+import numpy as np
+
+from columns import KIND_DRIP, Columns
+from ledger import Ledger
+
+TODAY = date(2024, 6, 28)
+
+
+def weekdays(market, start_date, end_date):
+    """不联网的交易日历：周一到周五，US 另外去掉 7 月 4 日"""
+    days = np.arange(start_date.toordinal(), end_date.toordinal() + 1, dtype=np.int64)
+    keep = (days - 1) % 7 < 5
+    if market == "US":
+        keep &= ~np.isin(days, [date(y, 7, 4).toordinal() for y in range(start_date.year, end_date.year + 1)])
+    return days[keep].astype(np.int32)
+
+
+def make_pair(start):
+    ledgers = []
+    for _ in range(2):
+        lg = Ledger()
+        lg.lock_initial(start, 10_000_000)
+        lg.add_plan("A", "CN", "daily", 100.0, start)
+        lg.add_plan("B", "US", "weekly", 200.0, start + timedelta(days=3))
+        lg.add_plan("C", "CN", "monthly", 500.0, start + timedelta(days=30))
+        lg.add_plan("A", "US", "weekly", 100.0, start + timedelta(days=10))  # 与 A 同名同额，互相去重
+        ledgers.append(lg)
+    for a, b in zip(*(lg.drip_plans for lg in ledgers)):
+        b['id'] = a['id']
+    return ledgers
+
+
+def drip_rows(ledger):
+    return sorted((d[0], d[1], d[2], d[4]) for d in ledger.drip_records)
+
+
+def mutate(step, ledgers, rng):
+    """对两个账本做同样的修改（删除、暂停/恢复、改金额/频率/起点/名称）"""
+    j = rng.randrange(len(ledgers[0].drip_plans))
+    kind = step % 6
+    if kind == 0 and ledgers[0].drip_records:
+        target = rng.choice(ledgers[0].drip_records)[:3]
+        ignore = rng.random() < 0.5
+        for lg in ledgers:
+            lg.delete_records([next(d[3] for d in lg.drip_records if d[:3] == target)], ignore_date=ignore)
+        return
+    for lg in ledgers:
+        plan = lg.drip_plans[j]
+        if kind == 1:
+            lg.set_plan_active(plan, not plan.get('active', True))
+        elif kind == 2:
+            lg.update_plan(plan, amount=plan['amount'] + 10)
+        elif kind == 3:
+            lg.update_plan(plan, frequency=("daily", "weekly", "monthly")[step % 3])
+        elif kind == 4:
+            lg.update_plan(plan, start_date=(plan['start_date_obj'] - timedelta(days=7)).strftime("%Y-%m-%d"))
+        else:
+            lg.update_plan(plan, name=plan['name'] + "'")
+
+
+def test_watermark_matches_full_rebuild():
+    first_day = TODAY - timedelta(days=40)
+    incremental, full = make_pair(first_day - timedelta(days=365 * 2))
+    incremental.generate_drip_records(first_day, weekdays)
+    full.generate_drip_records(first_day, weekdays, full=True)
+    assert drip_rows(incremental) == drip_rows(full)
+
+    rng = random.Random(0)
+    for step in range(1, 41):
+        mutate(step, (incremental, full), rng)
+        day = first_day + timedelta(days=step)
+        incremental.generate_drip_records(day, weekdays)
+        full.generate_drip_records(day, weekdays, full=True)
+        assert drip_rows(incremental) == drip_rows(full), f"第 {step} 天结果不一致"
+        # 从头重算也不应再有新增
+        op = incremental.plan_drip(day, weekdays, full=True)
+        assert op is None or not op["rows"]
+
+
+def test_replayed_log_matches():
+    start = TODAY - timedelta(days=400)
+    ledger, _ = make_pair(start)
+    ledger.generate_drip_records(TODAY - timedelta(days=30), weekdays)
+    rng = random.Random(1)
+    for step in range(1, 31):
+        mutate(step, (ledger,), rng)
+        ledger.generate_drip_records(TODAY - timedelta(days=30 - step), weekdays)
+
+    replayed = Ledger()
+    for op in ledger.take_pending_ops():
+        replayed.replay(op)
+    assert drip_rows(replayed) == drip_rows(ledger)
+    assert [(p['generated_through'], p['generated_sig']) for p in replayed.drip_plans] == \
+        [(p['generated_through'], p['generated_sig']) for p in ledger.drip_plans]
+    assert replayed.plan_drip(TODAY, weekdays) == ledger.plan_drip(TODAY, weekdays)
+
+
+def test_drip_days_index():
+    cols = Columns(capacity=4)
+    rng = random.Random(2)
+    code = cols.remark_code("计划:A")
+    rid = 0
+    for batch in range(30):
+        if batch == 10:
+            cols.drip_days(code, -100, 0)  # 建立索引，之后增量维护
+        k = rng.randrange(1, 5)
+        days = sorted(rng.randrange(700_000, 700_400) for _ in range(k))
+        remarks = [rng.choice(("计划:A", "计划:B")) for _ in range(k)]
+        amounts = [rng.choice((-100, -200)) for _ in range(k)]
+        cols.extend(days, amounts, KIND_DRIP, remarks, list(range(rid, rid + k)), [None] * k)
+        rid += k
+        cols.delete(rng.randrange(rid))
+        if batch == 20:
+            cols.compact()
+        v = cols.view(KIND_DRIP)
+        for since in (700_000, 700_200):
+            expected = v.day[(v.remark == code) & (v.amount == -100) & (v.day >= since)]
+            assert sorted(cols.drip_days(code, -100, since).tolist()) == sorted(expected.tolist())
+
+
+def test_watermark_stops_at_calendar_coverage():
+    # 离线且本地日历缓存只到 covered：之后的名义日期留到拿到日历后再补
+    covered = TODAY - timedelta(days=10)
+
+    def cached(market, start_date, end_date):
+        return weekdays(market, start_date, min(end_date, covered))
+
+    start = TODAY - timedelta(days=200)
+    offline, online = make_pair(start)
+    offline.generate_drip_records(TODAY - timedelta(days=20), weekdays)
+    online.generate_drip_records(TODAY - timedelta(days=20), weekdays)
+    offline.generate_drip_records(TODAY, cached)
+    assert max(d[0] for d in offline.drip_records) <= covered
+    assert all(p['generated_through'] <= covered.strftime("%Y-%m-%d") for p in offline.drip_plans)
+    offline.generate_drip_records(TODAY, cached)  # 续算起点已在缓存之外，仍然不能越过
+    assert max(d[0] for d in offline.drip_records) <= covered
+
+    offline.generate_drip_records(TODAY, weekdays)
+    online.generate_drip_records(TODAY, weekdays)
+    assert drip_rows(offline) == drip_rows(online)
+
+
+def check_index(cols):
+    """增量维护的去重索引与逐行筛选结果一致"""
+    v = cols.view(KIND_DRIP)
+    for code in set(v.remark.tolist()):
+        for amount in set(v.amount.tolist()):
+            expected = v.day[(v.remark == code) & (v.amount == amount)]
+            assert sorted(cols.drip_days(code, amount, 0).tolist()) == sorted(expected.tolist())
+
+
+def test_plan_drip_with_interleaved_extend():
+    # 后台 plan_drip 读快照期间主线程追加定投行：结果与没有追加时相同，索引也不丢行
+    start = TODAY - timedelta(days=300)
+    ledger, twin = make_pair(start)
+    for lg in (ledger, twin):
+        lg.generate_drip_records(TODAY - timedelta(days=60), weekdays)
+    expected = twin.plan_drip(TODAY, weekdays)
+
+    snapshot = ledger.cols.drip_snapshot()
+    rid = [10 ** 6]
+
+    def interleaved(market, start_date, end_date):
+        k = 3
+        ledger.cols.extend([TODAY.toordinal() + 100 + i for i in range(k)], [-10000] * k, KIND_DRIP,
+                           ["计划:A"] * k, list(range(rid[0], rid[0] + k)), [None] * k)
+        rid[0] += k
+        return weekdays(market, start_date, end_date)
+
+    assert ledger.plan_drip(TODAY, interleaved, drip_index=snapshot) == expected
+    check_index(ledger.cols)
+
+
+def test_plan_drip_on_thread_while_extending():
+    start = TODAY - timedelta(days=300)
+    ledger, _ = make_pair(start)
+    ledger.generate_drip_records(TODAY - timedelta(days=60), weekdays)
+    snapshot = ledger.cols.drip_snapshot()
+    results = []
+
+    def worker():
+        for _ in range(20):
+            results.append(ledger.plan_drip(TODAY, weekdays, drip_index=snapshot))
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    rid = 10 ** 6
+    while thread.is_alive() or rid == 10 ** 6:
+        ledger.cols.extend([TODAY.toordinal() + 100 + rid % 50], [-10000], KIND_DRIP, ["计划:A"], [rid], [None])
+        ledger.cols.append(TODAY.toordinal() + 100, -20000, KIND_DRIP, "计划:B", rid + 1)
+        rid += 2
+    thread.join()
+    assert all(r == results[0] for r in results)
+    check_index(ledger.cols)
+
+
+def test_watermark_waits_for_calendar_head():
+    # 本地缓存从 covered 才开始：之前的名义日期不能都顺延到 covered，水位线也不能越过它们
+    covered = TODAY - timedelta(days=60)
+
+    def cached(market, start_date, end_date):
+        return weekdays(market, max(start_date, covered), end_date)
+
+    start = TODAY - timedelta(days=200)
+    offline, online = make_pair(start)
+    offline.generate_drip_records(TODAY, cached)
+    assert min(d[0] for d in offline.drip_records) >= covered
+    assert all(p.get('generated_through') is None for p in offline.drip_plans)
+    offline.generate_drip_records(TODAY, cached)  # 重复运行不产生重复记录
+    days = [(d[0], d[2], d[4]) for d in offline.drip_records]
+    assert len(days) == len(set(days))
+
+    offline.generate_drip_records(TODAY, weekdays)
+    online.generate_drip_records(TODAY, weekdays)
+    assert drip_rows(offline) == drip_rows(online)
+    assert [p['generated_through'] for p in offline.drip_plans] == [p['generated_through'] for p in online.drip_plans]
@@ -0,0 +1,103 @@
+from datetime import date
+
+import numpy as np
+import pytest
+
+import flow_cache
+from flow_cache import group_by_day, make_flows
+from ledger import Ledger, solve_flows
+
+
+def reference(days, cents):
+    out = {}
+    for d, c in zip(days.tolist(), cents.tolist()):
+        out[d] = out.get(d, 0) + c
+    keys = sorted(out)
+    return keys, [out[k] for k in keys]
+
+
+def test_group_by_day_dense_and_sparse():
+    rng = np.random.default_rng(0)
+    dense = rng.integers(738_000, 738_400, 5000)
+    sparse = np.concatenate((dense[:10], [1, 3_000_000]))  # 跨度太大，走排序
+    for days in (dense, sparse):
+        cents = rng.integers(-10 ** 9, 10 ** 9, len(days))
+        got_days, got_cents = group_by_day(days, cents)
+        assert (got_days.tolist(), got_cents.tolist()) == reference(days, cents)
+        assert got_cents.dtype == np.int64
+
+
+def test_group_by_day_exact_for_large_amounts():
+    days = np.array([738_001, 738_000, 738_001])
+    cents = np.array([2 ** 52 + 1, 5, 2 ** 52 + 1])  # 合计超过 2^53，不能用浮点累加
+    got_days, got_cents = group_by_day(days, cents)
+    assert (got_days.tolist(), got_cents.tolist()) == reference(days, cents)
+
+
+def test_make_flows_totals():
+    flows = make_flows([738_010, 738_000, 738_010], [-100, -200, 50])
+    assert flows.days.tolist() == [738_000, 738_010] and flows.cents.tolist() == [-200, -50]
+    assert flows.total == -250 and flows.t.tolist() == [0.0, 10 / 365]
+
+
+def make_ledger():
+    ledger = Ledger()
+    ledger.lock_initial(date(2023, 1, 1), 10_000_000)
+    for i in range(1, 6):
+        ledger.add_record(date(2023, i, 10), -100_000 * i, "买入")
+    return ledger
+
+
+def cold(ledger):
+    flows = make_flows(*ledger.cash_flow_arrays())
+    return flows.days.tolist(), flows.t.tolist(), flows.cents.tolist(), flows.total
+
+
+def test_appended_rows_merged_incrementally(monkeypatch):
+    ledger = make_ledger()
+    ledger.prepared_flows()
+    rebuilds = []
+    monkeypatch.setattr(flow_cache, "make_flows", lambda *a, **k: rebuilds.append(1) or make_flows(*a, **k))
+
+    ledger.add_record(date(2023, 3, 10), 50_000, "卖出")  # 已有的日期
+    ledger.add_record(date(2022, 12, 1), -70_000, "买入")  # 比第一天还早，年化时间整体重算
+    ledger.add_record(date(2023, 8, 1), -30_000, "买入")
+    flows = ledger.prepared_flows()
+    assert not rebuilds
+    assert (flows.days.tolist(), flows.t.tolist(), flows.cents.tolist(), flows.total) == cold(ledger)
+
+    ledger.delete_records([ledger.records[0][3]])  # 删除：不能只合并新增行
+    flows = ledger.prepared_flows()
+    assert rebuilds == [1]
+    assert (flows.days.tolist(), flows.t.tolist(), flows.cents.tolist(), flows.total) == cold(ledger)
+
+    ledger.load_rows([(r[0], r[1], r[2], r[3], r[4]) for r in ledger.records], [], ledger.next_id)  # 换了列对象
+    ledger.add_record(date(2023, 9, 1), -10_000, "买入")
+    flows = ledger.prepared_flows()
+    assert rebuilds == [1, 1]
+    assert (flows.days.tolist(), flows.t.tolist(), flows.cents.tolist(), flows.total) == cold(ledger)
+
+
+def test_warm_start_when_only_end_value_changes():
+    ledger = make_ledger()
+    end = date(2024, 1, 1)
+    rate, _ = ledger.xirr(end, 13_000_000)
+    flows = ledger.prepared_flows()
+    assert ledger.flow_cache.guess(flows, end, 13_500_000) == rate
+    assert ledger.xirr(end, 13_500_000) == pytest.approx(solve_flows(flows, end, 13_500_000))
+
+
+def test_no_warm_start_with_multiple_roots():
+    # -100、+230、-132（各隔一年）：NPV 有 10% 与 20% 两个根，结果不能取决于之前算过什么
+    ledger = Ledger()
+    ledger.lock_initial(date(2021, 1, 1), 10_000)
+    ledger.add_record(date(2022, 1, 1), 23_000, "卖出")
+    end = date(2023, 1, 1)
+    expected = Ledger()
+    expected.lock_initial(date(2021, 1, 1), 10_000)
+    expected.add_record(date(2022, 1, 1), 23_000, "卖出")
+    expected = expected.xirr(end, -13_200)
+
+    assert ledger.xirr(end, 0)[0] > 1  # 先算一个别的期末市值，从这里出发会落到 20% 那个根
+    assert ledger.flow_cache.guess(ledger.prepared_flows(), end, -13_200) == 0.1
+    assert ledger.xirr(end, -13_200) == expected
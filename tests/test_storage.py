@@ -0,0 +1,54 @@
+from datetime import date, timedelta
+
+import pytest
+
+import cli
+from money import fmt
+from storage import open_store
+from test_drip import TODAY, make_pair, weekdays
+
+
+def ledger_state(ledger):
+    return (sorted(ledger.records), sorted(ledger.drip_records), ledger.next_id, ledger.totals.to_json(),
+            [(p['id'], p['generated_through'], p['ignored_dates']) for p in ledger.drip_plans])
+
+
+@pytest.mark.parametrize("name", ["ledger.json", "ledger.db"])
+def test_compact_then_commit_roundtrip(tmp_path, name):
+    ledger, _ = make_pair(TODAY - timedelta(days=300))
+    ledger.generate_drip_records(TODAY - timedelta(days=30), weekdays)
+    ledger.add_record(date(2024, 3, 1), -12345, "买入")
+    store = open_store(str(tmp_path / name))
+    store.compact(ledger)
+
+    ledger.delete_records([ledger.drip_records[0][3]], ignore_date=True)
+    ledger.add_record(date(2024, 4, 1), 5000, "卖出")
+    ledger.generate_drip_records(TODAY, weekdays)
+    store.commit(ledger)
+    store.close()
+
+    store = open_store(str(tmp_path / name))
+    assert ledger_state(store.load()) == ledger_state(ledger)
+    days, cents = store.cash_flow_arrays()
+    assert sorted(zip(days.tolist(), cents.tolist())) == \
+        sorted(zip(*(a.tolist() for a in ledger.cash_flow_arrays())))
+    months = ledger.totals.months
+    assert store.monthly_net_flow() == [(f"{y:04d}-{m:02d}", *months[(y, m)][:3]) for y, m in sorted(months)]
+    assert store.totals() == ledger.summary()
+    store.close()
+
+
+@pytest.mark.parametrize("name", ["ledger.json", "ledger.db"])
+def test_cli_monthly_totals(tmp_path, name, capsys):
+    ledger, _ = make_pair(TODAY - timedelta(days=100))
+    ledger.generate_drip_records(TODAY, weekdays)
+    ledger.add_record(date(2024, 5, 1), 5000, "卖出")
+    path = str(tmp_path / name)
+    store = open_store(path)
+    store.compact(ledger)
+    store.close()
+
+    assert cli.main(["--file", path, "monthly"]) == 0
+    invested, cash = ledger.summary()
+    assert capsys.readouterr().out.splitlines()[-1] == \
+        f"累计投入: {fmt(invested, grouping=True)} | 剩余现金: {fmt(cash, grouping=True)}"
@@ -0,0 +1,34 @@
+from datetime import date
+
+import pytest
+
+from ledger import solve_xirr
+from storage import open_store
+from workspace import Workspace
+
+
+def test_shared_pool_reused_and_closed(tmp_path):
+    ws = Workspace(str(tmp_path), max_workers=2)
+    for name, sqlite in (("甲", False), ("乙", True)):
+        ws.create(name, sqlite)
+        store, ledger = ws.open(name)
+        ledger.lock_initial(date(2023, 1, 1), 10_000_000)
+        ledger.add_record(date(2023, 6, 1), -2_000_000, "买入")
+        store.commit(ledger)
+    end = date(2024, 1, 1)
+    end_values = {"甲": 13_000_000, "乙": 12_500_000}
+
+    first = ws.xirr_all(end_values, end)
+    pool = ws.pool()
+    assert ws.drip_all(end) == {"甲": 0, "乙": 0}
+    assert ws.xirr_all(end_values, end) == first
+    assert ws.pool() is pool  # 各次调用共用一个进程池
+
+    ledger = open_store(ws.path("甲")).load()
+    assert first.rates["甲"] == pytest.approx(solve_xirr(*ledger.cash_flow_arrays(), end, 13_000_000))
+
+    ws.close()
+    with pytest.raises(RuntimeError):
+        pool.submit(int)
+    assert ws.pool() is not pool  # 关闭后再用时重新创建
+    ws.close()
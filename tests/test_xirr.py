@@ -0,0 +1,31 @@
+from datetime import date
+
+import numpy as np
+import pytest
+
+import xirr
+
+
+def test_simple_rate():
+    assert xirr.xirr([0, 365], [-100, 110]) == pytest.approx(0.10)
+
+
+def test_unbracketed_root_not_reported_as_converged():
+    # 真实收益率远超 RATE_UPPER，曾经一路逼近 -1 后按步长“收敛”，返回 -99.99...%
+    with pytest.raises(xirr.XirrConvergenceError):
+        xirr.xirr([date(2024, 1, 1), date(2024, 3, 1)], [-10000, 50000])
+    rates = xirr.xirr_curve([date(2024, 1, 1)], [-10000], [date(2024, 3, 1)], [50000])
+    assert np.isnan(rates[0])
+
+
+def test_unbracketed_two_roots_still_solved():
+    # -100, +230, -132：10% 与 20% 两个根，两端点同号（无括号）
+    days, amounts = [0, 365, 730], [-100, 230, -132]
+    assert xirr.xirr(days, amounts) == pytest.approx(0.10)
+    assert xirr.xirr(days, amounts, guess=0.25) == pytest.approx(0.20)
+
+
+def test_batch_marks_failures_nan():
+    rates = xirr.xirr_batch([([0, 365], [-100, 110]), ([0, 60], [-10000, 50000]), ([0, 365], [100, 10])])
+    assert rates[0] == pytest.approx(0.10)
+    assert np.isnan(rates[1]) and np.isnan(rates[2])
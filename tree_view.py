@@ -0,0 +1,172 @@
+"""
+交易明细树（按月分组，懒加载）
+
+只预先插入月份分组节点，每个分组下放一个占位子节点让它显示展开箭头；
+用户展开某个月时才插入该月的明细行。单条增删只改动对应分组，
+不再整棵树删光重建。分组节点的 iid 固定为 "mYYYYMM"，明细行为 "r<记录 id>"。
+整体渲染直接读账本的列数据（日序号、记录 id 数组）按月切分，每个月只缓存
+(日序号, 记录 id) 两个列表，明细行的文字在展开时才生成。
+月份标题里的净流取自账本的 totals（aggregates.Aggregates），add_record / remove_records
+要在账本修改之后调用。
+"""
+import bisect
+
+import numpy as np
+
+import profiling
+from columns import to_datetime64
+from money import fmt
+
+_PLACEHOLDER = "…"
+
+INIT_ID = 0  # 初始本金一行（记录 id 从 1 开始）
+
+TYPE_INIT = "【初始本金】"
+TYPE_DRIP = "【定投】"
+
+
+def record_type(amount):
+    return "买入/追加" if amount < 0 else "卖出/取现"
+
+
+def display_row(rec, drip):
+    """账本记录 -> 显示行 (date, 类型, 金额(分), 备注, 记录 id)"""
+    return rec[0], TYPE_DRIP if drip else record_type(rec[1]), rec[1], rec[2], rec[3]
+
+
+def _month_of(d):
+    return d.year, d.month
+
+
+def _group_iid(key):
+    return f"m{key[0]:04d}{key[1]:02d}"
+
+
+def record_id(iid):
+    """明细行 iid -> 记录 id；分组、占位、初始本金行返回 None"""
+    return int(iid[1:]) if iid.startswith("r") else None
+
+
+class LedgerTree:
+    def __init__(self, tree):
+        self.tree = tree
+        self.ledger = None
+        self.months = {}  # (年, 月) -> ([日序号], [记录 id])，按日期升序
+        self.keys = []  # 已有月份，升序
+        self.loaded = set()  # 已插入明细行的月份
+        tree.bind("<<TreeviewOpen>>", self._on_open, add="+")
+
+    # ================= 整体渲染 =================
+
+    @profiling.traced("tree.render")
+    def render(self, ledger):
+        """整体重建（加载、导入、批量补录后使用），保持之前展开的月份"""
+        opened = [k for k in self.loaded if self.tree.item(_group_iid(k), "open")]
+        self.tree.delete(*self.tree.get_children())
+        self.months, self.loaded = {}, set()
+        self.ledger = ledger
+
+        v = ledger.cols.view()
+        days, rids = v.day, v.rid
+        if ledger.is_initialized:
+            days = np.concatenate(([ledger.start_date_obj.toordinal()], days))
+            rids = np.concatenate(([INIT_ID], rids))
+        order = np.argsort(days, kind="stable")  # 同一天保持初始本金在前、其余按添加顺序
+        days, rids = days[order], rids[order]
+        month = to_datetime64(days).astype("datetime64[M]")
+        month = month.astype(np.int64)
+        bounds = np.concatenate(([0], np.flatnonzero(month[1:] != month[:-1]) + 1, [len(days)])).tolist()
+        days, rids, month = days.tolist(), rids.tolist(), month.tolist()
+        for a, b in zip(bounds[:-1], bounds[1:]):
+            m = month[a]
+            self.months[(1970 + m // 12, m % 12 + 1)] = (days[a:b], rids[a:b])
+        self.keys = list(self.months)
+        for key in self.keys:
+            self._insert_group(key, "end")
+
+        # 默认展开最近一个月
+        for key in opened or self.keys[-1:]:
+            if key in self.months:
+                self.expand(key)
+
+    def _insert_group(self, key, index):
+        iid = self.tree.insert("", index, iid=_group_iid(key), text=self._group_text(key), open=False,
+                               tags=('group',))
+        self.tree.insert(iid, "end", text=_PLACEHOLDER)
+        return iid
+
+    def _group_text(self, key):
+        month_sum = self.ledger.totals.month_net(*key)  # 账本增量维护的月度汇总
+        return f"📅 {key[0]}年{key[1]:02d}月 (月度净流: {fmt(month_sum, sign=True)})"
+
+    # ================= 懒加载 =================
+
+    def _on_open(self, event=None):
+        iid = self.tree.focus()
+        if iid.startswith("m") and self.tree.parent(iid) == "":
+            self._populate((int(iid[1:5]), int(iid[5:7])))
+
+    def _populate(self, key):
+        if key in self.loaded: return
+        group = _group_iid(key)
+        rids = self.months[key][1]
+        with profiling.span("tree.populate", month=f"{key[0]}-{key[1]:02d}", rows=len(rids)):
+            self.tree.delete(*self.tree.get_children(group))
+            for rid in rids:
+                self._insert_row(group, "end", self._display(rid))
+        profiling.count("tree.rows_inserted", len(rids))
+        self.loaded.add(key)
+
+    def expand(self, key):
+        """代码里展开分组不会触发 <<TreeviewOpen>>，需要先手动填充"""
+        self._populate(key)
+        self.tree.item(_group_iid(key), open=True)
+
+    def _display(self, rid):
+        ledger = self.ledger
+        if rid == INIT_ID:
+            return ledger.start_date_obj, TYPE_INIT, -ledger.initial_capital, "---", INIT_ID
+        return display_row(*ledger.get_record(rid))
+
+    def _insert_row(self, group, index, row):
+        iid = "init" if row[4] == INIT_ID else f"r{row[4]}"
+        return self.tree.insert(group, index, iid=iid, text=row[0].strftime("%Y-%m-%d"),
+                                values=(row[1], fmt(row[2]), row[3]))
+
+    # ================= 单条增删 =================
+
+    def add_record(self, rec, drip=False):
+        """账本新增一条记录后插入对应的行，只改动所在月份"""
+        key = _month_of(rec[0])
+        items = self.months.get(key)
+        if items is None:
+            items = self.months[key] = ([], [])
+            pos = bisect.bisect(self.keys, key)
+            self.keys.insert(pos, key)
+            self._insert_group(key, pos)
+        pos = bisect.bisect_right(items[0], rec[0].toordinal())
+        items[0].insert(pos, rec[0].toordinal())
+        items[1].insert(pos, rec[3])
+        group = _group_iid(key)
+        if key in self.loaded:
+            self.tree.see(self._insert_row(group, pos, display_row(rec, drip)))
+        self.tree.item(group, text=self._group_text(key))
+
+    def remove_records(self, recs):
+        """账本删除记录后，删掉对应的行（所在月份未展开时只改缓存）；月份空了就连分组一起删掉"""
+        for rec in recs:
+            key = _month_of(rec[0])
+            days, rids = self.months[key]
+            i = bisect.bisect_left(days, rec[0].toordinal())
+            while rids[i] != rec[3]:
+                i += 1
+            del days[i], rids[i]
+            if key in self.loaded:
+                self.tree.delete(f"r{rec[3]}")
+            if days:
+                self.tree.item(_group_iid(key), text=self._group_text(key))
+                continue
+            del self.months[key]
+            self.keys.remove(key)
+            self.loaded.discard(key)
+            self.tree.delete(_group_iid(key))
@@ -0,0 +1,204 @@
+"""
+多组合工作区
+
+一个目录就是一个工作区，目录里每个数据文件（.json 或 .db）是一个独立的组合（账户、基金……），
+文件名去掉扩展名即组合名：
+- 组合按需加载，内存里最多保留 max_loaded 个最近用过的，换出前先保存；
+- drip_files / solve_all 在进程池里并行处理各个组合：子进程自己打开存储读写，
+  不在进程之间传整个账本；进程池由 Workspace 持有、各次调用共用，close() 时关闭；
+- 汇总年化（组合的组合）把各组合的现金流合并后整体求解，期末市值为各组合市值之和。
+"""
+import os
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from ledger import solve_xirr
+from storage import SQLITE_SUFFIXES, open_store
+
+MAX_LOADED = 3  # 内存里同时保留的组合数
+
+# rates: 组合名 -> (年化, 盈亏(分))；errors: 组合名 -> 异常（不收敛、日期不对等），出错的组合仍计入汇总；
+# total: 合并后的 (年化, 盈亏(分))，汇总本身求解失败时为异常对象，没有可算的组合时为 None
+WorkspaceXirr = namedtuple("WorkspaceXirr", "rates total errors")
+
+
+def _is_data_file(filename):
+    return filename.lower().endswith((".json",) + SQLITE_SUFFIXES)
+
+
+class Workspace:
+    def __init__(self, root, max_loaded=MAX_LOADED, max_workers=None):
+        self.root = root
+        self.max_loaded = max(1, max_loaded)
+        self.max_workers = max_workers
+        self._loaded = OrderedDict()  # 组合名 -> (存储, 账本)，最近用过的在末尾
+        self._pool = None
+        os.makedirs(root, exist_ok=True)
+
+    def _paths(self):
+        return {os.path.splitext(f)[0]: os.path.join(self.root, f)
+                for f in sorted(os.listdir(self.root)) if _is_data_file(f)}
+
+    def names(self):
+        return list(self._paths())
+
+    def path(self, name):
+        path = self._paths().get(name)
+        if path is None:
+            raise ValueError(f"工作区 {self.root} 中没有组合: {name}")
+        return path
+
+    def create(self, name, sqlite=False):
+        """新建空组合（写出一个空数据文件，之后 names() 里就有它）"""
+        if not name or os.path.basename(name) != name or name.startswith("."):
+            raise ValueError(f"组合名无效: {name!r}")
+        if name in self._paths():
+            raise ValueError(f"组合已存在: {name}")
+        store = open_store(os.path.join(self.root, name + (".db" if sqlite else ".json")))
+        ledger = store.load()
+        store.compact(ledger)
+        self._loaded[name] = (store, ledger)
+        self._evict()
+
+    # ================= 按需加载 =================
+
+    def open(self, name):
+        """-> (存储, 账本)；已加载的直接返回（同一个账本对象），否则从文件加载，必要时换出最久没用的组合"""
+        entry = self._loaded.get(name)
+        if entry is not None:
+            self._loaded.move_to_end(name)
+            return entry
+        store = open_store(self.path(name))
+        entry = self._loaded[name] = (store, store.load())
+        self._evict()
+        return entry
+
+    def replace(self, name, ledger):
+        """整体替换某个组合的账本（导入备份后），调用方负责保存"""
+        store, _ = self.open(name)
+        self._loaded[name] = (store, ledger)
+
+    def loaded(self):
+        return list(self._loaded)
+
+    def _evict(self):
+        while len(self._loaded) > self.max_loaded:
+            self._release(*self._loaded.popitem(last=False)[1])
+
+    @staticmethod
+    def _release(store, ledger):
+        store.commit(ledger)  # 界面上的组合切换前已经保存过，这里通常没有要写的
+        store.close()
+
+    def release(self, exclude=()):
+        """保存并换出除 exclude 以外已加载的组合，返回这些组合的文件路径（交给子进程处理前调用）"""
+        for name in [n for n in self._loaded if n not in exclude]:
+            self._release(*self._loaded.pop(name))
+        return [path for name, path in self._paths().items() if name not in exclude]
+
+    def close(self):
+        """保存并换出所有组合，关闭进程池：还没开始的任务取消，正在写文件的子进程等它写完"""
+        self.release()
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+    # ================= 并行计算 =================
+
+    def pool(self):
+        """各次并行计算共用的进程池（第一次用到时创建）"""
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(self.max_workers or os.cpu_count() or 1)
+        return self._pool
+
+    def drip_all(self, today=None, exclude=()):
+        """所有组合并行补录定投并保存 -> {组合名: 新增条数}"""
+        paths = self.release(exclude)
+        names = [os.path.splitext(os.path.basename(p))[0] for p in paths]
+        return dict(zip(names, drip_files(paths, today, self.pool())))
+
+    def flow_sources(self, names):
+        """
+        各组合的现金流来源（在主线程调用）：已加载的直接用整理好的现金流（含未保存的修改，
+        按日期合并过、不会再被修改，不用拷贝），没加载的给文件路径，由子进程自己读取。
+        """
+        sources = {}
+        for name in names:
+            entry = self._loaded.get(name)
+            if entry is not None:
+                flows = entry[1].prepared_flows()
+                sources[name] = (flows.days, flows.cents)
+            else:
+                sources[name] = self.path(name)
+        return sources
+
+    def xirr_all(self, end_values, end_date):
+        """end_values 为 {组合名: 期末市值(分)}，只计算给了市值的组合 -> WorkspaceXirr"""
+        return solve_all(self.flow_sources(end_values), end_values, end_date, self.pool())
+
+
+def _drip_job(path, today):
+    store = open_store(path)
+    try:
+        ledger = store.load()
+        new_cnt = ledger.generate_drip_records(today)
+        if new_cnt: store.commit(ledger)
+        return new_cnt
+    finally:
+        store.close()
+
+
+def drip_files(paths, today, pool):
+    """
+    在进程池（Workspace.pool()）里逐个组合补录定投（每个组合一个子任务）-> 新增条数列表。
+    可以在后台线程调用；进程池关闭时没开始的组合被取消，这里抛出 CancelledError。
+    """
+    if not paths: return []
+    return list(pool.map(_drip_job, paths, [today] * len(paths)))
+
+
+def _read_flows(source):
+    if not isinstance(source, str):
+        return source
+    store = open_store(source)
+    try:
+        return store.cash_flow_arrays()  # SQLite 直接读成数组，不构造完整账本
+    finally:
+        store.close()
+
+
+def _xirr_job(source, end_date, end_value):
+    """子进程：读现金流并单独求解；把现金流也带回去，供合并求解"""
+    days, amounts = _read_flows(source)
+    try:
+        result = solve_xirr(days, amounts, end_date, end_value)
+    except Exception as e:
+        result = e
+    return np.array(days), np.array(amounts), result
+
+
+def solve_all(sources, end_values, end_date, pool):
+    """
+    sources 来自 Workspace.flow_sources，pool 为 Workspace.pool()，可以在后台线程调用。
+    各组合在进程池里并行读取、求解，最后合并现金流求汇总年化（汇总不收敛时 total 为异常对象）。
+    """
+    names = list(sources)
+    if not names: return WorkspaceXirr({}, None, {})
+    results = list(pool.map(_xirr_job, [sources[n] for n in names], [end_date] * len(names),
+                            [end_values[n] for n in names]))
+
+    rates, errors = {}, {}
+    for name, (_, _, result) in zip(names, results):
+        if isinstance(result, Exception):
+            errors[name] = result
+        else:
+            rates[name] = result
+    days = np.concatenate([r[0] for r in results])
+    amounts = np.concatenate([r[1] for r in results])
+    try:
+        total = solve_xirr(days, amounts, end_date, sum(end_values[n] for n in names))
+    except Exception as e:
+        total = e
+    return WorkspaceXirr(rates, total, errors)
@@ -0,0 +1,373 @@
+"""
+向量化 XIRR 引擎
+
+现金流以 NumPy 数组保存（年化时间 t 与金额 a），一次向量化计算同时得到
+NPV 及其一阶、二阶导数，求根使用带区间保护的 Halley/Newton 迭代：
+迭代点跳出有效区间或数值异常时退化为二分，保证收敛。
+"""
+from datetime import date, datetime
+
+import numpy as np
+
+import profiling
+
+DAYS_PER_YEAR = 365.0
+
+# 与旧版 brentq 搜索区间保持一致
+RATE_LOWER = -0.999
+RATE_UPPER = 100.0
+
+
+class XirrConvergenceError(RuntimeError):
+    """无法求得收益率（现金流同号或迭代不收敛）"""
+
+
+def to_day_numbers(dates):
+    """把日期序列统一转为 int64 天数（只关心差值，基准无所谓）"""
+    arr = np.asarray(dates)
+    if arr.dtype.kind == "M":
+        return arr.astype("datetime64[D]").astype(np.int64)
+    if arr.dtype.kind in "iu":
+        return arr.astype(np.int64)
+    return np.fromiter((d.toordinal() if isinstance(d, (date, datetime)) else int(d) for d in dates),
+                       dtype=np.int64, count=len(dates))
+
+
+def year_fractions(dates, base=None):
+    """相对 base（默认最早日期）的年化时间，按 365 天计"""
+    days = to_day_numbers(dates)
+    if base is None:
+        base = days.min() if days.size else 0
+    elif not isinstance(base, (int, np.integer)):
+        base = to_day_numbers([base])[0]
+    return (days - base) / DAYS_PER_YEAR
+
+
+def xnpv(rate, t, amounts):
+    """单一利率下的净现值"""
+    t = np.asarray(t, dtype=np.float64)
+    a = np.asarray(amounts, dtype=np.float64)
+    if rate <= -1.0: return float("inf")
+    with np.errstate(over="ignore", invalid="ignore"):
+        return float(np.dot(a, np.exp(-t * np.log1p(rate))))
+
+
+def _evaluate(t, a, at, att, r):
+    """
+    一次遍历计算 f、f'、f''（按行）。
+    f(r)   =  Σ a·(1+r)^-t
+    f'(r)  = -Σ a·t·(1+r)^(-t-1)
+    f''(r) =  Σ a·t·(t+1)·(1+r)^(-t-2)
+    """
+    x = np.log1p(r)
+    if t.shape[0] == 1:
+        e = np.exp(-t[0] * x[0])
+        f = np.array([np.dot(a[0], e)])
+        s1 = np.array([np.dot(at[0], e)])
+        s2 = np.array([np.dot(att[0], e)])
+    else:
+        e = np.exp(-t * x[:, None])
+        f = np.einsum("ij,ij->i", a, e)
+        s1 = np.einsum("ij,ij->i", at, e)
+        s2 = np.einsum("ij,ij->i", att, e)
+    inv = 1.0 / (1.0 + r)
+    return f, -s1 * inv, s2 * inv * inv
+
+
+@profiling.traced("xirr.solve")
+def solve_rows(t, a, guess=0.1, tol=1e-10, maxiter=100):
+    """
+    按行并行求解 XIRR。
+    t, a: 形状 (m, n) 的年化时间与金额矩阵；不等长序列用 a=0、t=0 补齐。
+    返回长度 m 的收益率数组，无解的行为 NaN。
+    每轮迭代对所有未收敛的行做一次数组运算，而不是逐行循环。
+    """
+    t = np.atleast_2d(np.asarray(t, dtype=np.float64))
+    a = np.atleast_2d(np.asarray(a, dtype=np.float64))
+    t = np.where(a == 0.0, 0.0, t)  # 避免 0 * inf 产生 NaN
+    at = a * t
+    att = at * (t + 1.0)
+    m = t.shape[0]
+
+    rates = np.full(m, np.nan)
+    # 现金流必须有正有负，否则无根
+    solvable = (a > 0).any(axis=1) & (a < 0).any(axis=1)
+    rows = np.flatnonzero(solvable)
+    if rows.size == 0: return rates
+
+    def sub(idx):
+        if idx.size == m: return t, a, at, att
+        return t[idx], a[idx], at[idx], att[idx]
+
+    with np.errstate(over="ignore", invalid="ignore", divide="ignore"):
+        # --- 1. 端点取值，确定可用的括号区间 ---
+        tt, aa, aat, aatt = sub(rows)
+        k = rows.size
+        lo = np.full(k, RATE_LOWER)
+        hi = np.full(k, RATE_UPPER)
+        f_lo = _evaluate(tt, aa, aat, aatt, lo)[0]
+        f_hi = _evaluate(tt, aa, aat, aatt, hi)[0]
+        bracketed = np.isfinite(f_lo) & np.isfinite(f_hi) & (np.sign(f_lo) != np.sign(f_hi))
+        sign_lo = np.sign(f_lo)
+
+        r = np.full(k, float(guess))
+        r = np.where(bracketed & ((r <= lo) | (r >= hi)), (lo + hi) / 2, r)
+        scale = np.abs(aa).sum(axis=1)
+        done = np.zeros(k, dtype=bool)
+
+        # --- 2. 带保护的 Halley 迭代 ---
+        iterations = 0
+        for _ in range(maxiter):
+            act = np.flatnonzero(~done)
+            if act.size == 0: break
+            iterations += 1
+            tt, aa, aat, aatt = sub(rows[act])
+            ra = r[act]
+            f, f1, f2 = _evaluate(tt, aa, aat, aatt, ra)
+
+            # 收紧括号：与下端点同号则替换下端点（溢出的点不参与）
+            br = bracketed[act]
+            ok = br & np.isfinite(f)
+            same = np.sign(f) == sign_lo[act]
+            lo[act] = np.where(ok & same, ra, lo[act])
+            hi[act] = np.where(ok & ~same, ra, hi[act])
+
+            newton = f / f1
+            denom = 1.0 - 0.5 * newton * f2 / f1
+            step = np.where(np.abs(denom) > 0.1, newton / denom, newton)
+            nxt = ra - step
+
+            # 跳出括号或数值异常 -> 二分
+            bad = ~np.isfinite(nxt) | (nxt <= lo[act]) | (nxt >= hi[act])
+            nxt = np.where(br & bad, (lo[act] + hi[act]) / 2, nxt)
+            # 无括号时不能越过 -1
+            nxt = np.where(~br & (nxt <= -1.0), (ra - 1.0) / 2, nxt)
+
+            hit = np.abs(f) <= 1e-13 * scale[act]
+            width = tol * (1.0 + np.abs(ra))
+            small = np.abs(nxt - ra) <= width
+            # 无括号时步长变小不代表到了根（可能一路逼近 -1）：要求 nxt 两侧 NPV 异号才算收敛
+            near = ~br & ~hit & small & np.isfinite(nxt)
+            crossed = np.zeros(act.size, dtype=bool)
+            if near.any():
+                sub_rows = sub(rows[act[near]])
+                w = width[near]
+                f_a = _evaluate(*sub_rows, nxt[near] - w)[0]
+                f_b = _evaluate(*sub_rows, nxt[near] + w)[0]
+                crossed[near] = np.sign(f_a) * np.sign(f_b) <= 0
+            converged = hit | crossed | (br & (small | (hi[act] - lo[act] <= width)))
+            failed = ~hit & (~np.isfinite(nxt) | (near & ~crossed))
+            r[act] = np.where(hit, ra, np.where(failed, np.nan, nxt))
+            done[act] = converged | failed
+        r[~done] = np.nan
+    profiling.count("xirr.iterations", iterations)
+
+    rates[rows] = r
+    return rates
+
+
+def xirr(dates, amounts, guess=0.1, tol=1e-10, maxiter=100):
+    """
+    计算单组现金流的年化收益率（XIRR）。
+    dates 可以是 date 列表、datetime64 数组或天数数组；amounts 为对应金额。
+    失败时抛出 XirrConvergenceError。
+    """
+    a = np.asarray(amounts, dtype=np.float64)
+    t = year_fractions(dates)
+    if a.shape != t.shape:
+        raise ValueError("日期与金额数量不一致")
+    rate = solve_rows(t[None, :], a[None, :], guess=guess, tol=tol, maxiter=maxiter)[0]
+    if not np.isfinite(rate):
+        raise XirrConvergenceError("数据可能不收敛")
+    return float(rate)
+
+
+# 单批矩阵的元素上限，超出时按行分块，避免 (m, n) 临时数组过大
+MAX_CELLS = 4_000_000
+
+
+def _solve_chunked(t, a, guess, tol, maxiter):
+    m, n = a.shape
+    step = max(1, MAX_CELLS // max(n, 1))
+    if m <= step:
+        return solve_rows(t, a, guess=guess, tol=tol, maxiter=maxiter)
+    return np.concatenate([solve_rows(t[i:i + step], a[i:i + step], guess=guess, tol=tol, maxiter=maxiter)
+                           for i in range(0, m, step)])
+
+
+def xirr_batch(series, guess=0.1, tol=1e-10, maxiter=100):
+    """
+    一次求解多组（长度不等的）现金流。
+    series: [(dates, amounts), ...]，每组各自以最早日期为基准。
+    返回收益率数组，无解的组为 NaN（不抛异常，方便批量汇总）。
+    """
+    series = list(series)
+    if not series: return np.empty(0)
+    days = [to_day_numbers(d) for d, _ in series]
+    amts = [np.asarray(a, dtype=np.float64) for _, a in series]
+    lengths = np.array([len(x) for x in amts])
+    if any(len(d) != k for d, k in zip(days, lengths)):
+        raise ValueError("日期与金额数量不一致")
+
+    # 拼成 (m, n) 矩阵，右侧用 0 补齐
+    m, n = len(series), int(lengths.max())
+    t = np.zeros((m, n))
+    a = np.zeros((m, n))
+    mask = np.arange(n) < lengths[:, None]
+    if n:
+        flat_days = np.concatenate(days)
+        base = np.repeat([d.min() if d.size else 0 for d in days], lengths)
+        t[mask] = (flat_days - base) / DAYS_PER_YEAR
+        a[mask] = np.concatenate(amts)
+    return _solve_chunked(t, a, guess, tol, maxiter)
+
+
+def xirr_scenarios(dates, amounts, end_date, end_values, guess=0.1, tol=1e-10, maxiter=100):
+    """
+    同一组历史现金流 + 多个候选期末市值（如 ±20% 情景）。
+    end_values 可为任意形状的数组，end_date 可为单个日期或可广播到同形状的日期数组。
+    返回与 end_values 同形状的收益率数组，无解处为 NaN。
+    """
+    values = np.asarray(end_values, dtype=np.float64)
+    days = to_day_numbers(dates)
+    a = np.asarray(amounts, dtype=np.float64)
+    if days.shape != a.shape:
+        raise ValueError("日期与金额数量不一致")
+
+    end_arr = np.asarray(end_date)
+    if end_arr.ndim == 0:
+        end_days = np.full(values.shape, to_day_numbers([end_date])[0])
+    else:
+        end_days = np.broadcast_to(to_day_numbers(end_arr.ravel()).reshape(end_arr.shape), values.shape)
+
+    base = min(days.min(), end_days.min()) if days.size else end_days.min()
+    t_hist = (days - base) / DAYS_PER_YEAR
+    m = values.size
+    t = np.empty((m, a.size + 1))
+    t[:, :-1] = t_hist
+    t[:, -1] = (end_days.ravel() - base) / DAYS_PER_YEAR
+    mat = np.empty((m, a.size + 1))
+    mat[:, :-1] = a
+    mat[:, -1] = values.ravel()
+    return _solve_chunked(t, mat, guess, tol, maxiter).reshape(values.shape)
+
+
+# ================= 时间序列（收益率曲线） =================
+
+# 展开阶数与信任半径：|Δlog(1+r)|·T 不超过 CURVE_RADIUS 时，
+# 截断误差约 CURVE_RADIUS^(J+1)/(J+1)!，远小于求解精度
+CURVE_TERMS = 14
+CURVE_RADIUS = 0.5
+
+
+class _PrefixMoments:
+    """
+    按日期排序后的现金流在参考点 x0 = log(1+r0) 处的前缀矩
+        B[m, p] = Σ_{i<p} a_i·t_i^m·e^(-t_i·x0)，m = 0..CURVE_TERMS+2
+    于是任意前缀、任意 x 附近：
+        Σ_{i<p} a_i·t_i^q·e^(-t_i·x) = Σ_j (-(x-x0))^j / j! · B[q+j, p]
+    每次求值只是对一列做长度 CURVE_TERMS 的点积，与现金流笔数无关。
+    迭代点离开信任半径时在新的点上重建（一次 O(n·J) 的向量运算）。
+    """
+
+    def __init__(self, t, a):
+        self.t = t
+        self.a = a
+        self.powers = np.cumprod(np.vstack([np.ones_like(t)] + [t] * (CURVE_TERMS + 2)), axis=0)
+        self.fact = np.cumprod(np.concatenate(([1.0], np.arange(1.0, CURVE_TERMS))))
+        self.x0 = None
+        self.B = None
+
+    def rebuild(self, x0):
+        with np.errstate(over="ignore"):
+            w = self.a * np.exp(-self.t * x0)
+        self.B = np.zeros((self.powers.shape[0], self.t.size + 1))
+        np.cumsum(self.powers * w, axis=1, out=self.B[:, 1:])
+        self.x0 = x0
+
+    def sums(self, p, x, horizon):
+        """前 p 笔现金流的 (Σa·e^-tx, Σa·t·e^-tx, Σa·t²·e^-tx)；horizon 为这些现金流的最大 t"""
+        d = x - self.x0 if self.x0 is not None else np.inf
+        if not abs(d) * horizon <= CURVE_RADIUS:
+            self.rebuild(x)
+            d = 0.0
+        c = np.cumprod(np.concatenate(([1.0], np.full(CURVE_TERMS - 1, -d)))) / self.fact
+        col = self.B[:, p]
+        return c @ col[:CURVE_TERMS], c @ col[1:CURVE_TERMS + 1], c @ col[2:CURVE_TERMS + 2]
+
+
+@profiling.traced("xirr.curve")
+def xirr_curve(dates, amounts, end_dates, end_values, guess=0.1, tol=1e-10, maxiter=50):
+    """
+    收益率曲线：对每个 (end_dates[k], end_values[k])，用不晚于该日的历史现金流
+    加上该日市值求 XIRR，返回与 end_dates 等长的收益率数组，无解处为 NaN。
+
+    - 同一天的现金流先合并，然后按日期做前缀矩（见 _PrefixMoments），
+      每个点的 NPV 及导数只需 O(CURVE_TERMS) 次运算，而不是 O(现金流笔数)；
+    - 每个点以前一个点的收益率为初值做 Halley 迭代，相邻点通常 2~3 步收敛；
+    - 迭代不收敛的点退回 solve_rows 的区间保护求解。
+    end_dates 按时间升序时热启动效果最好（不要求）；多根时取与前一点相连的那个根。
+    """
+    days = to_day_numbers(dates)
+    a = np.asarray(amounts, dtype=np.float64)
+    if days.shape != a.shape:
+        raise ValueError("日期与金额数量不一致")
+    end_days = to_day_numbers(end_dates)
+    values = np.asarray(end_values, dtype=np.float64)
+    if end_days.shape != values.shape:
+        raise ValueError("日期与市值数量不一致")
+
+    rates = np.full(values.size, np.nan)
+    if not days.size: return rates
+
+    # 同日合并 + 排序，之后每个点对应一段前缀
+    uniq, inverse = np.unique(days, return_inverse=True)
+    flows = np.bincount(inverse, weights=a, minlength=uniq.size)
+    base = uniq[0]
+    t = (uniq - base) / DAYS_PER_YEAR
+    T = (end_days - base) / DAYS_PER_YEAR
+    prefix = np.searchsorted(uniq, end_days, side="right")
+    pos = np.concatenate(([0], np.cumsum(flows > 0)))
+    neg = np.concatenate(([0], np.cumsum(flows < 0)))
+    scale = np.concatenate(([0.0], np.cumsum(np.abs(flows))))
+
+    moments = _PrefixMoments(t, flows)
+    r = float(guess)
+    iterations = 0
+    with np.errstate(over="ignore", invalid="ignore", divide="ignore"):
+        for k in range(values.size):
+            p, v, tk = int(prefix[k]), float(values[k]), float(T[k])
+            if p == 0 or tk <= 0 or not np.isfinite(v):
+                continue
+            if not ((pos[p] or v > 0) and (neg[p] or v < 0)):
+                continue  # 现金流同号，无根
+            tol_f = 1e-13 * (scale[p] + abs(v))
+            rk = r
+            for _ in range(maxiter):
+                iterations += 1
+                x = np.log1p(rk)
+                g0, g1, g2 = moments.sums(p, x, tk)
+                e = np.exp(-tk * x)
+                f = g0 + v * e
+                if abs(f) <= tol_f: break
+                inv = 1.0 / (1.0 + rk)
+                f1 = -(g1 + v * tk * e) * inv
+                f2 = (g2 + g1 + v * tk * (tk + 1.0) * e) * inv * inv
+                newton = f / f1
+                denom = 1.0 - 0.5 * newton * f2 / f1
+                nxt = rk - (newton / denom if abs(denom) > 0.1 else newton)
+                if not np.isfinite(nxt) or nxt <= RATE_LOWER or nxt >= RATE_UPPER:
+                    rk = np.nan
+                    break
+                step, rk = abs(nxt - rk), nxt
+                if step <= tol * (1.0 + abs(rk)): break
+            else:
+                rk = np.nan
+            if not np.isfinite(rk):
+                # 热启动失败（如收益率剧烈跳变），对该点单独做带区间保护的求解
+                tt = np.append(t[:p], tk)
+                rk = solve_rows(tt[None, :], np.append(flows[:p], v)[None, :], guess=guess, tol=tol)[0]
+            if np.isfinite(rk):
+                rates[k] = r = float(rk)
+    profiling.count("xirr.curve_iterations", iterations)
+    return rates